@@ -0,0 +1,113 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Micro-benchmark for the SBM generator helpers.
+
+Times the array-based MakeDegrees, _GenerateNodeMemberships and NESTED
+_GenerateFeatureMemberships against the previous per-vertex implementations,
+which are reproduced below for reference.
+
+Example:
+  python benchmark_sbm_helpers.py --nvertex=1000,100000,1000000 \
+    --num_clusters=2,10,100
+"""
+import timeit
+
+from absl import app
+from absl import flags
+
+import numpy as np
+
+from graph_world.generators.sbm_simulator import (
+  MakeDegrees, MakePi, MatchType, _ComputeCommunitySizes,
+  _GenerateFeatureMemberships, _GenerateNodeMemberships, _GetNestingMap,
+  power_law)
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_list('nvertex', ['1000', '10000', '100000', '1000000'],
+                  'Graph sizes to benchmark.')
+flags.DEFINE_list('num_clusters', ['2', '10', '100'],
+                  'Numbers of graph clusters to benchmark.')
+flags.DEFINE_integer('repeats', 3, 'Timing repeats; the minimum is reported.')
+flags.DEFINE_float('power_exponent', 2.5, 'Power law exponent for degrees.')
+flags.DEFINE_integer('min_deg', 1, 'Minimum degree for degrees.')
+
+
+def _LegacyMakeDegrees(power_exponent, min_deg, num_vertices):
+  degrees = np.zeros(num_vertices)
+  for i in range(num_vertices):
+    degrees[i] = int(power_law(min_deg, num_vertices, np.random.uniform(0, 1),
+                               power_exponent))
+  return degrees
+
+
+def _LegacyGenerateNodeMemberships(num_vertices, pi):
+  community_sizes = _ComputeCommunitySizes(num_vertices, pi)
+  memberships = np.zeros(num_vertices, dtype=int)
+  node = 0
+  for i in range(len(pi)):
+    memberships[range(node, node + community_sizes[i])] = i
+    node += community_sizes[i]
+  return memberships
+
+
+def _LegacyNestedFeatureMemberships(graph_memberships, num_groups):
+  graph_num_groups = len(set(graph_memberships))
+  nesting_map = _GetNestingMap(num_groups, graph_num_groups)
+  memberships = []
+  for graph_cluster_id, feature_cluster_ids in nesting_map.items():
+    sorted_feature_cluster_ids = sorted(feature_cluster_ids)
+    num_feature_groups = len(sorted_feature_cluster_ids)
+    feature_pi = np.ones(num_feature_groups) / num_feature_groups
+    num_graph_cluster_nodes = np.sum(
+      [i == graph_cluster_id for i in graph_memberships])
+    sub_memberships = _LegacyGenerateNodeMemberships(num_graph_cluster_nodes,
+                                                     feature_pi)
+    memberships.extend([sorted_feature_cluster_ids[i] for i in sub_memberships])
+  return np.array(sorted(memberships))
+
+
+def _Time(fn):
+  return min(timeit.repeat(fn, number=1, repeat=FLAGS.repeats))
+
+
+def main(argv):
+  del argv
+  print('%-28s %9s %5s %12s %12s %9s' % (
+    'helper', 'nvertex', 'k', 'legacy (s)', 'array (s)', 'speedup'))
+  for nvertex in [int(n) for n in FLAGS.nvertex]:
+    legacy = _Time(lambda: _LegacyMakeDegrees(
+      FLAGS.power_exponent, FLAGS.min_deg, nvertex))
+    new = _Time(lambda: MakeDegrees(
+      FLAGS.power_exponent, FLAGS.min_deg, nvertex))
+    print('%-28s %9d %5s %12.4f %12.4f %8.1fx' % (
+      'MakeDegrees', nvertex, '-', legacy, new, legacy / new))
+    for k in [int(k) for k in FLAGS.num_clusters]:
+      pi = MakePi(k, 0.0)
+      legacy = _Time(lambda: _LegacyGenerateNodeMemberships(nvertex, pi))
+      new = _Time(lambda: _GenerateNodeMemberships(nvertex, pi))
+      print('%-28s %9d %5d %12.4f %12.4f %8.1fx' % (
+        '_GenerateNodeMemberships', nvertex, k, legacy, new, legacy / new))
+      graph_memberships = _GenerateNodeMemberships(nvertex, pi)
+      legacy = _Time(
+        lambda: _LegacyNestedFeatureMemberships(graph_memberships, 2 * k))
+      new = _Time(lambda: _GenerateFeatureMemberships(
+        graph_memberships, 2 * k, MatchType.NESTED))
+      print('%-28s %9d %5d %12.4f %12.4f %8.1fx' % (
+        'NESTED feature memberships', nvertex, k, legacy, new, legacy / new))
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -88,6 +88,11 @@ class BenchmarkerWrapper(ABC):
   def GetBenchmarkParams(self):
     return self._benchmark_params
 
+  # Override this function to return True if the benchmarker consumes
+  # edge features (torch_data.edge_attr). When no configured benchmarker
+  # requires them, generators skip simulating edge features entirely.
+  def RequiresEdgeFeatures(self):
+    return False
 
 
 class BenchmarkGNNParDo(beam.DoFn):
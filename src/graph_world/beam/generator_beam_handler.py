@@ -44,6 +44,12 @@ class GeneratorBeamHandler(ABC):
   def SetOutputPath(self, output_path):
     pass
 
+  def GetBenchmarkerWrappers(self):
+    return self._benchmarker_wrappers
+
+  def SetEdgeFeaturesRequired(self, required):
+    self._generator_wrapper.SetEdgeFeaturesRequired(required)
+
 @gin.configurable
 class GeneratorBeamHandlerWrapper:
 
@@ -51,6 +57,10 @@ class GeneratorBeamHandlerWrapper:
   def __init__(self, handler, nsamples):
     self.nsamples = nsamples
     self.handler = handler
+    # Edge features are only simulated if some benchmarker consumes them.
+    self.handler.SetEdgeFeaturesRequired(any(
+      benchmarker_wrapper().RequiresEdgeFeatures() for
+      benchmarker_wrapper in self.handler.GetBenchmarkerWrappers()))
 
   def SetOutputPath(self, output_path):
     self.output_path = output_path
@@ -71,6 +71,18 @@ class GeneratorConfigSampler:
 
   def __init__(self, param_sampler_specs):
     self._param_sampler_specs = {spec.name: spec for spec in param_sampler_specs}
+    self._edge_features_required = True
+
+  def SetEdgeFeaturesRequired(self, required):
+    # Generators that support edge features should skip them when not
+    # required, see _EdgeFeatureDim.
+    self._edge_features_required = required
+
+  def _EdgeFeatureDim(self, config):
+    # Edge feature dimension to simulate for a sampled config.
+    if not self._edge_features_required:
+      return 0
+    return config['edge_feature_dim']
 
   def SampleConfig(self, marginal=False):
     config = {}
@@ -0,0 +1,132 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Lightweight CSR graph used by the native generator backends.
+
+CsrGraph implements the subset of the graph_tool.Graph interface that the
+pipeline relies on (num_vertices, num_edges, get_vertices, get_edges,
+get_out_degrees, save), so generated graphs can flow through metrics and
+torchgeo conversion without ever building a graph_tool object. Consumers that
+need graph_tool algorithms call AsGraphTool, which materializes the graph
+only at that point.
+"""
+
+import numpy as np
+import scipy.sparse
+
+
+class CsrGraph:
+  """Undirected simple graph stored as a symmetric CSR adjacency.
+
+  Attributes:
+    indptr: (num_vertices + 1,) int64 row pointer array.
+    indices: (2 * num_edges,) sorted column indices of each row.
+  """
+
+  def __init__(self, indptr, indices):
+    self.indptr = np.asarray(indptr, dtype=np.int64)
+    self.indices = np.asarray(indices)
+    self._edges = None
+
+  @classmethod
+  def FromEdges(cls, num_vertices, sources, targets):
+    """Builds a CsrGraph from deduplicated undirected edges.
+    Args:
+      num_vertices: number of nodes in the graph.
+      sources: array of edge sources.
+      targets: array of edge targets. Each undirected edge must appear once
+        and self-loops must already be removed.
+    Returns:
+      the CsrGraph.
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    rows = np.concatenate([sources, targets])
+    cols = np.concatenate([targets, sources])
+    order = np.argsort(rows * num_vertices + cols, kind='stable')
+    index_dtype = np.int32 if num_vertices < 2 ** 31 else np.int64
+    indptr = np.zeros(num_vertices + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_vertices), out=indptr[1:])
+    return cls(indptr, cols[order].astype(index_dtype))
+
+  def num_vertices(self) -> int:
+    return self.indptr.shape[0] - 1
+
+  def num_edges(self) -> int:
+    return self.indices.shape[0] // 2
+
+  def is_directed(self) -> bool:
+    return False
+
+  def get_vertices(self) -> np.ndarray:
+    return np.arange(self.num_vertices())
+
+  def get_out_degrees(self, vertices) -> np.ndarray:
+    return np.diff(self.indptr)[np.asarray(vertices)]
+
+  def get_total_degrees(self, vertices) -> np.ndarray:
+    return self.get_out_degrees(vertices)
+
+  def get_edges(self) -> np.ndarray:
+    """Returns the (num_edges, 2) edge array, with source < target.
+
+    Edges are sorted by (source, target). The array is computed once and
+    reused, so callers must not modify it.
+    """
+    if self._edges is None:
+      rows = np.repeat(np.arange(self.num_vertices(), dtype=np.int64),
+                       np.diff(self.indptr))
+      upper = self.indices > rows
+      self._edges = np.stack(
+        [rows[upper], self.indices[upper].astype(np.int64)], axis=1)
+    return self._edges
+
+  def AdjacencyMatrix(self) -> scipy.sparse.csr_matrix:
+    n = self.num_vertices()
+    return scipy.sparse.csr_matrix(
+      (np.ones(self.indices.shape[0]), self.indices, self.indptr),
+      shape=(n, n))
+
+  def ToGraphTool(self):
+    """Materializes the graph as an undirected graph_tool.Graph."""
+    import graph_tool
+    graph = graph_tool.Graph(directed=False)
+    graph.add_vertex(self.num_vertices())
+    graph.add_edge_list(self.get_edges())
+    return graph
+
+  def save(self, f):
+    """Writes indptr and indices to a file object in .npz format."""
+    np.savez_compressed(f, indptr=self.indptr, indices=self.indices)
+
+  def __getstate__(self):
+    # The edge array is derived from the CSR arrays and is not shipped.
+    state = self.__dict__.copy()
+    state['_edges'] = None
+    return state
+
+
+def AsGraphTool(graph):
+  """Returns `graph` as a graph_tool graph, converting a CsrGraph if needed."""
+  if isinstance(graph, CsrGraph):
+    return graph.ToGraphTool()
+  return graph
+
+
+def AdjacencyMatrix(graph) -> scipy.sparse.csr_matrix:
+  """Returns the sparse adjacency matrix of a CsrGraph or graph_tool graph."""
+  if isinstance(graph, CsrGraph):
+    return graph.AdjacencyMatrix()
+  import graph_tool.spectral
+  return graph_tool.spectral.adjacency(graph)
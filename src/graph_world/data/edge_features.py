@@ -0,0 +1,138 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections.abc
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+
+
+def _PairKeys(sources, targets):
+  """Packs undirected (source, target) pairs into sortable int64 keys."""
+  sources = np.asarray(sources, dtype=np.int64)
+  targets = np.asarray(targets, dtype=np.int64)
+  low = np.minimum(sources, targets)
+  high = np.maximum(sources, targets)
+  return (low << 32) | high
+
+
+class EdgeFeatures(collections.abc.Mapping):
+  """Array-backed store of undirected edge features.
+
+  Row i of `features` holds the features of edge i of the owning graph, where
+  edges are enumerated in the order returned by graph.get_edges(). Consumers
+  that walk the graph edges in that order (e.g. the torchgeo converters) can
+  therefore index the feature matrix positionally.
+
+  For backwards compatibility the store is also a read-only mapping from
+  sorted node tuples (u, v), u <= v, to feature vectors, as produced by the
+  previous dict-based implementation. Tuple lookups go through a sorted-pair
+  index that is only built on first use.
+
+  Attributes:
+    edges: (num_edges, 2) int64 array of edge endpoints.
+    features: (num_edges, feature_dim) float32 array of edge features.
+  """
+
+  def __init__(self, edges, features):
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    features = np.asarray(features, dtype=np.float32)
+    if features.ndim == 1:
+      features = features.reshape(edges.shape[0], -1)
+    if features.shape[0] != edges.shape[0]:
+      raise ValueError("edges and features must have the same number of rows")
+    self.edges = edges
+    self.features = np.ascontiguousarray(features)
+    self._sorted_keys = None
+    self._sorted_positions = None
+
+  @classmethod
+  def FromDict(cls, edges, edge_feature_dict: Dict[Tuple[int, int], np.ndarray],
+               feature_dim=None):
+    """Builds a store from a legacy {(u, v): features} dict.
+    Args:
+      edges: (num_edges, 2) array of edges in graph.get_edges() order.
+      edge_feature_dict: map from sorted edge tuple to feature vector.
+      feature_dim: feature dimension, only needed when edges is empty.
+    Returns:
+      an EdgeFeatures store aligned with `edges`.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if feature_dim is None:
+      feature_dim = len(next(iter(edge_feature_dict.values()))) if (
+          edge_feature_dict) else 0
+    features = np.zeros((edges.shape[0], feature_dim), dtype=np.float32)
+    for i, (u, v) in enumerate(edges):
+      features[i] = edge_feature_dict[(min(u, v), max(u, v))]
+    return cls(edges, features)
+
+  @classmethod
+  def Empty(cls):
+    """Returns a store without edges or features."""
+    return cls(np.zeros((0, 2), dtype=np.int64),
+               np.zeros((0, 0), dtype=np.float32))
+
+  @property
+  def num_edges(self) -> int:
+    return self.edges.shape[0]
+
+  @property
+  def feature_dim(self) -> int:
+    return self.features.shape[1]
+
+  def BuildIndex(self):
+    """Builds the sorted-pair index used for tuple and batch lookups."""
+    if self._sorted_keys is None:
+      keys = _PairKeys(self.edges[:, 0], self.edges[:, 1])
+      self._sorted_positions = np.argsort(keys, kind="stable")
+      self._sorted_keys = keys[self._sorted_positions]
+
+  def Positions(self, sources, targets) -> np.ndarray:
+    """Returns the row of each (source, target) edge, or -1 if absent."""
+    self.BuildIndex()
+    keys = _PairKeys(sources, targets)
+    found = np.searchsorted(self._sorted_keys, keys)
+    found = np.minimum(found, max(self.num_edges - 1, 0))
+    positions = np.full(keys.shape, -1, dtype=np.int64)
+    if self.num_edges:
+      hit = self._sorted_keys[found] == keys
+      positions[hit] = self._sorted_positions[found[hit]]
+    return positions
+
+  def Lookup(self, sources, targets) -> np.ndarray:
+    """Vectorized feature lookup for arrays of (source, target) pairs."""
+    positions = self.Positions(sources, targets)
+    if np.any(positions < 0):
+      raise KeyError("edge not found in edge feature store")
+    return self.features[positions]
+
+  def __getitem__(self, edge_tuple) -> np.ndarray:
+    position = self.Positions([edge_tuple[0]], [edge_tuple[1]])[0]
+    if position < 0:
+      raise KeyError(edge_tuple)
+    return self.features[position]
+
+  def __iter__(self) -> Iterator[Tuple[int, int]]:
+    for u, v in self.edges:
+      yield (int(min(u, v)), int(max(u, v)))
+
+  def __len__(self) -> int:
+    return self.num_edges
+
+  def __getstate__(self):
+    # The index is cheap to rebuild, so it is not shipped between workers.
+    state = self.__dict__.copy()
+    state["_sorted_keys"] = None
+    state["_sorted_positions"] = None
+    return state
@@ -0,0 +1,158 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Sparse approximate personalized PageRank.
+
+ppr_topk runs the push algorithm of Andersen, Chung and Lang ("Local graph
+partitioning using PageRank vectors", 2006) for a batch of sources at once:
+every round pushes all residuals above tol * degree, for all sources of the
+batch, with one sparse matrix product. The estimate of each source then
+underestimates its PPR vector by at most tol * degree(v) at every vertex v,
+and only vertices that received enough mass are ever materialized, so memory
+stays linear in the number of kept entries instead of quadratic in the number
+of vertices.
+"""
+
+import concurrent.futures
+from typing import Optional
+
+import numpy as np
+import scipy.sparse
+
+
+def topk_per_row(matrix: scipy.sparse.csr_matrix,
+                  k: int) -> scipy.sparse.csr_matrix:
+  """Keeps the k largest entries of each row of a CSR matrix."""
+  rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+  order = np.lexsort((-matrix.data, rows))
+  rank = np.arange(order.shape[0]) - matrix.indptr[rows[order]]
+  keep = np.sort(order[rank < k])
+  return scipy.sparse.csr_matrix(
+    (matrix.data[keep], matrix.indices[keep], np.concatenate(
+      [[0], np.cumsum(np.bincount(rows[keep], minlength=matrix.shape[0]))])),
+    shape=matrix.shape)
+
+
+def _push(walk: scipy.sparse.csr_matrix, thresholds: np.ndarray,
+          dangling: np.ndarray, sources: np.ndarray, alpha: float,
+          max_rounds: int) -> scipy.sparse.csr_matrix:
+  """Returns the push estimates of the PPR vectors of `sources`.
+
+  Args:
+    walk: row-stochastic random walk matrix (rows of dangling vertices are
+      empty).
+    thresholds: per-vertex residual above which it is pushed.
+    dangling: per-vertex indicator (0. or 1.) of the vertices whose walk mass
+      returns to the source, as in graph_tool.pagerank.
+    sources: source vertices.
+    alpha: teleport probability.
+    max_rounds: bound on the number of push rounds.
+  """
+  b, n = sources.shape[0], walk.shape[0]
+  source_rows = np.arange(b)
+  residual = scipy.sparse.csr_matrix(
+    (np.ones(b), (source_rows, sources)), shape=(b, n))
+  estimate = scipy.sparse.csr_matrix((b, n))
+  for _ in range(max_rounds):
+    active = residual.data >= thresholds[residual.indices]
+    if not active.any():
+      break
+    pushed = residual.copy()
+    pushed.data = np.where(active, pushed.data, 0.0)
+    pushed.eliminate_zeros()
+    residual.data = np.where(active, 0.0, residual.data)
+    residual.eliminate_zeros()
+    estimate = estimate + alpha * pushed
+    residual = residual + (1.0 - alpha) * (pushed @ walk)
+    if dangling.any():
+      returned = pushed @ dangling
+      residual = residual + scipy.sparse.csr_matrix(
+        ((1.0 - alpha) * returned, (source_rows, sources)), shape=(b, n))
+  return estimate.tocsr()
+
+
+def ppr_topk(adjacency: scipy.sparse.spmatrix, alpha: float,
+             sources: Optional[np.ndarray] = None, k: Optional[int] = None,
+             eps: Optional[float] = None, tol: float = 1e-4,
+             normalization: str = 'rw', self_loops: bool = False,
+             exclude_self: bool = False, batch_size: int = 256,
+             max_rounds: int = 200,
+             num_threads: Optional[int] = None) -> scipy.sparse.csr_matrix:
+  """Computes sparsified personalized PageRank vectors.
+  Args:
+    adjacency: (n, n) symmetric adjacency matrix of an undirected graph.
+    alpha: teleport (restart) probability.
+    sources: vertices whose PPR vectors to compute. Defaults to all.
+    k: if given, keep only the k largest entries of each vector.
+    eps: if given, drop entries smaller than eps.
+    tol: push tolerance. Entries are underestimated by at most
+      tol * degree, so smaller values are more accurate and less sparse.
+    normalization: 'rw' for the random walk PPR
+      alpha * e_s (I - (1 - alpha) D^-1 A)^-1, where dangling vertices send
+      their mass back to the source as in graph_tool.pagerank; 'sym' for the
+      symmetrically normalized alpha * (I - (1 - alpha) D^-1/2 A D^-1/2)^-1
+      used by GDC.
+    self_loops: add a unit self-loop to every vertex first, as GDC does.
+    exclude_self: drop the entry of each source itself before the top k.
+    batch_size: number of sources pushed together.
+    max_rounds: bound on the number of push rounds of a batch.
+    num_threads: number of threads over which the batches are spread.
+  Returns:
+    (len(sources), n) CSR matrix whose row i is the sparsified PPR vector of
+    sources[i].
+  """
+  if normalization not in ('rw', 'sym'):
+    raise ValueError('Unknown PPR normalization: %s' % normalization)
+  adjacency = scipy.sparse.csr_matrix(adjacency, dtype=np.float64)
+  n = adjacency.shape[0]
+  if self_loops:
+    adjacency = adjacency + scipy.sparse.identity(n, format='csr')
+  sources = np.arange(n) if sources is None else np.asarray(sources)
+  degrees = np.asarray(adjacency.sum(axis=1)).ravel()
+  inverse_degrees = np.divide(1.0, degrees, out=np.zeros(n),
+                              where=degrees > 0)
+  walk = (scipy.sparse.diags(inverse_degrees) @ adjacency).tocsr()
+  dangling = (degrees == 0).astype(np.float64)
+  thresholds = tol * np.maximum(degrees, 1.0)
+
+  def _Batch(start):
+    batch = sources[start:start + batch_size]
+    estimate = _push(walk, thresholds, dangling, batch, alpha, max_rounds)
+    if normalization == 'sym':
+      # D^-1/2 T D^1/2 = D^-1 A, so the symmetric PPR of s at v is the
+      # random walk PPR times sqrt(d_s / d_v).
+      sqrt_degrees = np.sqrt(degrees)
+      estimate = (scipy.sparse.diags(sqrt_degrees[batch]) @ estimate @
+                  scipy.sparse.diags(np.divide(
+                    1.0, sqrt_degrees, out=np.zeros(n),
+                    where=degrees > 0))).tocsr()
+    if exclude_self:
+      rows = np.repeat(np.arange(batch.shape[0]), np.diff(estimate.indptr))
+      estimate.data[estimate.indices == batch[rows]] = 0.0
+    if eps is not None:
+      estimate.data[estimate.data < eps] = 0.0
+    estimate.eliminate_zeros()
+    if k is not None:
+      estimate = topk_per_row(estimate, k)
+    return estimate
+
+  starts = range(0, sources.shape[0], batch_size)
+  if num_threads is not None and num_threads > 1:
+    with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+      blocks = list(executor.map(_Batch, starts))
+  else:
+    blocks = [_Batch(start) for start in starts]
+  if not blocks:
+    return scipy.sparse.csr_matrix((0, n))
+  return scipy.sparse.vstack(blocks, format='csr')
@@ -0,0 +1,118 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Accuracy of graph_world.data.ppr against dense PPR matrices."""
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import networkx as nx
+import numpy as np
+import scipy.sparse
+from torch_geometric.data import Data
+from torch_geometric.transforms import GDC
+from torch_geometric.utils import from_scipy_sparse_matrix
+
+from graph_world.data.ppr import ppr_topk, topk_per_row
+
+_ALPHA = 0.15
+
+
+def _Adjacency(with_isolated=True):
+  """A random graph, with two isolated (dangling) vertices when asked."""
+  graph = nx.gnp_random_graph(60, 0.08, seed=0)
+  if with_isolated:
+    graph.add_nodes_from([60, 61])
+  return nx.to_scipy_sparse_array(graph, nodelist=range(len(graph)),
+                                  format='csr').astype(np.float64)
+
+
+def _DenseRandomWalkPpr(adjacency):
+  """alpha (I - (1 - alpha) D^-1 A)^-1, dangling vertices return to source."""
+  dense = adjacency.toarray()
+  n = dense.shape[0]
+  degrees = dense.sum(axis=1)
+  walk = np.divide(dense, degrees[:, None], out=np.zeros_like(dense),
+                   where=degrees[:, None] > 0)
+  ppr = _ALPHA * np.linalg.inv(np.eye(n) - (1.0 - _ALPHA) * walk)
+  # Only an isolated source reaches a dangling vertex, and all its walk mass
+  # returns to it.
+  ppr[degrees == 0] = np.eye(n)[degrees == 0]
+  return ppr
+
+
+def _GdcPpr(adjacency):
+  """The dense PPR diffusion of torch_geometric's GDC, not sparsified."""
+  n = adjacency.shape[0]
+  edge_index, edge_weight = from_scipy_sparse_matrix(adjacency)
+  gdc = GDC(self_loop_weight=1, normalization_in='sym', normalization_out=None,
+            diffusion_kwargs=dict(method='ppr', alpha=_ALPHA),
+            sparsification_kwargs=dict(method='threshold', eps=0.0),
+            exact=True)
+  data = gdc(Data(edge_index=edge_index, edge_attr=edge_weight.float(),
+                  num_nodes=n))
+  ppr = np.zeros((n, n))
+  ppr[data.edge_index[0].numpy(), data.edge_index[1].numpy()] = (
+    data.edge_attr.double().numpy())
+  return ppr
+
+
+class PprTopkTest(parameterized.TestCase):
+
+  @parameterized.parameters(1, 4)
+  def test_random_walk_matches_dense(self, num_threads):
+    adjacency = _Adjacency()
+    ppr = ppr_topk(adjacency, _ALPHA, tol=1e-8, batch_size=16,
+                   num_threads=num_threads)
+    np.testing.assert_allclose(ppr.toarray(), _DenseRandomWalkPpr(adjacency),
+                               atol=1e-5)
+
+  def test_error_is_bounded_by_tolerance(self):
+    adjacency = _Adjacency()
+    tol = 1e-4
+    ppr = ppr_topk(adjacency, _ALPHA, tol=tol).toarray()
+    error = _DenseRandomWalkPpr(adjacency) - ppr
+    degrees = np.maximum(np.asarray(adjacency.sum(axis=1)).ravel(), 1.0)
+    self.assertTrue(np.all(error >= -1e-12))
+    self.assertTrue(np.all(error <= tol * degrees[None, :] + 1e-12))
+
+  @parameterized.parameters(1, 4)
+  def test_symmetric_matches_gdc(self, num_threads):
+    adjacency = _Adjacency(with_isolated=False)
+    ppr = ppr_topk(adjacency, _ALPHA, tol=1e-8, normalization='sym',
+                   self_loops=True, batch_size=16, num_threads=num_threads)
+    np.testing.assert_allclose(ppr.toarray(), _GdcPpr(adjacency), atol=1e-5)
+
+  def test_sources_and_topk(self):
+    adjacency = _Adjacency()
+    sources = np.array([5, 0, 61, 17])
+    full = ppr_topk(adjacency, _ALPHA, tol=1e-8, exclude_self=True)
+    ppr = ppr_topk(adjacency, _ALPHA, sources=sources, k=3, tol=1e-8,
+                   exclude_self=True, batch_size=3, num_threads=2)
+    expected = topk_per_row(full[sources], 3)
+    np.testing.assert_array_equal(ppr.indices, expected.indices)
+    np.testing.assert_allclose(ppr.data, expected.data)
+    self.assertTrue(np.all(np.diff(ppr.indptr) <= 3))
+    self.assertEqual(ppr[np.arange(4), sources].sum(), 0.0)
+
+  def test_topk_per_row(self):
+    matrix = scipy.sparse.csr_matrix(np.array([[0.1, 0.5, 0.0, 0.3],
+                                               [0.0, 0.0, 0.0, 0.0],
+                                               [0.2, 0.0, 0.9, 0.0]]))
+    np.testing.assert_array_equal(
+      topk_per_row(matrix, 2).toarray(),
+      [[0.0, 0.5, 0.0, 0.3], [0.0, 0.0, 0.0, 0.0], [0.2, 0.0, 0.9, 0.0]])
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -0,0 +1,101 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Vectorized conversion of graph_tool graphs to torch_geometric Data.
+
+Every edge (u, v) of the undirected input graph is emitted as the two directed
+edges (u, v), (v, u), in graph.get_edges() order. Edge attributes, which are
+stored once per undirected edge, are duplicated by array indexing so that they
+line up with edge_index.
+"""
+
+from typing import Optional
+
+import numpy as np
+import torch
+from torch_geometric.data import Data
+
+
+def undirected_edge_array(edges: np.ndarray) -> np.ndarray:
+  """Returns a (2, 2 * num_edges) int64 array with both edge directions.
+  Args:
+    edges: (num_edges, 2) array of undirected edges.
+  Returns:
+    edge array where column 2i is edge i and column 2i + 1 its reverse.
+  """
+  edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+  edge_array = np.empty((2, 2 * edges.shape[0]), dtype=np.int64)
+  edge_array[0, 0::2] = edges[:, 0]
+  edge_array[1, 0::2] = edges[:, 1]
+  edge_array[0, 1::2] = edges[:, 1]
+  edge_array[1, 1::2] = edges[:, 0]
+  return edge_array
+
+
+def graph_edge_index(graph) -> torch.Tensor:
+  """Returns the torch_geometric edge_index of an undirected graph."""
+  return torch.from_numpy(undirected_edge_array(graph.get_edges()))
+
+
+def duplicated_edge_attr(edge_features) -> Optional[torch.Tensor]:
+  """Repeats per-edge features so they align with graph_edge_index.
+  Args:
+    edge_features: EdgeFeatures store, or None.
+  Returns:
+    (2 * num_edges, feature_dim) float tensor, or None if there are no edge
+    features to convert.
+  """
+  if edge_features is None or edge_features.feature_dim == 0:
+    return None
+  return torch.from_numpy(np.repeat(edge_features.features, 2, axis=0))
+
+
+def _as_tensor(array, dtype) -> torch.Tensor:
+  if isinstance(array, torch.Tensor):
+    return array.to(dtype)
+  return torch.from_numpy(np.ascontiguousarray(array)).to(dtype)
+
+
+def graph_to_torchgeo_data(graph,
+                           node_features,
+                           y=None,
+                           edge_features=None,
+                           y_dtype=torch.long,
+                           x_dtype: Optional[torch.dtype] = torch.float) -> Data:
+  """Converts a graph_tool graph and its node/edge data to a torchgeo Data.
+  Args:
+    graph: undirected graph_tool Graph.
+    node_features: (num_nodes, feature_dim) numpy array.
+    y: optional per-node (or per-graph) targets.
+    edge_features: optional EdgeFeatures store aligned with graph.get_edges().
+    y_dtype: torch dtype for array-valued targets.
+    x_dtype: torch dtype for node features. If None, the numpy dtype is kept.
+  Returns:
+    torch_geometric Data. Arrays are wrapped with torch.from_numpy, so no copy
+    is made when the input dtypes already match.
+  """
+  if x_dtype is None:
+    x = torch.from_numpy(np.ascontiguousarray(node_features))
+  else:
+    x = _as_tensor(node_features, x_dtype)
+  data = Data(x=x, edge_index=graph_edge_index(graph))
+  edge_attr = duplicated_edge_attr(edge_features)
+  if edge_attr is not None:
+    data.edge_attr = edge_attr
+  if y is not None:
+    if np.isscalar(y):
+      data.y = y
+    else:
+      data.y = _as_tensor(y, y_dtype)
+  return data
@@ -24,9 +24,9 @@ import graph_tool
 import numpy as np
 import networkx as nx
 from tqdm.notebook import tqdm
-from cabam import CABAM as CABAM_git
 
 from graph_tool.all import *
+from graph_world.data.edge_features import EdgeFeatures
 from graph_world.generators.sbm_simulator import SimulateFeatures, MatchType, SimulateEdgeFeatures
 
 @dataclasses.dataclass
@@ -38,7 +38,7 @@ class CABAM:
     graph_memberships: np.ndarray = Ellipsis
     node_features: np.ndarray = Ellipsis
     feature_memberships: np.ndarray = Ellipsis
-    edge_features: Dict[Tuple[int, int], np.ndarray] = Ellipsis
+    edge_features: EdgeFeatures = Ellipsis
 
 
 def NetworkxToGraphWorldData(G, node_labels, cabam_data):
@@ -53,24 +53,120 @@ def NetworkxToGraphWorldData(G, node_labels, cabam_data):
   """
   cabam_data.graph_memberships = list(node_labels) # Memberships is integer node class list
 
-  # Manipulate G into cabam_data.graph Graph Tool object
-  nx_edges = list(G.edges())
-  nx_nodes = list(G.nodes())
+  # Manipulate G into cabam_data.graph Graph Tool object. Vertex i of the
+  # graph_tool graph is the i-th node of G, and all edges are added in bulk.
+  vertices = {node: i for i, node in enumerate(G.nodes())}
+  edges = np.array([(vertices[src], vertices[dst]) for src, dst in G.edges()],
+                   dtype=np.int64).reshape(-1, 2)
   cabam_data.graph = graph_tool.Graph(directed=False)
-
-  # Add the nodes
-  vertices = {} # vertex mapping for tracking edges later
-  for node in nx_nodes:
-      # Create the vertex and annotate for our edges later
-      v = cabam_data.graph.add_vertex()
-      vertices[node] = v
-  # Add the edges
-  for src, dst in nx_edges:
-      # Look up the vertex structs from our vertices mapping and add edge.
-      e = cabam_data.graph.add_edge(vertices[src], vertices[dst])
+  cabam_data.graph.add_vertex(len(vertices))
+  cabam_data.graph.add_edge_list(edges)
   return cabam_data
 
 
+def _SampleAttachmentTargets(num_targets, label, labels, degrees, endpoints,
+                             num_endpoints, p_in, assortativity_type,
+                             temperature, max_rounds=100):
+  """Picks distinct attachment targets for one new CABAM node.
+  Candidates are proposed proportionally to degree, by uniform draws from the
+  endpoint table, and accepted with probability proportional to the class
+  assortativity weight of the (new node, candidate) pair. The accepted
+  targets therefore follow degree * assortativity weight.
+  Args:
+    num_targets: number of distinct targets to return.
+    label: class of the new node.
+    labels: class of every node.
+    degrees: current degree of every node.
+    endpoints: array of edge endpoints; each node appears degree times.
+    num_endpoints: number of valid entries at the start of `endpoints`.
+    p_in: intra-class link probability for FIXED assortativity.
+    assortativity_type: 1 for FIXED, 2 for DEGREE DEPENDENT assortativity.
+    temperature: tanh temperature for DEGREE DEPENDENT assortativity.
+    max_rounds: number of proposal batches before falling back to plain
+      preferential attachment for the remaining targets.
+  Returns:
+    int64 array of distinct target nodes.
+  """
+  if assortativity_type == 1:
+    max_weight = max(p_in, 1.0 - p_in)
+  else:
+    max_weight = 1.0
+  targets = []
+  chosen = set()
+  for round_index in range(max_rounds + 1):
+    proposals = endpoints[np.random.randint(0, num_endpoints,
+                                            size=4 * num_targets)]
+    if round_index < max_rounds and max_weight > 0:
+      same_class = labels[proposals] == label
+      if assortativity_type == 1:
+        weights = np.where(same_class, p_in, 1.0 - p_in)
+      else:
+        intra = np.tanh(degrees[proposals] / temperature)
+        weights = np.where(same_class, intra, 1.0 - intra)
+      accepted = np.random.uniform(0, max_weight,
+                                   size=proposals.shape[0]) < weights
+      proposals = proposals[accepted]
+    for node in proposals:
+      if node not in chosen:
+        chosen.add(node)
+        targets.append(node)
+        if len(targets) == num_targets:
+          return np.array(targets, dtype=np.int64)
+  return np.array(targets, dtype=np.int64)
+
+
+def GenerateCABAMGraphNative(n, m, pi, inter_link_strength, assortativity_type,
+                             temperature):
+  """Samples a CABAM graph with NumPy.
+  Implements class-assortative preferential attachment: every node draws a
+  class from pi, and each arriving node links to m distinct earlier nodes,
+  chosen with probability proportional to degree times the assortativity
+  weight of GenerateAssortativityDict (the intra-class weight for same-class
+  targets, the inter-class weight otherwise; under DEGREE DEPENDENT
+  assortativity the weight depends on the target's degree). Degrees are kept
+  in an array and targets are sampled in batches from an endpoint table, so
+  no NetworkX graph is built. The first m nodes form the seed, and node m
+  links to all of them.
+  Args:
+    n: number of nodes in graph
+    m: number of edges to add at each timestep in graph generation
+    pi: class assignment probability vector
+    inter_link_strength: probability of intra-class assignment with FIXED
+      assortativity
+    assortativity_type: integer representing assortativity type chosen
+    temperature: temperature of tanh function with DEGREE DEPENDENT
+      assortativity
+  Returns:
+    edges: (num_edges, 2) int64 array.
+    labels: (n,) int array of node classes.
+  """
+  labels = np.random.choice(len(pi), size=n, p=np.asarray(pi) / np.sum(pi))
+  num_seed = min(m, n)
+  num_edges = max(n - num_seed, 0) * m
+  edges = np.zeros((num_edges, 2), dtype=np.int64)
+  endpoints = np.zeros(2 * num_edges, dtype=np.int64)
+  degrees = np.zeros(n, dtype=np.int64)
+  num_endpoints = 0
+  edge_pos = 0
+  for node in range(num_seed, n):
+    if num_endpoints == 0:
+      targets = np.arange(num_seed, dtype=np.int64)
+    else:
+      targets = _SampleAttachmentTargets(
+        min(m, node), labels[node], labels, degrees, endpoints, num_endpoints,
+        inter_link_strength, assortativity_type, temperature)
+    num_new = targets.shape[0]
+    edges[edge_pos:edge_pos + num_new, 0] = node
+    edges[edge_pos:edge_pos + num_new, 1] = targets
+    edge_pos += num_new
+    endpoints[num_endpoints:num_endpoints + num_new] = targets
+    endpoints[num_endpoints + num_new:num_endpoints + 2 * num_new] = node
+    num_endpoints += 2 * num_new
+    degrees[targets] += 1
+    degrees[node] += num_new
+  return edges[:edge_pos], labels
+
+
 def GenerateAssortativityDict(p_in, assortativity_type, temperature):
     """
     Generates a dictionary representing the Assortativity Constant in CABAM generation - the parameter named 'c_probs'.
@@ -100,7 +196,10 @@ def GenerateCABAMGraphWithFeatures(
     edge_feature_dim=0,
     edge_center_distance=0.0,
     edge_cluster_variance=1.0,
-    normalize_features=True):
+    normalize_features=True,
+    legacy_feature_sampling=False,
+    feature_dtype=np.float64,
+    cabam_backend='cabam'):
     """
     Generates Class Assortative Graphs via the Barabasi Albert Model (CABAM) with node features.
     Args:
@@ -118,13 +217,28 @@ def GenerateCABAMGraphWithFeatures(
         feature_group_match_type: see sbm_simulator.MatchType.
         feature_cluster_variance: variance of feature clusters around their centers.
             centers. Increasing this weakens node feature signal.
+        legacy_feature_sampling: see sbm_simulator.SimulateFeatures.
+        feature_dtype: numpy dtype of the node features.
+        cabam_backend: 'cabam' to use the external cabam package, or 'native'
+            to use GenerateCABAMGraphNative.
     Returns:
         result: CABAM dataclass instance to store graph data
     """
     result = CABAM()
-    CABAM_model = CABAM_git()
-    G, _, node_labels, _, _ = CABAM_model.generate_graph(n=n, m=m, num_classes=num_feature_groups, native_class_probs=pi.tolist(), inter_intra_link_probs=GenerateAssortativityDict(inter_link_strength, assortativity_type, temperature) )
-    NetworkxToGraphWorldData(G, node_labels, result)
+    if cabam_backend == 'native':
+      edges, node_labels = GenerateCABAMGraphNative(
+        n, m, pi, inter_link_strength, assortativity_type, temperature)
+      result.graph_memberships = node_labels
+      result.graph = graph_tool.Graph(directed=False)
+      result.graph.add_vertex(n)
+      result.graph.add_edge_list(edges)
+    elif cabam_backend == 'cabam':
+      from cabam import CABAM as CABAM_git
+      CABAM_model = CABAM_git()
+      G, _, node_labels, _, _ = CABAM_model.generate_graph(n=n, m=m, num_classes=num_feature_groups, native_class_probs=pi.tolist(), inter_intra_link_probs=GenerateAssortativityDict(inter_link_strength, assortativity_type, temperature) )
+      NetworkxToGraphWorldData(G, node_labels, result)
+    else:
+      raise ValueError("unknown cabam_backend: %s" % cabam_backend)
 
     # Borrowing node and edge feature generation from SBM
     SimulateFeatures(result, feature_center_distance,
@@ -132,7 +246,9 @@ def GenerateCABAMGraphWithFeatures(
                     num_feature_groups,
                     feature_group_match_type,
                     feature_cluster_variance,
-                    normalize_features)
+                    normalize_features,
+                    legacy_feature_sampling,
+                    feature_dtype)
     SimulateEdgeFeatures(result, edge_feature_dim,
                        edge_center_distance,
                        edge_cluster_variance)
@@ -32,3 +32,57 @@ def erdos_graph(num_vertices, edge_prob):
         g.add_edge(u, v)
         v = v + 1
   return g
+
+
+def erdos_edge_lists(num_graphs, num_vertices, edge_prob):
+  """Samples edge lists for a batch of Erdos-Renyi graphs at once.
+
+  The num_graphs * num_vertices * (num_vertices - 1) / 2 candidate node pairs
+  of all graphs are laid out in one sequence, and kept pairs are found by
+  geometric skip sampling over that sequence with NumPy. This gives every
+  pair an independent edge_prob chance, as in erdos_graph.
+  Args:
+    num_graphs: number of graphs to sample.
+    num_vertices: number of nodes in each graph.
+    edge_prob: probability of each undirected edge.
+  Returns:
+    list of num_graphs (num_edges, 2) int64 arrays with u < v, sorted in the
+    same (u, v) order as erdos_graph adds edges.
+  """
+  if num_graphs == 0:
+    return []
+  rows, cols = np.triu_indices(num_vertices, k=1)
+  num_pairs = rows.shape[0]
+  total_pairs = num_graphs * num_pairs
+  positions = np.zeros(0, dtype=np.int64)
+  if edge_prob > 0.0 and total_pairs > 0:
+    chunks = []
+    last = -1
+    while last < total_pairs:
+      chunk_size = int(total_pairs * edge_prob * 1.05) + 100
+      skips = np.random.geometric(edge_prob, size=chunk_size)
+      chunk = last + np.cumsum(skips, dtype=np.int64)
+      chunks.append(chunk)
+      last = chunk[-1]
+    positions = np.concatenate(chunks)
+    positions = positions[positions < total_pairs]
+  graph_ids = positions // num_pairs
+  pair_ids = positions % num_pairs
+  edges = np.stack([rows[pair_ids], cols[pair_ids]], axis=1).astype(np.int64)
+  splits = np.searchsorted(graph_ids, np.arange(1, num_graphs))
+  return np.split(edges, splits)
+
+
+def erdos_graphs(num_graphs, num_vertices, edge_prob):
+  """Samples a batch of Erdos-Renyi graphs, see erdos_edge_lists.
+
+  Unlike erdos_graph, every graph has num_vertices nodes even when edge_prob
+  is 0.0.
+  """
+  graphs = []
+  for edges in erdos_edge_lists(num_graphs, num_vertices, edge_prob):
+    g = graph_tool.Graph(directed=False)
+    _ = g.add_vertex(num_vertices)
+    g.add_edge_list(edges)
+    graphs.append(g)
+  return graphs
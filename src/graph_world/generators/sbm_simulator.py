@@ -24,6 +24,8 @@ import graph_tool
 import numpy as np
 
 from graph_tool.all import *
+from graph_world.data.csr_graph import CsrGraph
+from graph_world.data.edge_features import EdgeFeatures
 
 
 class MatchType(enum.Enum):
@@ -45,18 +47,19 @@ class MatchType(enum.Enum):
 class StochasticBlockModel:
   """Stores data for stochastic block model graphs with features.
   Attributes:
-    graph: graph-tool Graph object.
+    graph: graph-tool Graph object, or a CsrGraph for the native backend.
     graph_memberships: list of integer node classes.
     node_features: numpy array of node features.
     feature_memberships: list of integer node feature classes.
-    edge_features: map from edge tuple to numpy array. Only stores undirected
-      edges, i.e. (0, 1) will be in the map, but (1, 0) will not be.
+    edge_features: EdgeFeatures store with one row per graph edge, in
+      graph.get_edges() order. Also readable as a map from sorted edge tuple
+      to numpy array, i.e. (0, 1) will be in the map, but (1, 0) will not be.
   """
   graph: graph_tool.Graph = Ellipsis
   graph_memberships: np.ndarray = Ellipsis
   node_features: np.ndarray = Ellipsis
   feature_memberships: np.ndarray = Ellipsis
-  edge_features: Dict[Tuple[int, int], np.ndarray] = Ellipsis
+  edge_features: EdgeFeatures = Ellipsis
 
 
 def _GetNestingMap(large_k, small_k):
@@ -104,7 +107,8 @@ def _GenerateFeatureMemberships(
   # Parameter checks
   if num_groups is not None and num_groups == 0:
     raise ValueError("argument num_groups must be None or positive")
-  graph_num_groups = len(set(graph_memberships))
+  graph_memberships = np.asarray(graph_memberships)
+  graph_num_groups = len(np.unique(graph_memberships))
   if num_groups is None:
     num_groups = graph_num_groups
 
@@ -117,12 +121,10 @@ def _GenerateFeatureMemberships(
     nesting_map = _GetNestingMap(graph_num_groups, num_groups)
     # Creates deterministic map from (smaller) graph clusters to (larger)
     # feature clusters.
-    reverse_nesting_map = {}
+    reverse_nesting_map = np.zeros(graph_num_groups, dtype=int)
     for feature_cluster, graph_cluster_list in nesting_map.items():
-      for cluster in graph_cluster_list:
-        reverse_nesting_map[cluster] = feature_cluster
-    for cluster in graph_memberships:
-      memberships.append(reverse_nesting_map[cluster])
+      reverse_nesting_map[graph_cluster_list] = feature_cluster
+    memberships = reverse_nesting_map[graph_memberships]
   elif match_type == MatchType.NESTED:
     if num_groups < graph_num_groups:
       raise ValueError(
@@ -130,19 +132,19 @@ def _GenerateFeatureMemberships(
     nesting_map = _GetNestingMap(num_groups, graph_num_groups)
     # Creates deterministic map from (smaller) feature clusters to (larger)
     # graph clusters.
+    graph_cluster_sizes = np.bincount(graph_memberships,
+                                      minlength=graph_num_groups)
     for graph_cluster_id, feature_cluster_ids in nesting_map.items():
-      sorted_feature_cluster_ids = sorted(feature_cluster_ids)
+      sorted_feature_cluster_ids = np.sort(feature_cluster_ids)
       num_feature_groups = len(sorted_feature_cluster_ids)
       feature_pi = np.ones(num_feature_groups) / num_feature_groups
-      num_graph_cluster_nodes = np.sum(
-        [i == graph_cluster_id for i in graph_memberships])
-      sub_memberships = _GenerateNodeMemberships(num_graph_cluster_nodes,
-                                                 feature_pi)
-      sub_memberships = [sorted_feature_cluster_ids[i] for i in sub_memberships]
-      memberships.extend(sub_memberships)
+      sub_memberships = _GenerateNodeMemberships(
+        graph_cluster_sizes[graph_cluster_id], feature_pi)
+      memberships.append(sorted_feature_cluster_ids[sub_memberships])
+    memberships = np.concatenate(memberships)
   else:  # MatchType.RANDOM
     memberships = random.choices(range(num_groups), k=len(graph_memberships))
-  return np.array(sorted(memberships))
+  return np.sort(np.asarray(memberships))
 
 
 def _ComputeExpectedEdgeCounts(num_edges, num_vertices,
@@ -199,12 +201,7 @@ def _GenerateNodeMemberships(num_vertices,
     np vector of ints representing community indices.
   """
   community_sizes = _ComputeCommunitySizes(num_vertices, pi)
-  memberships = np.zeros(num_vertices, dtype=int)
-  node = 0
-  for i in range(len(pi)):
-    memberships[range(node, node + community_sizes[i])] = i
-    node += community_sizes[i]
-  return memberships
+  return np.repeat(np.arange(len(pi)), community_sizes)
 
 
 def SimulateSbm(sbm_data,
@@ -212,7 +209,8 @@ def SimulateSbm(sbm_data,
                 num_edges,
                 pi,
                 prop_mat,
-                out_degs=None):
+                out_degs=None,
+                rng=None):
   """Generates a stochastic block model, storing data in sbm_data.graph.
   This function uses graph_tool.generate_sbm. Refer to that
   documentation for more information on the model and parameters.
@@ -225,6 +223,9 @@ def SimulateSbm(sbm_data,
     out_degs: Out-degree propensity for each node. If not provided, a constant
       value will be used. Note that the values will be normalized inside each
       group, if they are not already so.
+    rng: optional numpy Generator. If given, graph_tool's random number
+      generator is seeded from it first, so the same Generator state always
+      yields the same graph (with a single OpenMP thread).
   Returns: (none)
   """
   if round(abs(np.sum(pi) - 1.0), 12) != 0:
@@ -234,6 +235,8 @@ def SimulateSbm(sbm_data,
   sbm_data.graph_memberships = _GenerateNodeMemberships(num_vertices, pi)
   edge_counts = _ComputeExpectedEdgeCounts(num_edges, num_vertices, pi,
                                            prop_mat)
+  if rng is not None:
+    graph_tool.seed_rng(int(rng.integers(2 ** 31 - 1)))
   sbm_data.graph = graph_tool.generation.generate_sbm(
     sbm_data.graph_memberships, edge_counts, out_degs)
   graph_tool.generation.remove_self_loops(sbm_data.graph)
@@ -241,13 +244,124 @@ def SimulateSbm(sbm_data,
   sbm_data.graph.reindex_edges()
 
 
+def _RandomIntegers(rng, low, high, size):
+  """Draws from np.random.randint, or from rng.integers if rng is given."""
+  if rng is None:
+    return np.random.randint(low, high, size=size)
+  return rng.integers(low, high, size=size)
+
+
+def _SampleBlockEndpoints(blocks, block_starts, block_ends, out_degs,
+                          rng=None):
+  """Samples one node per entry of `blocks` from the requested block.
+  Nodes are drawn within their block proportionally to out_degs (uniformly if
+  out_degs is None), by inverse-CDF lookup on the per-block cumulative
+  propensities.
+  Args:
+    blocks: int array of requested block ids.
+    block_starts: first node id of each block.
+    block_ends: one past the last node id of each block.
+    out_degs: optional per-node propensities.
+    rng: optional numpy Generator. Defaults to the global np.random state.
+  Returns:
+    int64 array of node ids, aligned with `blocks`.
+  """
+  nodes = np.empty(blocks.shape[0], dtype=np.int64)
+  order = np.argsort(blocks, kind='stable')
+  counts = np.bincount(blocks, minlength=len(block_starts))
+  offset = 0
+  for block, count in enumerate(counts):
+    if count == 0:
+      continue
+    start, end = block_starts[block], block_ends[block]
+    if out_degs is None:
+      sampled = _RandomIntegers(rng, start, end, count)
+    else:
+      cumulative = np.cumsum(out_degs[start:end], dtype=np.float64)
+      if cumulative[-1] <= 0:
+        sampled = _RandomIntegers(rng, start, end, count)
+      else:
+        draws = (np.random if rng is None else rng).uniform(
+          0, cumulative[-1], size=count)
+        sampled = start + np.minimum(
+          np.searchsorted(cumulative, draws, side='right'), end - start - 1)
+    nodes[order[offset:offset + count]] = sampled
+    offset += count
+  return nodes
+
+
+def SimulateSbmNative(sbm_data,
+                      num_vertices,
+                      num_edges,
+                      pi,
+                      prop_mat,
+                      out_degs=None,
+                      rng=None):
+  """Generates a stochastic block model with NumPy, storing a CsrGraph.
+  This samples the same degree-corrected model as SimulateSbm, without using
+  graph_tool. The number of edges between each block pair is Poisson with the
+  expected count from _ComputeExpectedEdgeCounts (halved on the diagonal,
+  following the graph_tool convention). Endpoints are drawn within each block
+  in proportion to out_degs. Self-loops are dropped and parallel edges are
+  merged via sorted int64 edge keys, matching the clean-up done by
+  SimulateSbm.
+  Args:
+    sbm_data: StochasticBlockModel dataclass to store result data.
+    num_vertices: (int) number of nodes in the graph.
+    num_edges: (int) expected number of edges in the graph.
+    pi: iterable of non-zero community size proportions. Must sum to 1.0.
+    prop_mat: square, symmetric matrix of community edge count rates.
+    out_degs: Out-degree propensity for each node. If not provided, a constant
+      value will be used. Note that the values will be normalized inside each
+      group, if they are not already so.
+    rng: optional numpy Generator. Defaults to the global np.random state.
+  Returns: (none)
+  """
+  if round(abs(np.sum(pi) - 1.0), 12) != 0:
+    raise ValueError("entries of pi ( must sum to 1.0")
+  if prop_mat.shape[0] != len(pi) or prop_mat.shape[1] != len(pi):
+    raise ValueError("prop_mat must be k x k where k = len(pi)")
+  sbm_data.graph_memberships = _GenerateNodeMemberships(num_vertices, pi)
+  edge_counts = _ComputeExpectedEdgeCounts(num_edges, num_vertices, pi,
+                                           prop_mat)
+  block_sizes = np.bincount(sbm_data.graph_memberships, minlength=len(pi))
+  block_ends = np.cumsum(block_sizes)
+  block_starts = block_ends - block_sizes
+  if out_degs is not None:
+    out_degs = np.asarray(out_degs, dtype=np.float64)
+
+  # Sample edge counts for each unordered block pair.
+  row_blocks, col_blocks = np.triu_indices(len(pi))
+  expected = edge_counts[row_blocks, col_blocks]
+  expected = np.where(row_blocks == col_blocks, expected / 2.0, expected)
+  pair_counts = (np.random if rng is None else rng).poisson(expected)
+  source_blocks = np.repeat(row_blocks, pair_counts)
+  target_blocks = np.repeat(col_blocks, pair_counts)
+
+  sources = _SampleBlockEndpoints(source_blocks, block_starts, block_ends,
+                                  out_degs, rng)
+  targets = _SampleBlockEndpoints(target_blocks, block_starts, block_ends,
+                                  out_degs, rng)
+
+  # Remove self-loops and parallel edges.
+  keep = sources != targets
+  low = np.minimum(sources[keep], targets[keep])
+  high = np.maximum(sources[keep], targets[keep])
+  keys = np.sort(low * num_vertices + high)
+  keys = keys[np.concatenate([keys[:1] == keys[:1], keys[1:] != keys[:-1]])]
+  sbm_data.graph = CsrGraph.FromEdges(num_vertices, keys // num_vertices,
+                                      keys % num_vertices)
+
+
 def SimulateFeatures(sbm_data,
                      center_var,
                      feature_dim,
                      num_groups,
                      match_type=MatchType.RANDOM,
                      cluster_var=1.0,
-                     normalize_features=True):
+                     normalize_features=True,
+                     legacy_sampling=False,
+                     dtype=np.float64):
   """Generates node features using multivate normal mixture model.
   This function does nothing and throws a warning if
   sbm_data.graph_memberships is empty. Run SimulateSbm to fill that field.
@@ -261,6 +375,12 @@ def SimulateFeatures(sbm_data,
      mean zero and covariance matrix cluster_var * I_{feature_dim}.
     match_type: (MatchType) see sbm_simulator.MatchType for details.
     cluster_var: (float) variance of feature clusters around their centers.
+    normalize_features: (bool) whether to l2-normalize each feature vector.
+    legacy_sampling: (bool) if True, draws every center and node feature with a
+      separate np.random.multivariate_normal call. This reproduces features
+      generated by earlier versions for a fixed seed, but is much slower than
+      the default batched draw, which exploits the isotropic covariances.
+    dtype: numpy dtype of the stored features, e.g. np.float32 to halve memory.
   Raises:
     RuntimeWarning: if simulator has no graph or a graph with no nodes.
   """
@@ -274,20 +394,31 @@ def SimulateFeatures(sbm_data,
     num_groups=num_groups,
     match_type=match_type)
 
-  # Get centers
-  centers = []
-  center_cov = np.identity(feature_dim) * center_var
-  cluster_cov = np.identity(feature_dim) * cluster_var
-  for _ in range(num_groups):
-    center = np.random.multivariate_normal(
-      np.zeros(feature_dim), center_cov, 1)[0]
-    centers.append(center)
-  features = []
-  for cluster_index in sbm_data.feature_memberships:
-    feature = np.random.multivariate_normal(centers[cluster_index], cluster_cov,
-                                            1)[0]
-    features.append(feature)
-  features = np.array(features)
+  if legacy_sampling:
+    # Get centers
+    centers = []
+    center_cov = np.identity(feature_dim) * center_var
+    cluster_cov = np.identity(feature_dim) * cluster_var
+    for _ in range(num_groups):
+      center = np.random.multivariate_normal(
+        np.zeros(feature_dim), center_cov, 1)[0]
+      centers.append(center)
+    features = []
+    for cluster_index in sbm_data.feature_memberships:
+      feature = np.random.multivariate_normal(centers[cluster_index],
+                                              cluster_cov, 1)[0]
+      features.append(feature)
+    features = np.array(features)
+  else:
+    # With identity covariances every coordinate is an independent normal, so
+    # all centers and all per-node offsets can be drawn in two batched calls.
+    centers = np.random.standard_normal(
+      size=(num_groups, feature_dim)) * np.sqrt(center_var)
+    features = np.random.standard_normal(
+      size=(len(sbm_data.feature_memberships), feature_dim))
+    features *= np.sqrt(cluster_var)
+    features += centers[sbm_data.feature_memberships]
+  features = features.astype(dtype, copy=False)
   if normalize_features:
     features = normalize(features)
   sbm_data.node_features = features
@@ -298,8 +429,9 @@ def SimulateEdgeFeatures(sbm_data,
                          center_distance=0.0,
                          cluster_variance=1.0):
   """Generates edge feature distribution via inter-class vs intra-class.
-  Edge feature data is stored as an sbm_data attribute named `edge_feature`, a
-  dict from 2-tuples of node IDs to numpy vectors.
+  Edge feature data is stored as an sbm_data attribute named `edge_features`,
+  an EdgeFeatures store whose rows follow sbm_data.graph.get_edges() order.
+  If feature_dim is 0, no features are sampled and the store is empty.
   Edge features have two centers: one at (0, 0, ....) and one at
   (center_distance, center_distance, ....) for inter-class and intra-class
   edges (respectively). They are generated from a multivariate normal with
@@ -322,21 +454,19 @@ def SimulateEdgeFeatures(sbm_data,
   if sbm_data.graph_memberships is None:
     raise RuntimeWarning("graph has no memberships: no features generated.")
 
-  center0 = np.zeros(shape=(feature_dim,))
-  center1 = np.ones(shape=(feature_dim,)) * center_distance
-  covariance = np.identity(feature_dim) * cluster_variance
-  sbm_data.edge_features = {}
-  for edge in sbm_data.graph.edges():
-    vertex1 = int(edge.source())
-    vertex2 = int(edge.target())
-    edge_tuple = tuple(sorted((vertex1, vertex2)))
-    if (sbm_data.graph_memberships[vertex1] ==
-        sbm_data.graph_memberships[vertex2]):
-      center = center1
-    else:
-      center = center0
-    sbm_data.edge_features[edge_tuple] = np.random.multivariate_normal(
-      center, covariance, 1)[0]
+  if feature_dim == 0:
+    sbm_data.edge_features = EdgeFeatures.Empty()
+    return
+
+  edges = sbm_data.graph.get_edges()
+  memberships = np.asarray(sbm_data.graph_memberships)
+  intra_class = memberships[edges[:, 0]] == memberships[edges[:, 1]]
+  # The covariance is isotropic, so all edges are drawn in one batch and
+  # intra-class edges are shifted to the (center_distance, ...) center.
+  features = np.random.standard_normal(size=(edges.shape[0], feature_dim))
+  features *= np.sqrt(cluster_variance)
+  features[intra_class] += center_distance
+  sbm_data.edge_features = EdgeFeatures(edges, features)
 
 
 def GenerateStochasticBlockModelWithFeatures(
@@ -353,7 +483,12 @@ def GenerateStochasticBlockModelWithFeatures(
     edge_feature_dim=0,
     edge_center_distance=0.0,
     edge_cluster_variance=1.0,
-    normalize_features=True):
+    normalize_features=True,
+    legacy_feature_sampling=False,
+    feature_dtype=np.float64,
+    sbm_backend='graph_tool',
+    structure=None,
+    structure_rng=None):
   """Generates stochastic block model (SBM) with node features.
   Args:
     num_vertices: number of nodes in the graph.
@@ -378,17 +513,40 @@ def GenerateStochasticBlockModelWithFeatures(
       inter-class means. Increasing this strengthens the edge feature signal.
     edge_cluster_variance: variance of edge clusters around their centers.
       Increasing this weakens the edge feature signal.
+    normalize_features: whether to l2-normalize node features.
+    legacy_feature_sampling: see SimulateFeatures `legacy_sampling`.
+    feature_dtype: numpy dtype of the node features.
+    sbm_backend: 'graph_tool' to sample with graph_tool.generate_sbm, or
+      'native' to use SimulateSbmNative, which stores a CsrGraph.
+    structure: optional StochasticBlockModel whose graph and
+      graph_memberships are reused instead of sampling a new graph. Only the
+      node and edge features are simulated in that case.
+    structure_rng: optional numpy Generator from which the graph is sampled,
+      so that a seeded Generator always yields the same graph. Features are
+      still drawn from the global np.random state.
   Returns:
     result: a StochasticBlockModel data class.
   """
   result = StochasticBlockModel()
-  SimulateSbm(result, num_vertices, num_edges, pi, prop_mat, out_degs)
+  if structure is not None:
+    result.graph = structure.graph
+    result.graph_memberships = structure.graph_memberships
+  elif sbm_backend == 'graph_tool':
+    SimulateSbm(result, num_vertices, num_edges, pi, prop_mat, out_degs,
+                structure_rng)
+  elif sbm_backend == 'native':
+    SimulateSbmNative(result, num_vertices, num_edges, pi, prop_mat, out_degs,
+                      structure_rng)
+  else:
+    raise ValueError("unknown sbm_backend: %s" % sbm_backend)
   SimulateFeatures(result, feature_center_distance,
                    feature_dim,
                    num_feature_groups,
                    feature_group_match_type,
                    feature_cluster_variance,
-                   normalize_features)
+                   normalize_features,
+                   legacy_feature_sampling,
+                   feature_dtype)
   SimulateEdgeFeatures(result, edge_feature_dim,
                        edge_center_distance,
                        edge_cluster_variance)
@@ -415,17 +573,19 @@ def MakePropMat(num_communities: int, p_to_q_ratio: float) -> np.ndarray:
 
 
 # Helper function to create a degree set that follows a power law for the
-# 'out_degs' parameter in SBM construction.
-def MakeDegrees(power_exponent, min_deg, num_vertices):
-  degrees = np.zeros(num_vertices)
+# 'out_degs' parameter in SBM construction. Degrees are drawn by inverse-CDF
+# sampling of all vertices at once, truncated to integers. Uniforms come from
+# `rng` if given, else from the global np.random state.
+def MakeDegrees(power_exponent, min_deg, num_vertices, rng=None):
   k_min = min_deg
   k_max = num_vertices
   gamma = power_exponent
-  for i in range(num_vertices):
-      degrees[i] = int(power_law(k_min, k_max, np.random.uniform(0,1), gamma))
-  return degrees
+  uniforms = (np.random if rng is None else rng).uniform(
+    0, 1, size=num_vertices)
+  return np.trunc(power_law(k_min, k_max, uniforms, gamma))
 
 
-# Helper function of MakeDegrees to construct power law samples
+# Helper function of MakeDegrees to construct power law samples. Accepts a
+# scalar or an array of uniform samples y.
 def power_law(k_min, k_max, y, gamma):
   return ((k_max**(-gamma+1) - k_min**(-gamma+1))*y  + k_min**(-gamma+1.0))**(1.0/(-gamma + 1.0))
@@ -17,13 +17,12 @@ import logging
 import apache_beam as beam
 import gin
 import numpy as np
-import pandas as pd
 from torch_geometric.data import DataLoader
 
 from ..beam.benchmarker import BenchmarkGNNParDo
 from ..beam.generator_beam_handler import GeneratorBeamHandler
 from .utils import graph_regression_dataset_example_to_torch_geo_data
-from ..metrics.graph_metrics import graph_metrics
+from ..metrics.standard_metrics import MetricSelection
 
 
 class SampleGraphRegressionDatasetDoFn(beam.DoFn):
@@ -48,11 +47,12 @@ class WriteGraphRegressionDatasetDoFn(beam.DoFn):
 
 class ComputeGraphRegressionMetricsParDo(beam.DoFn):
 
+  def __init__(self):
+    self._metrics = MetricSelection()
+
   def process(self, element):
     out = element
-    graph_metrics_df = pd.DataFrame(
-      data=[graph_metrics(graph) for graph in element['data'].graphs])
-    out['metrics'] = dict(graph_metrics_df.mean())
+    out['metrics'] = self._metrics.Average(element['data'].graphs)
     yield out
 
 
@@ -117,6 +117,8 @@ class GraphRegressionBeamHandler(GeneratorBeamHandler):
   def __init__(self, benchmarker_wrappers, generator_wrapper, batch_size,
                num_tuning_rounds=1, tuning_metric='',
                tuning_metric_is_loss=False):
+    self._benchmarker_wrappers = benchmarker_wrappers
+    self._generator_wrapper = generator_wrapper
     self._sample_do_fn = SampleGraphRegressionDatasetDoFn(generator_wrapper)
     self._benchmark_par_do = BenchmarkGNNParDo(
         benchmarker_wrappers, num_tuning_rounds, tuning_metric,
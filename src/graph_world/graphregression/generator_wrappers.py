@@ -20,7 +20,7 @@ import numpy as np
 from sklearn.preprocessing import scale
 
 from ..beam.generator_config_sampler import GeneratorConfigSampler
-from ..generators.er_simulator import erdos_graph
+from ..generators.er_simulator import erdos_graphs
 from ..graphregression.utils import GraphRegressionDataset
 
 
@@ -78,7 +78,7 @@ def _GenerateSubstructureDataset(
     num_vertices: int,
     edge_prob: float,
     substruct_graph: graph_tool.Graph):
-  graphs = [erdos_graph(num_vertices, edge_prob) for _ in range(num_graphs)]
+  graphs = erdos_graphs(num_graphs, num_vertices, edge_prob)
   substruct_counts = []
   for graph in graphs:
     assert graph.num_vertices() == num_vertices, "num_vertices is %d" % graph.num_vertices()
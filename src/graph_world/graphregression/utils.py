@@ -22,6 +22,8 @@ import numpy as np
 import torch
 from torch_geometric.data import Data
 
+from ..data.torchgeo import graph_to_torchgeo_data
+
 
 @dataclasses.dataclass
 class GraphRegressionDataset:
@@ -39,13 +41,5 @@ class GraphRegressionDataset:
 def graph_regression_dataset_example_to_torch_geo_data(
     graph: graph_tool.Graph, target: float,
     features: Optional[np.ndarray] = None) -> Data:
-  edge_tuples = []
-  for edge in graph.iter_edges():
-    edge_tuples.append([edge[0], edge[1]])
-    edge_tuples.append([edge[1], edge[0]])
-
-  node_features = torch.from_numpy(features)
-  edge_index = torch.tensor(edge_tuples, dtype=torch.long)
-  return Data(x=node_features, edge_index=edge_index.t().contiguous(),
-              y=float(target))
-
+  return graph_to_torchgeo_data(graph, features, y=float(target),
+                                x_dtype=None)
@@ -24,10 +24,13 @@ from ..linkprediction.utils import LinkPredictionDataset
 class SbmGeneratorWrapper(GeneratorConfigSampler):
 
   def __init__(self, param_sampler_specs, marginal=False,
-               normalize_features=True):
+               normalize_features=True, legacy_feature_sampling=False,
+               feature_dtype='float64'):
     super(SbmGeneratorWrapper, self).__init__(param_sampler_specs)
     self._marginal = marginal
     self._normalize_features = normalize_features
+    self._legacy_feature_sampling = legacy_feature_sampling
+    self._feature_dtype = np.dtype(feature_dtype)
     self._AddSamplerFn('nvertex', self._SampleUniformInteger)
     self._AddSamplerFn('avg_degree', self._SampleUniformFloat)
     self._AddSamplerFn('feature_center_distance', self._SampleUniformFloat)
@@ -64,10 +67,12 @@ class SbmGeneratorWrapper(GeneratorConfigSampler):
       feature_center_distance=generator_config['feature_center_distance'],
       feature_dim=generator_config['feature_dim'],
       edge_center_distance=generator_config['edge_center_distance'],
-      edge_feature_dim=generator_config['edge_feature_dim'],
+      edge_feature_dim=self._EdgeFeatureDim(generator_config),
       out_degs=np.random.power(generator_config['power_exponent'],
                                generator_config['nvertex']),
-      normalize_features=self._normalize_features
+      normalize_features=self._normalize_features,
+      legacy_feature_sampling=self._legacy_feature_sampling,
+      feature_dtype=self._feature_dtype
     )
 
     return {'sample_id': sample_id,
@@ -20,6 +20,9 @@ import torch
 from torch_geometric.data import Data
 from torch_geometric.utils import train_test_split_edges
 
+from ..data.edge_features import EdgeFeatures
+from ..data.torchgeo import graph_to_torchgeo_data
+
 
 @dataclasses.dataclass
 class LinkPredictionDataset:
@@ -35,33 +38,17 @@ class LinkPredictionDataset:
   """
   graph: graph_tool.Graph = Ellipsis
   node_features: np.ndarray = Ellipsis
-  edge_features: Dict[Tuple[int, int], np.ndarray] = Ellipsis
+  edge_features: EdgeFeatures = Ellipsis
   graph_memberships: np.ndarray = Ellipsis
 
 
 def linkprediction_data_to_torchgeo_data(
     linkprediction_data: LinkPredictionDataset,
     training_ratio, tuning_ratio) -> Data:
-  edge_tuples = []
-  edge_feature_data = []
-  for edge in linkprediction_data.graph.iter_edges():
-    edge_tuples.append([edge[0], edge[1]])
-    edge_tuples.append([edge[1], edge[0]])
-    ordered_tuple = (edge[0], edge[1])
-    if edge[0] > edge[1]:
-      ordered_tuple = (edge[1], edge[0])
-    edge_feature_data.append(
-        linkprediction_data.edge_features[ordered_tuple])
-    edge_feature_data.append(
-        linkprediction_data.edge_features[ordered_tuple])
-
-  node_features = torch.tensor(linkprediction_data.node_features,
-                               dtype=torch.float)
-  edge_index = torch.tensor(edge_tuples, dtype=torch.long)
-  edge_attr = torch.tensor(edge_feature_data, dtype=torch.float)
-  labels = torch.tensor(linkprediction_data.graph_memberships,
-                        dtype=torch.long)
-  torch_data = Data(x=node_features, edge_index=edge_index.t().contiguous(),
-                    edge_attr=edge_attr, y=labels)
+  torch_data = graph_to_torchgeo_data(
+      linkprediction_data.graph,
+      linkprediction_data.node_features,
+      y=linkprediction_data.graph_memberships,
+      edge_features=linkprediction_data.edge_features)
   return train_test_split_edges(torch_data, val_ratio=tuning_ratio,
                                 test_ratio=1.0 - training_ratio - tuning_ratio)
@@ -0,0 +1,234 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Graph metrics of many small graphs, computed in one pass.
+
+The graphs of a dataset are laid out as one block-diagonal sparse graph.
+Degrees, core numbers, triangles and components are computed on it once,
+and per-graph statistics are segment reductions over the vertices of each
+graph, which are contiguous. This avoids the per-graph Python overhead of
+calling graph_metrics on thousands of tiny graphs.
+"""
+
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import scipy.sparse.csgraph
+
+from . import diameter
+from . import graph_metrics_csr as csr
+
+
+def _segment_sum(values: np.ndarray, segments: np.ndarray,
+                 num_segments: int) -> np.ndarray:
+  return np.bincount(segments, weights=values, minlength=num_segments)
+
+
+def _segment_gini(values: np.ndarray, segments: np.ndarray,
+                  num_segments: int) -> np.ndarray:
+  """Computes _gini_coefficient of the values of each segment."""
+  values = values.astype(np.float32) + np.finfo(np.float32).eps
+  order = np.lexsort((values, segments))
+  values = values[order]
+  segments = segments[order]
+  sizes = np.bincount(segments, minlength=num_segments)
+  offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+  index = np.arange(values.shape[0]) - offsets[segments] + 1
+  n = sizes[segments]
+  numerators = _segment_sum((2 * index - n - 1) * values, segments,
+                            num_segments)
+  totals = _segment_sum(values, segments, num_segments)
+  result = np.zeros(num_segments)
+  has_values = sizes > 0
+  result[has_values] = (numerators[has_values] /
+                        (sizes[has_values] * totals[has_values]))
+  return result
+
+
+_CORENESS_METRICS = ('coreness_eq_1', 'coreness_geq_2', 'coreness_geq_5',
+                     'coreness_geq_10', 'coreness_gini')
+_TRIANGLE_METRICS = ('avg_cc', 'transitivity', 'num_triangles')
+
+
+def _per_graph_metrics(edge_arrays: Sequence[np.ndarray],
+                       num_vertices: Sequence[int], exact_diameter: bool,
+                       diameter_sweeps: int,
+                       metrics: Optional[Sequence[str]] = None,
+                       time_budget: Optional[float] = None,
+                       start_time: Optional[float] = None
+                       ) -> Dict[str, np.ndarray]:
+  """Returns (num_graphs,) arrays of the graph_metrics values of each graph.
+
+  Metrics that graph_metrics leaves out for graphs without edges are nan.
+  The diameter, coreness and triangle stages only run for the selected
+  metrics, and as in ComputeMetrics, are skipped once the time budget is
+  spent, leaving their selected metrics nan for every graph.
+  """
+  if start_time is None:
+    start_time = time.time()
+
+  def _Selected(names):
+    return [name for name in names if metrics is None or name in metrics]
+
+  def _Skipped(names):
+    # Returns whether the stage computing the selected names is skipped.
+    if not names:
+      return True
+    if (time_budget is not None and
+        time.time() - start_time > time_budget):
+      for name in names:
+        result[name] = np.full(num_graphs, np.nan)
+      return True
+    return False
+
+  num_graphs = len(edge_arrays)
+  vertex_offsets = np.concatenate([[0], np.cumsum(num_vertices)[:-1]])
+  edges = np.concatenate(
+    [np.asarray(edges, dtype=np.int64).reshape(-1, 2) + offset
+     for edges, offset in zip(edge_arrays, vertex_offsets)])
+  edges = edges[edges[:, 0] != edges[:, 1]]
+  # As in graph_metrics, only vertices incident to an edge are counted. The
+  # relabeled vertices of each graph stay contiguous and in order.
+  adjacency, _ = csr._adjacency(edges)
+  nodes = np.unique(edges)
+  segments = np.searchsorted(vertex_offsets, nodes, side='right') - 1
+  num_nodes = np.bincount(segments, minlength=num_graphs).astype(np.float64)
+  degrees = np.diff(adjacency.indptr)
+  num_edges = _segment_sum(degrees, segments, num_graphs)
+  nonempty = np.flatnonzero(num_nodes)
+  edge_density = np.zeros(num_graphs)
+  edge_density[nonempty] = (num_edges[nonempty] / num_nodes[nonempty] /
+                            np.maximum(num_nodes[nonempty] - 1.0, 1.0))
+  avg_degree = np.zeros(num_graphs)
+  avg_degree[nonempty] = num_edges[nonempty] / num_nodes[nonempty]
+
+  def _PerNonemptyGraph(values):
+    result = np.full(num_graphs, np.nan)
+    result[nonempty] = values
+    return result
+
+  def _SegmentMean(values):
+    # Only the graphs with edges have vertices; the others are left nan.
+    return _PerNonemptyGraph(
+      _segment_sum(values, segments, num_graphs)[nonempty] /
+      num_nodes[nonempty])
+
+  result = {'num_nodes': num_nodes, 'num_edges': num_edges,
+            'edge_density': edge_density, 'avg_degree': avg_degree}
+  if _Selected(['degree_gini']):
+    result['degree_gini'] = _segment_gini(degrees, segments, num_graphs)
+  result = {name: result[name] for name in _Selected(result)}
+  dense_segments = np.searchsorted(nonempty, segments)
+
+  diameter_keys = []
+  if _Selected(['approximate_diameter']):
+    diameter_keys = ['approximate_diameter', 'approximate_diameter_is_exact']
+  if not _Skipped(diameter_keys):
+    # Graphs without edges have no vertices left, and a diameter of 0.
+    diameters = np.zeros(num_graphs)
+    is_exact = np.ones(num_graphs)
+    if nonempty.size and exact_diameter:
+      diameters[nonempty] = diameter.batched_exact_diameter(adjacency,
+                                                            dense_segments)
+    elif nonempty.size:
+      diameters[nonempty], is_exact[nonempty] = (
+        diameter.batched_approximate_diameter(adjacency, dense_segments,
+                                              diameter_sweeps))
+    result['approximate_diameter'] = diameters
+    result['approximate_diameter_is_exact'] = is_exact
+  if nonempty.size == 0:
+    # Only the metrics above are reported for graphs without edges.
+    return {name: values for name, values in result.items()
+            if name not in _CORENESS_METRICS + _TRIANGLE_METRICS}
+
+  if _Selected(['cc_size']):
+    _, component_labels = scipy.sparse.csgraph.connected_components(
+      adjacency, directed=False)
+    component_sizes = np.bincount(component_labels)
+    component_segments = np.zeros(component_sizes.shape[0], dtype=np.int64)
+    component_segments[component_labels] = segments
+    largest_component = np.zeros(num_graphs)
+    np.maximum.at(largest_component, component_segments, component_sizes)
+    result['cc_size'] = _PerNonemptyGraph(largest_component[nonempty] /
+                                         num_nodes[nonempty])
+
+  if not _Skipped(_Selected(_CORENESS_METRICS)):
+    core_numbers = csr._core_numbers(adjacency, degrees)
+    coreness = {
+      'coreness_eq_1': lambda: _SegmentMean(core_numbers == 1),
+      'coreness_geq_2': lambda: _SegmentMean(core_numbers >= 2),
+      'coreness_geq_5': lambda: _SegmentMean(core_numbers >= 5),
+      'coreness_geq_10': lambda: _SegmentMean(core_numbers >= 10),
+      'coreness_gini': lambda: _PerNonemptyGraph(
+        _segment_gini(core_numbers, segments, num_graphs)[nonempty])}
+    for name in _Selected(_CORENESS_METRICS):
+      result[name] = coreness[name]()
+
+  if not _Skipped(_Selected(_TRIANGLE_METRICS)):
+    triangles = csr._triangles(adjacency, degrees)
+    wedges = degrees * (degrees - 1)
+    has_wedges = wedges > 0
+    clustering = np.zeros(degrees.shape[0])
+    clustering[has_wedges] = 2.0 * triangles[has_wedges] / wedges[has_wedges]
+    total_triangles = _segment_sum(triangles, segments, num_graphs)[nonempty]
+    total_wedges = _segment_sum(wedges, segments, num_graphs)[nonempty]
+    transitivity = np.zeros(nonempty.shape[0])
+    has_triangles = total_triangles > 0
+    transitivity[has_triangles] = (2.0 * total_triangles[has_triangles] /
+                                   total_wedges[has_triangles])
+    triangle_metrics = {
+      'avg_cc': _SegmentMean(clustering),
+      'transitivity': _PerNonemptyGraph(transitivity),
+      'num_triangles': _PerNonemptyGraph(total_triangles / 3.0)}
+    for name in _Selected(_TRIANGLE_METRICS):
+      result[name] = triangle_metrics[name]
+  return result
+
+
+def batched_graph_metrics(graphs, exact_diameter: bool = False,
+                          diameter_sweeps: int = 16,
+                          metrics: Optional[Sequence[str]] = None,
+                          time_budget: Optional[float] = None,
+                          start_time: Optional[float] = None
+                          ) -> Dict[str, float]:
+  """Averages graph_metrics over a list of graphs.
+
+  Arguments:
+    graphs: list of graph_tool graphs or CsrGraphs. Self-loops are ignored.
+    exact_diameter: see graph_metrics_nx.
+    diameter_sweeps: see graph_metrics_nx.
+    metrics: optional names of the registered graph metrics to compute, e.g.
+      'approximate_diameter', which also reports its _is_exact key. Defaults
+      to all of them.
+    time_budget: optional wall-clock seconds, after which the diameter,
+      coreness and triangle metrics that have not started are reported as
+      nan.
+    start_time: time.time() at which the budget started. Defaults to now.
+  Returns:
+    dict from metric names to the mean of the metric over the graphs that
+    report it, i.e. pandas.DataFrame([graph_metrics(g) for g in graphs])
+    .mean(), up to floating point rounding. Metrics skipped for time are nan.
+  """
+  if not graphs:
+    return {}
+  per_graph = _per_graph_metrics(
+    [graph.get_edges() for graph in graphs],
+    [graph.num_vertices() for graph in graphs], exact_diameter,
+    diameter_sweeps, metrics, time_budget, start_time)
+  result = {}
+  for name, values in per_graph.items():
+    values = values[~np.isnan(values)]
+    result[name] = float(np.mean(values)) if values.size else np.nan
+  return result
@@ -0,0 +1,216 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Node centralities shared by node regression targets and SSL pretext tasks.
+
+Exact centralities run graph_tool's parallel C++ implementations. In
+approximate mode:
+  * betweenness is estimated by graph_tool from a random sample of pivots
+    (Brandes and Pich, "Centrality estimation in large networks", 2007);
+  * closeness sums the BFS distances from a random sample of pivots of each
+    connected component, scaled by the component size (Eppstein and Wang,
+    "Fast approximation of centrality", 2004);
+  * subgraph centrality keeps the num_eigenpairs largest eigenpairs of the
+    adjacency, computed by Lanczos iterations, instead of all of them.
+"""
+
+import gin
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
+
+from ..data.csr_graph import AdjacencyMatrix, AsGraphTool
+from .diameter import _CHUNK_ENTRIES, _bfs_distances
+
+CENTRALITIES = ('pagerank', 'betweenness', 'closeness', 'eigenvector', 'katz',
+                'hits_authority', 'hits_hub', 'local_clustering', 'kcore',
+                'subgraph')
+
+
+def approximate_closeness(adjacency: scipy.sparse.csr_matrix,
+                          num_pivots: int,
+                          rng: np.random.Generator) -> np.ndarray:
+  """Estimates the closeness of every vertex from BFS runs of a few pivots.
+
+  As graph_tool.centrality.closeness, the closeness of v is
+  (n_v - 1) / sum_u d(v, u) over the n_v vertices of its component, and is
+  nan for isolated vertices. Each component gets a share of the pivots
+  proportional to its size, and at least two; its closeness is exact when
+  the share covers all its vertices.
+
+  Args:
+    adjacency: (n, n) symmetric adjacency matrix.
+    num_pivots: total pivot budget.
+    rng: numpy Generator drawing the pivots.
+  Returns:
+    (n,) array of closeness estimates.
+  """
+  n = adjacency.shape[0]
+  _, labels = scipy.sparse.csgraph.connected_components(adjacency,
+                                                        directed=False)
+  sizes = np.bincount(labels)
+  quotas = np.minimum(sizes, np.maximum(
+    2, np.ceil(num_pivots * sizes / n))).astype(np.int64)
+  quotas[sizes == 1] = 0
+  # Vertices grouped by component, in random order within each component.
+  order = np.lexsort((rng.random(n), labels))
+  offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+  position = np.arange(n) - offsets[labels[order]]
+  pivots = order[position < quotas[labels[order]]]
+  distance_sums = np.zeros(n)
+  chunk_size = max(1, _CHUNK_ENTRIES // max(n, 1))
+  for start in range(0, pivots.shape[0], chunk_size):
+    distances = _bfs_distances(adjacency, pivots[start:start + chunk_size])
+    distances[np.isinf(distances)] = 0.0
+    distance_sums += distances.sum(axis=0)
+  # The pivots other than v are a uniform sample of the other n_v - 1
+  # vertices of its component.
+  vertex_sizes = sizes[labels]
+  is_pivot = np.zeros(n, dtype=bool)
+  is_pivot[pivots] = True
+  other_pivots = np.maximum(quotas[labels] - is_pivot, 1)
+  estimates = distance_sums * (vertex_sizes - 1) / other_pivots
+  with np.errstate(divide='ignore', invalid='ignore'):
+    return (vertex_sizes - 1) / estimates
+
+
+def wasserman_faust_closeness(adjacency: scipy.sparse.spmatrix,
+                              closeness: np.ndarray) -> np.ndarray:
+  """Scales per-component closeness by (n_v - 1) / (n - 1).
+
+  This is the wf_improved closeness of networkx.closeness_centrality: without
+  the scaling, the vertices of a small component are closer to the few
+  vertices they reach than those of the giant component are, and rank as the
+  most central ones. Isolated vertices get 0, as in networkx.
+
+  Args:
+    adjacency: (n, n) symmetric adjacency matrix.
+    closeness: (n,) closeness as returned by node_centrality.
+  Returns:
+    (n,) array of scaled closeness.
+  """
+  n = adjacency.shape[0]
+  if n <= 1:
+    return np.zeros(n)
+  _, labels = scipy.sparse.csgraph.connected_components(adjacency,
+                                                        directed=False)
+  component_sizes = np.bincount(labels)[labels]
+  return np.nan_to_num(closeness * (component_sizes - 1) / (n - 1), nan=0.0)
+
+
+def subgraph_centrality(adjacency: scipy.sparse.csr_matrix,
+                        num_eigenpairs=None) -> np.ndarray:
+  """Computes sum_j v_j(u)^2 exp(lambda_j) over eigenpairs of the adjacency.
+
+  Args:
+    adjacency: (n, n) symmetric adjacency matrix.
+    num_eigenpairs: if set, only the num_eigenpairs algebraically largest
+      eigenpairs, which dominate the sum, are computed with
+      scipy.sparse.linalg.eigsh. The remaining weight 1 - sum_j v_j(u)^2 of
+      each vertex is scaled by exp of the mean of the remaining eigenvalues,
+      which the trace of the adjacency gives. Accuracy grows with
+      num_eigenpairs. Otherwise all eigenpairs are computed densely, as in
+      networkx.
+  Returns:
+    (n,) array of subgraph centralities.
+  """
+  n = adjacency.shape[0]
+  adjacency = scipy.sparse.csr_matrix(adjacency, dtype=np.float64)
+  if num_eigenpairs is None or num_eigenpairs >= n - 1:
+    values, vectors = np.linalg.eigh(adjacency.toarray())
+    return (vectors ** 2) @ np.exp(values)
+  values, vectors = scipy.sparse.linalg.eigsh(adjacency, k=num_eigenpairs,
+                                              which='LA')
+  weights = vectors ** 2
+  remaining_mean = ((adjacency.diagonal().sum() - values.sum()) /
+                    (n - num_eigenpairs))
+  return (weights @ np.exp(values) +
+          np.maximum(1.0 - weights.sum(axis=1), 0.0) * np.exp(remaining_mean))
+
+
+def node_centrality(graph, name: str, approximate: bool = False,
+                    num_pivots: int = 256, num_eigenpairs: int = 32,
+                    rng=None) -> np.ndarray:
+  """Computes a centrality of every node of a graph.
+
+  Arguments:
+    graph: graph_tool graph or CsrGraph.
+    name: one of CENTRALITIES.
+    approximate: if True, estimate betweenness and closeness from num_pivots
+      pivots and subgraph centrality from num_eigenpairs eigenpairs. The
+      other centralities are always exact.
+    num_pivots: pivot budget of the approximate betweenness and closeness.
+    num_eigenpairs: eigenpair budget of the approximate subgraph centrality.
+    rng: seed or numpy Generator for the approximate mode.
+  Returns:
+    (num_vertices,) float array of centralities.
+  """
+  if name not in CENTRALITIES:
+    raise ValueError('Unknown centrality: %s' % name)
+  rng = np.random.default_rng(rng)
+  if name == 'closeness' and approximate:
+    return approximate_closeness(AdjacencyMatrix(graph).tocsr(), num_pivots,
+                                 rng)
+  if name == 'subgraph':
+    return subgraph_centrality(AdjacencyMatrix(graph),
+                               num_eigenpairs if approximate else None)
+  import graph_tool.centrality
+  graph = AsGraphTool(graph)
+  if name == 'pagerank':
+    values = graph_tool.centrality.pagerank(graph)
+  elif name == 'betweenness':
+    pivots = None
+    if approximate and num_pivots < graph.num_vertices():
+      pivots = rng.choice(graph.num_vertices(), num_pivots, replace=False)
+    values = graph_tool.centrality.betweenness(graph, pivots=pivots)[0]
+  elif name == 'closeness':
+    values = graph_tool.centrality.closeness(graph)
+  elif name == 'eigenvector':
+    values = graph_tool.centrality.eigenvector(graph)[1]
+  elif name == 'katz':
+    values = graph_tool.centrality.katz(graph)
+  elif name == 'hits_authority':
+    values = graph_tool.centrality.hits(graph)[1]
+  elif name == 'hits_hub':
+    values = graph_tool.centrality.hits(graph)[2]
+  elif name == 'local_clustering':
+    import graph_tool.clustering
+    values = graph_tool.clustering.local_clustering(graph)
+  else:
+    import graph_tool.topology
+    values = graph_tool.topology.kcore_decomposition(graph)
+  return np.fromiter(values.a, float)
+
+
+@gin.configurable
+class NodeCentrality:
+  """Callable binding gin-configured options of node_centrality.
+
+  Used for the node regression targets and the centrality pretext tasks. Set
+  approximate to True to estimate the superlinear centralities of very large
+  graphs.
+  """
+
+  @gin.configurable
+  def __init__(self, approximate=False, num_pivots=256, num_eigenpairs=32,
+               seed=None):
+    self.approximate = approximate
+    self.num_pivots = num_pivots
+    self.num_eigenpairs = num_eigenpairs
+    self.seed = seed
+
+  def __call__(self, graph, name: str) -> np.ndarray:
+    return node_centrality(graph, name, self.approximate, self.num_pivots,
+                           self.num_eigenpairs, self.seed)
@@ -0,0 +1,101 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parity of graph_world.metrics.centrality with networkx."""
+
+import importlib.util
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import networkx as nx
+import numpy as np
+
+from graph_world.data.csr_graph import CsrGraph
+from graph_world.metrics import centrality
+
+_HAS_GRAPH_TOOL = (importlib.util.find_spec('graph_tool') is not None and
+                   importlib.util.find_spec('graph_tool.centrality') is not None)
+
+
+def _Graphs():
+  """(name, networkx graph) pairs, with disconnected and isolated vertices."""
+  cycle_with_chord = nx.cycle_graph(6)
+  cycle_with_chord.add_edge(0, 3)
+  cycle_with_chord.add_edge(6, 7)
+  with_isolated = cycle_with_chord.copy()
+  with_isolated.add_node(8)
+  return [
+    ('cycle_with_chord_and_edge', cycle_with_chord),
+    ('with_isolated', with_isolated),
+    ('sparse_er', nx.gnp_random_graph(60, 0.03, seed=1)),
+    ('er', nx.gnp_random_graph(40, 0.15, seed=2)),
+    ('ba', nx.barabasi_albert_graph(50, 2, seed=3)),
+  ]
+
+
+def _ToCsr(graph):
+  edges = np.array(graph.edges(), dtype=np.int64).reshape(-1, 2)
+  return CsrGraph.FromEdges(graph.number_of_nodes(), edges[:, 0],
+                            edges[:, 1])
+
+
+def _Ranks(values):
+  return np.unique(np.round(values, 10), return_inverse=True)[1]
+
+
+class CentralityTest(parameterized.TestCase):
+
+  def _AssertClosenessMatchesNetworkx(self, graph, closeness):
+    csr = _ToCsr(graph)
+    scaled = centrality.wasserman_faust_closeness(csr.AdjacencyMatrix(),
+                                                  closeness)
+    expected = np.array([nx.closeness_centrality(graph)[v]
+                         for v in range(graph.number_of_nodes())])
+    np.testing.assert_allclose(scaled, expected, atol=1e-12)
+    np.testing.assert_array_equal(_Ranks(scaled), _Ranks(expected))
+
+  @parameterized.named_parameters(*_Graphs())
+  def test_approximate_closeness_with_all_pivots(self, graph):
+    csr = _ToCsr(graph)
+    closeness = centrality.node_centrality(
+      csr, 'closeness', approximate=True,
+      num_pivots=graph.number_of_nodes(), rng=0)
+    self._AssertClosenessMatchesNetworkx(graph, closeness)
+
+  @parameterized.named_parameters(*_Graphs())
+  def test_exact_closeness(self, graph):
+    if not _HAS_GRAPH_TOOL:
+      self.skipTest('graph_tool is not installed')
+    closeness = centrality.node_centrality(_ToCsr(graph), 'closeness')
+    self._AssertClosenessMatchesNetworkx(graph, closeness)
+
+  def test_small_component_ranks_last(self):
+    graph = _Graphs()[0][1]
+    csr = _ToCsr(graph)
+    closeness = centrality.approximate_closeness(
+      csr.AdjacencyMatrix(), 8, np.random.default_rng(0))
+    ranks = _Ranks(centrality.wasserman_faust_closeness(
+      csr.AdjacencyMatrix(), closeness))
+    self.assertTrue(np.all(ranks[[6, 7]] < ranks[:6].min()))
+
+  @parameterized.named_parameters(*_Graphs())
+  def test_subgraph_centrality(self, graph):
+    expected = nx.subgraph_centrality(graph)
+    np.testing.assert_allclose(
+      centrality.subgraph_centrality(_ToCsr(graph).AdjacencyMatrix()),
+      [expected[v] for v in range(graph.number_of_nodes())], rtol=1e-8)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -0,0 +1,278 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""BFS-based diameter computations on sparse undirected adjacency matrices.
+
+approximate_diameter runs a double sweep followed by iFUB (Crescenzi et al.,
+"On computing the diameter of real-world undirected graphs", 2013) with a
+bounded number of BFS traversals. It returns a lower bound on the diameter of
+the largest connected component, together with whether that bound has been
+certified to be exact.
+
+The batched_* variants run the same computations on a block-diagonal
+adjacency holding many small graphs. Each BFS starts from at most one source
+per graph, so a single multi-source traversal yields the distances of every
+graph at once.
+"""
+
+from typing import Tuple
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+# Upper bound on the number of distances materialized by one batch of BFS.
+_CHUNK_ENTRIES = 2 ** 24
+
+
+def _bfs_distances(adjacency: scipy.sparse.csr_matrix,
+                   sources: np.ndarray) -> np.ndarray:
+  """Returns the (len(sources), n) hop distances from each source."""
+  return scipy.sparse.csgraph.shortest_path(
+    adjacency, directed=False, unweighted=True, indices=sources)
+
+
+def _eccentricities(adjacency: scipy.sparse.csr_matrix,
+                    sources: np.ndarray) -> np.ndarray:
+  """Returns the eccentricity of each source, batching the BFS runs."""
+  chunk_size = max(1, _CHUNK_ENTRIES // adjacency.shape[0])
+  return np.concatenate([
+    _bfs_distances(adjacency, sources[start:start + chunk_size]).max(axis=1)
+    for start in range(0, sources.shape[0], chunk_size)])
+
+
+def largest_component(
+    adjacency: scipy.sparse.csr_matrix) -> scipy.sparse.csr_matrix:
+  """Returns the adjacency restricted to the largest connected component."""
+  num_components, labels = scipy.sparse.csgraph.connected_components(
+    adjacency, directed=False)
+  if num_components <= 1:
+    return adjacency
+  keep = np.flatnonzero(labels == np.argmax(np.bincount(labels)))
+  return adjacency[keep][:, keep]
+
+
+def exact_diameter(adjacency: scipy.sparse.csr_matrix) -> float:
+  """Computes the exact diameter from the BFS eccentricity of every vertex.
+
+  Returns 0 for an empty graph and inf for a disconnected graph, as
+  networkx.diameter does.
+  """
+  n = adjacency.shape[0]
+  if n == 0:
+    return 0.0
+  num_components, _ = scipy.sparse.csgraph.connected_components(
+    adjacency, directed=False)
+  if num_components > 1:
+    return np.inf
+  return float(np.max(_eccentricities(adjacency, np.arange(n))))
+
+
+def approximate_diameter(adjacency: scipy.sparse.csr_matrix,
+                         max_sweeps: int = 16) -> Tuple[float, bool]:
+  """Bounds the diameter of the largest connected component.
+
+  A double sweep from the highest-degree vertex finds a peripheral pair
+  (a, b). iFUB then runs BFS from the vertices farthest from the midpoint u
+  of the a-b path, level by level. After all vertices at distance >= i from
+  u have been visited, the diameter is at most 2(i - 1), so the search stops
+  as soon as the best eccentricity found reaches that bound.
+
+  Args:
+    adjacency: symmetric sparse adjacency matrix.
+    max_sweeps: budget of BFS traversals. The double sweep and the BFS from
+      u always run, so at least four traversals are made.
+  Returns:
+    (diameter, is_exact): the largest eccentricity found, which is a lower
+    bound on the diameter of the largest component, and whether the search
+    certified it to be the exact diameter.
+  """
+  if adjacency.shape[0] <= 1:
+    return 0.0, True
+  adjacency = largest_component(adjacency)
+  if adjacency.shape[0] <= 1:
+    return 0.0, True
+  degrees = np.diff(adjacency.indptr)
+  start = np.argmax(degrees)
+  start_distances = _bfs_distances(adjacency, [start])[0]
+  a = np.argmax(start_distances)
+  a_distances = _bfs_distances(adjacency, [a])[0]
+  b = np.argmax(a_distances)
+  b_distances = _bfs_distances(adjacency, [b])[0]
+  path_length = a_distances[b]
+  lower = max(start_distances.max(), path_length, b_distances.max())
+  midpoint = np.flatnonzero((a_distances + b_distances == path_length) &
+                            (a_distances == path_length // 2))[0]
+  levels = _bfs_distances(adjacency, [midpoint])[0]
+  sweeps = 4
+  level = int(levels.max())
+  lower = max(lower, level)
+  upper = 2 * level
+  while lower < upper and sweeps < max_sweeps:
+    fringe = np.flatnonzero(levels == level)
+    visited = fringe[:max_sweeps - sweeps]
+    lower = max(lower, np.max(_eccentricities(adjacency, visited)))
+    sweeps += visited.shape[0]
+    if visited.shape[0] < fringe.shape[0]:
+      break
+    upper = min(upper, 2 * (level - 1))
+    level -= 1
+  return float(lower), bool(lower >= upper)
+
+
+def _segment_max(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+  """Returns the max of each contiguous non-empty segment of `values`."""
+  return np.maximum.reduceat(values, starts)
+
+
+def _segment_argmax(values: np.ndarray, segments: np.ndarray,
+                    starts: np.ndarray) -> np.ndarray:
+  """Returns the first index of the max of each segment, as np.argmax does."""
+  is_max = values == _segment_max(values, starts)[segments]
+  return np.minimum.reduceat(
+    np.where(is_max, np.arange(values.shape[0]), values.shape[0]), starts)
+
+
+def _multi_source_distances(adjacency: scipy.sparse.csr_matrix,
+                            sources: np.ndarray) -> np.ndarray:
+  """Returns the hop distance of each vertex to the nearest of `sources`."""
+  return scipy.sparse.csgraph.dijkstra(
+    adjacency, directed=False, unweighted=True, indices=sources,
+    min_only=True)
+
+
+def _batched_eccentricities(adjacency: scipy.sparse.csr_matrix,
+                            starts: np.ndarray, sources: np.ndarray,
+                            source_segments: np.ndarray) -> np.ndarray:
+  """Returns the largest eccentricity of the sources of each segment.
+
+  Segments without sources get -1. Sources of one segment are traversed in
+  separate rounds, one source per segment and round.
+  """
+  num_segments = starts.shape[0]
+  order = np.lexsort((sources, source_segments))
+  sources = sources[order]
+  source_segments = source_segments[order]
+  segment_offsets = np.searchsorted(source_segments, np.arange(num_segments))
+  rank = np.arange(sources.shape[0]) - segment_offsets[source_segments]
+  eccentricities = np.full(num_segments, -1.0)
+  for r in range(int(rank.max()) + 1 if rank.size else 0):
+    in_round = rank == r
+    distances = _multi_source_distances(adjacency, sources[in_round])
+    distances[np.isinf(distances)] = -1.0
+    reached = source_segments[in_round]
+    eccentricities[reached] = np.maximum(
+      eccentricities[reached], _segment_max(distances, starts)[reached])
+  return eccentricities
+
+
+def batched_exact_diameter(adjacency: scipy.sparse.csr_matrix,
+                           segments: np.ndarray) -> np.ndarray:
+  """Computes exact_diameter for each graph of a block-diagonal adjacency.
+  Args:
+    adjacency: symmetric block-diagonal adjacency matrix.
+    segments: (n,) non-decreasing id in [0, num_graphs) of the graph of each
+      vertex. Every graph must have at least one vertex.
+  Returns:
+    (num_graphs,) array of diameters, inf for disconnected graphs.
+  """
+  # csgraph converts the matrix to float64 on every call otherwise.
+  adjacency = adjacency.astype(np.float64)
+  starts = np.flatnonzero(np.diff(segments, prepend=-1))
+  _, labels = scipy.sparse.csgraph.connected_components(adjacency,
+                                                        directed=False)
+  connected = (_segment_max(labels, starts) ==
+               np.minimum.reduceat(labels, starts))
+  result = np.full(starts.shape[0], np.inf)
+  sources = np.flatnonzero(connected[segments])
+  result[connected] = _batched_eccentricities(
+    adjacency, starts, sources, segments[sources])[connected]
+  return result
+
+
+def batched_approximate_diameter(
+    adjacency: scipy.sparse.csr_matrix, segments: np.ndarray,
+    max_sweeps: int = 16) -> Tuple[np.ndarray, np.ndarray]:
+  """Runs approximate_diameter on each graph of a block-diagonal adjacency.
+
+  Every graph goes through the same sequence of BFS traversals as it would
+  in approximate_diameter, with the same tie-breaking, so the results are
+  identical.
+  Args:
+    adjacency: symmetric block-diagonal adjacency matrix.
+    segments: (n,) non-decreasing id in [0, num_graphs) of the graph of each
+      vertex. Every graph must have at least one vertex.
+    max_sweeps: see approximate_diameter.
+  Returns:
+    (diameters, is_exact): (num_graphs,) arrays.
+  """
+  # csgraph converts the matrix to float64 on every call otherwise.
+  adjacency = adjacency.astype(np.float64)
+  starts = np.flatnonzero(np.diff(segments, prepend=-1))
+  num_graphs = starts.shape[0]
+  # Restrict each graph to its largest component, the first one on ties.
+  _, labels = scipy.sparse.csgraph.connected_components(adjacency,
+                                                        directed=False)
+  component_sizes = np.bincount(labels)
+  sizes = component_sizes[labels]
+  largest = labels[_segment_argmax(sizes, segments, starts)]
+  active = component_sizes[largest] > 1
+  if not active.any():
+    return np.zeros(num_graphs), np.ones(num_graphs, dtype=bool)
+  in_largest = (labels == largest[segments]) & active[segments]
+
+  def _Sweep(sources):
+    distances = _multi_source_distances(adjacency, sources)
+    return np.where(in_largest, distances, -1.0)
+
+  def _Argmax(values):
+    return _segment_argmax(np.where(in_largest, values, -1), segments, starts)
+
+  degrees = np.diff(adjacency.indptr)
+  start_distances = _Sweep(_Argmax(degrees)[active])
+  a = _Argmax(start_distances)
+  a_distances = _Sweep(a[active])
+  b = _Argmax(a_distances)
+  b_distances = _Sweep(b[active])
+  path_length = a_distances[b]
+  lower = np.maximum.reduce([_segment_max(start_distances, starts),
+                             path_length, _segment_max(b_distances, starts)])
+  on_midpoint = (in_largest & (a_distances + b_distances ==
+                               path_length[segments]) &
+                 (a_distances == path_length[segments] // 2))
+  midpoint = _Argmax(on_midpoint)
+  levels = _Sweep(midpoint[active])
+  sweeps = np.full(num_graphs, 4)
+  level = _segment_max(levels, starts)
+  lower = np.maximum(lower, level)
+  upper = 2 * level
+  running = active & (lower < upper) & (sweeps < max_sweeps)
+  while running.any():
+    fringe = in_largest & running[segments] & (levels == level[segments])
+    fringe_rank = np.cumsum(fringe) - 1
+    fringe_rank -= np.concatenate([[0], np.cumsum(fringe)])[starts][segments]
+    fringe_sizes = np.bincount(segments[fringe], minlength=num_graphs)
+    budget = max_sweeps - sweeps
+    visited = np.flatnonzero(fringe & (fringe_rank < budget[segments]))
+    lower[running] = np.maximum(lower, _batched_eccentricities(
+      adjacency, starts, visited, segments[visited]))[running]
+    num_visited = np.minimum(fringe_sizes, budget)
+    sweeps[running] += num_visited[running]
+    exhausted = running & (num_visited < fringe_sizes)
+    descended = running & ~exhausted
+    upper[descended] = np.minimum(upper, 2 * (level - 1))[descended]
+    level[descended] -= 1
+    running = descended & (lower < upper) & (sweeps < max_sweeps)
+  return (np.where(active, lower, 0.0),
+          np.where(active, lower >= upper, True))
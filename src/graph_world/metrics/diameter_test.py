@@ -0,0 +1,99 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parity of graph_world.metrics.diameter with networkx."""
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import networkx as nx
+import numpy as np
+import scipy.sparse
+
+from graph_world.metrics import diameter
+
+
+def _Graphs():
+  """(name, networkx graph) pairs, connected or not."""
+  return [
+    ('path', nx.path_graph(9)),
+    ('cycle', nx.cycle_graph(10)),
+    ('grid', nx.grid_2d_graph(5, 7)),
+    ('sparse_er', nx.gnp_random_graph(120, 0.02, seed=1)),
+    ('er', nx.gnp_random_graph(80, 0.08, seed=2)),
+    ('ba', nx.barabasi_albert_graph(100, 1, seed=3)),
+    ('lollipop', nx.lollipop_graph(8, 12)),
+    ('disconnected', nx.disjoint_union(nx.path_graph(6), nx.cycle_graph(30))),
+    ('single_vertex', nx.empty_graph(1)),
+  ]
+
+
+def _Adjacency(graph):
+  return scipy.sparse.csr_matrix(nx.to_scipy_sparse_array(
+    graph, nodelist=list(graph), dtype=np.float64))
+
+
+def _LargestComponentDiameter(graph):
+  largest = max(nx.connected_components(graph), key=len)
+  return nx.diameter(graph.subgraph(largest))
+
+
+class DiameterTest(parameterized.TestCase):
+
+  @parameterized.named_parameters(*_Graphs())
+  def test_exact_diameter(self, graph):
+    expected = nx.diameter(graph) if nx.is_connected(graph) else np.inf
+    self.assertEqual(diameter.exact_diameter(_Adjacency(graph)), expected)
+
+  def test_exact_diameter_of_empty_graph(self):
+    self.assertEqual(diameter.exact_diameter(scipy.sparse.csr_matrix((0, 0))),
+                     0.0)
+
+  @parameterized.named_parameters(*_Graphs())
+  def test_approximate_diameter_is_a_lower_bound(self, graph):
+    expected = _LargestComponentDiameter(graph)
+    value, is_exact = diameter.approximate_diameter(_Adjacency(graph),
+                                                    max_sweeps=4)
+    self.assertLessEqual(value, expected)
+    if is_exact:
+      self.assertEqual(value, expected)
+
+  @parameterized.named_parameters(*_Graphs())
+  def test_approximate_diameter_with_enough_sweeps(self, graph):
+    value, is_exact = diameter.approximate_diameter(
+      _Adjacency(graph), max_sweeps=graph.number_of_nodes() + 4)
+    self.assertTrue(is_exact)
+    self.assertEqual(value, _LargestComponentDiameter(graph))
+
+  @parameterized.parameters(False, True)
+  def test_batched_matches_per_graph(self, exact):
+    graphs = [graph for _, graph in _Graphs()]
+    adjacency = scipy.sparse.block_diag(
+      [_Adjacency(graph) for graph in graphs], format='csr')
+    segments = np.repeat(np.arange(len(graphs)),
+                         [graph.number_of_nodes() for graph in graphs])
+    if exact:
+      np.testing.assert_array_equal(
+        diameter.batched_exact_diameter(adjacency, segments),
+        [diameter.exact_diameter(_Adjacency(graph)) for graph in graphs])
+    else:
+      diameters, is_exact = diameter.batched_approximate_diameter(
+        adjacency, segments, max_sweeps=6)
+      expected = [diameter.approximate_diameter(_Adjacency(graph), 6)
+                  for graph in graphs]
+      np.testing.assert_array_equal(diameters, [d for d, _ in expected])
+      np.testing.assert_array_equal(is_exact, [e for _, e in expected])
+
+
+if __name__ == '__main__':
+  absltest.main()
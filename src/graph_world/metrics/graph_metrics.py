@@ -13,20 +13,85 @@
 # limitations under the License.
 from typing import Dict
 
+import gin
 import graph_tool
+import numpy as np
+from .graph_metrics_csr import graph_metrics_csr
 from .graph_metrics_nx import graph_metrics_nx
 import networkx as nx
 
 
-def graph_metrics(graph: graph_tool.Graph) -> Dict[str, float]:
+def graph_metrics(graph: graph_tool.Graph,
+                  backend: str = 'csr',
+                  exact_diameter: bool = False,
+                  diameter_sweeps: int = 16,
+                  approximate: bool = False,
+                  num_samples: int = 100000,
+                  core_iterations: int = 16,
+                  rng=None) -> Dict[str, float]:
   """Computes graph metrics on a graph_tool graph object.
 
   Arguments:
-    graph: graph_tool graph.
+    graph: graph_tool graph or CsrGraph.
+    backend: 'csr' computes the metrics with sparse matrix algebra over the
+      edge array. 'networkx' copies the graph into networkx first. Both return
+      the same values; graphs with self-loops always use networkx.
+    exact_diameter: if True, report the exact diameter, which costs a BFS
+      from every node. See graph_metrics_nx.
+    diameter_sweeps: BFS budget of the approximate diameter.
+    approximate: if True, estimate the clustering, triangle and coreness
+      metrics and report their standard errors, see graph_metrics_csr. Only
+      supported by the 'csr' backend, which then ignores self-loops.
+    num_samples: sample budget of each estimate in approximate mode.
+    core_iterations: h-index round budget in approximate mode.
+    rng: seed or numpy Generator for the approximate mode.
   Returns:
     dict from metric names to metric values.
   """
+  if backend not in ('csr', 'networkx'):
+    raise ValueError('Unknown graph metrics backend: %s' % backend)
+  if approximate and backend != 'csr':
+    raise ValueError('Approximate graph metrics need the csr backend')
+  edges = graph.get_edges()
+  self_loops = edges[:, 0] == edges[:, 1]
+  if approximate:
+    return graph_metrics_csr(edges[~self_loops], exact_diameter,
+                             diameter_sweeps, approximate, num_samples,
+                             core_iterations, rng)
+  if backend == 'csr' and not np.any(self_loops):
+    return graph_metrics_csr(edges, exact_diameter, diameter_sweeps)
   nx_graph = nx.Graph()
-  edge_list = [(int(e.source()), int(e.target())) for e in graph.edges()]
-  nx_graph.add_edges_from(edge_list)
-  return graph_metrics_nx(nx_graph)
+  nx_graph.add_edges_from(edges.tolist())
+  return graph_metrics_nx(nx_graph, exact_diameter, diameter_sweeps)
+
+
+@gin.configurable
+class GraphMetrics:
+  """Callable binding gin-configured options of graph_metrics.
+
+  The options are read from the gin config of the process that builds the
+  object, and shipped with it to workers. They also configure the graph
+  metrics of the metric registry. Set approximate to True to estimate the
+  superlinear metrics of very large graphs.
+  """
+
+  @gin.configurable
+  def __init__(self, backend='csr', exact_diameter=False, diameter_sweeps=16,
+               approximate=False, num_samples=100000, core_iterations=16,
+               seed=None):
+    if backend not in ('csr', 'networkx'):
+      raise ValueError('Unknown graph metrics backend: %s' % backend)
+    if approximate and backend != 'csr':
+      raise ValueError('Approximate graph metrics need the csr backend')
+    self.backend = backend
+    self.exact_diameter = exact_diameter
+    self.diameter_sweeps = diameter_sweeps
+    self.approximate = approximate
+    self.num_samples = num_samples
+    self.core_iterations = core_iterations
+    self.seed = seed
+
+  def __call__(self, graph) -> Dict[str, float]:
+    return graph_metrics(graph, self.backend, self.exact_diameter,
+                         self.diameter_sweeps, self.approximate,
+                         self.num_samples, self.core_iterations, self.seed)
@@ -0,0 +1,328 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Graph metrics computed with sparse matrix algebra.
+
+graph_metrics_csr returns the same keys and values as graph_metrics_nx on the
+networkx graph that graph_metrics used to build from graph.get_edges(). In
+particular only vertices that appear in at least one edge are counted, and
+parallel edges are collapsed. All per-node work (degrees, core numbers,
+triangles, components, BFS) runs over a scipy CSR adjacency instead
+of Python dicts.
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.csgraph
+
+from . import diameter
+from .graph_metrics_nx import _gini_coefficient
+
+# Upper bound on the number of sparse matrix entries materialized at once by
+# the triangle pass.
+_CHUNK_ENTRIES = 2 ** 24
+
+
+def _adjacency(edges: np.ndarray) -> Tuple[scipy.sparse.csr_matrix, int]:
+  """Builds the simple undirected adjacency spanned by an edge array.
+  Args:
+    edges: (num_edges, 2) array of edges, without self-loops.
+  Returns:
+    (adjacency, num_edges) where adjacency is a symmetric 0/1 CSR matrix over
+    the vertices incident to at least one edge, and num_edges the number of
+    distinct undirected edges.
+  """
+  nodes, relabeled = np.unique(edges, return_inverse=True)
+  relabeled = relabeled.reshape(-1, 2)
+  n = nodes.shape[0]
+  rows = np.concatenate([relabeled[:, 0], relabeled[:, 1]])
+  cols = np.concatenate([relabeled[:, 1], relabeled[:, 0]])
+  adjacency = scipy.sparse.csr_matrix(
+    (np.ones(rows.shape[0], dtype=np.int64), (rows, cols)), shape=(n, n))
+  adjacency.sum_duplicates()
+  adjacency.data[:] = 1
+  return adjacency, adjacency.nnz // 2
+
+
+def _row_chunks(row_cost: np.ndarray):
+  """Yields row slices whose summed cost stays close to _CHUNK_ENTRIES."""
+  n = row_cost.shape[0]
+  cumulative_cost = np.cumsum(row_cost)
+  start = 0
+  while start < n:
+    base = cumulative_cost[start - 1] if start else 0
+    end = int(np.searchsorted(cumulative_cost, base + _CHUNK_ENTRIES,
+                              side='right'))
+    end = min(max(end, start + 1), n)
+    yield slice(start, end)
+    start = end
+
+
+def _triangles(adjacency: scipy.sparse.csr_matrix,
+               degrees: np.ndarray) -> np.ndarray:
+  """Returns the number of triangles through each vertex.
+
+  Computes diag(A^3) / 2 one block of rows at a time, so that the size of
+  A[rows] @ A stays bounded even for heavy-tailed degree distributions.
+  """
+  triangles = np.zeros(adjacency.shape[0], dtype=np.int64)
+  neighbor_degree_sum = adjacency @ degrees
+  for rows in _row_chunks(neighbor_degree_sum + 1):
+    block = adjacency[rows]
+    paths = (block @ adjacency).multiply(block)
+    triangles[rows] = np.asarray(paths.sum(axis=1)).ravel() // 2
+  return triangles
+
+
+def _core_numbers(adjacency: scipy.sparse.csr_matrix,
+                  degrees: np.ndarray) -> np.ndarray:
+  """Returns the core number of each vertex.
+
+  Vertices are peeled in frontiers: every vertex whose remaining degree is at
+  most the current core level is removed at once, and the degrees of its
+  neighbors are decremented together, so each round only touches the edges of
+  the removed vertices.
+  """
+  n = adjacency.shape[0]
+  indptr = adjacency.indptr
+  indices = adjacency.indices
+  remaining_degree = degrees.astype(np.int64)
+  core = np.zeros(n, dtype=np.int64)
+  removed = np.zeros(n, dtype=bool)
+  num_removed = 0
+  level = 0
+  while num_removed < n:
+    level = max(level, int(remaining_degree[~removed].min()))
+    frontier = np.flatnonzero(~removed & (remaining_degree <= level))
+    while frontier.size:
+      removed[frontier] = True
+      core[frontier] = level
+      num_removed += frontier.size
+      starts = indptr[frontier]
+      counts = indptr[frontier + 1] - starts
+      offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+      neighbors = indices[offsets + np.arange(offsets.shape[0])]
+      neighbors = neighbors[~removed[neighbors]]
+      candidates, lost_degree = np.unique(neighbors, return_counts=True)
+      remaining_degree[candidates] -= lost_degree
+      frontier = candidates[remaining_degree[candidates] <= level]
+  return core
+
+
+def _core_number_upper_bounds(adjacency: scipy.sparse.csr_matrix,
+                              degrees: np.ndarray,
+                              max_iterations: int) -> Tuple[np.ndarray, bool]:
+  """Bounds core numbers from above with the h-index iteration.
+
+  Starting from the degrees, each round replaces the value of every vertex
+  with the h-index of its neighbors' values. Every round yields upper bounds
+  on the core numbers, and the fixed point is the core numbers themselves
+  (Lu et al., "The H-index of a network node and its relation to degree and
+  coreness", 2016).
+  Returns:
+    (bounds, converged): the bounds after at most `max_iterations` rounds and
+    whether they reached the fixed point, i.e. are the exact core numbers.
+  """
+  n = adjacency.shape[0]
+  rows = np.repeat(np.arange(n, dtype=np.int64), degrees)
+  rank_in_row = np.arange(rows.shape[0]) - adjacency.indptr[rows] + 1
+  bounds = degrees.astype(np.int64)
+  for _ in range(max_iterations):
+    # Sorting the packed (row, -value) keys orders each row's neighbor values
+    # in decreasing order, so the h-index is the count of value >= rank.
+    stride = int(bounds.max()) + 1
+    keys = np.sort(rows * stride + (stride - 1 - bounds[adjacency.indices]))
+    neighbor_values = stride - 1 - keys % stride
+    new_bounds = np.bincount(rows, weights=neighbor_values >= rank_in_row,
+                             minlength=n).astype(np.int64)
+    if np.array_equal(new_bounds, bounds):
+      return bounds, True
+    bounds = new_bounds
+  return bounds, False
+
+
+def _is_edge(adjacency: scipy.sparse.csr_matrix, sources: np.ndarray,
+             targets: np.ndarray) -> np.ndarray:
+  """Returns whether each (source, target) pair is an edge."""
+  n = adjacency.shape[0]
+  rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(adjacency.indptr))
+  # CSR indices are sorted within rows, so the packed keys are sorted.
+  keys = rows * n + adjacency.indices
+  queries = sources * n + targets
+  found = np.minimum(np.searchsorted(keys, queries), keys.shape[0] - 1)
+  return keys[found] == queries
+
+
+def _sample_wedges(adjacency: scipy.sparse.csr_matrix, degrees: np.ndarray,
+                   centers: np.ndarray, rng: np.random.Generator):
+  """Returns two distinct random neighbors of each center (degree >= 2)."""
+  center_degrees = degrees[centers]
+  first = rng.integers(center_degrees)
+  second = rng.integers(center_degrees - 1)
+  second += second >= first
+  starts = adjacency.indptr[centers]
+  return (adjacency.indices[starts + first].astype(np.int64),
+          adjacency.indices[starts + second].astype(np.int64))
+
+
+def _mean_and_stderr(samples: np.ndarray) -> Tuple[float, float]:
+  if samples.shape[0] < 2:
+    return float(np.mean(samples)), 0.0
+  return (float(np.mean(samples)),
+          float(np.std(samples, ddof=1) / np.sqrt(samples.shape[0])))
+
+
+def _triangle_metrics(adjacency: scipy.sparse.csr_matrix,
+                      degrees: np.ndarray) -> Dict[str, float]:
+  """Returns avg_cc, transitivity and num_triangles from exact counts."""
+  triangles = _triangles(adjacency, degrees)
+  wedges = degrees * (degrees - 1)
+  clustering = np.zeros(degrees.shape[0])
+  has_wedges = wedges > 0
+  clustering[has_wedges] = 2.0 * triangles[has_wedges] / wedges[has_wedges]
+  total_triangles = np.sum(triangles)
+  return {
+    'avg_cc': float(np.mean(clustering)),
+    'transitivity': float(
+      0.0 if total_triangles == 0 else 2.0 * total_triangles / np.sum(wedges)),
+    'num_triangles': float(total_triangles / 3.0)}
+
+
+def _sampled_triangle_metrics(adjacency: scipy.sparse.csr_matrix,
+                              degrees: np.ndarray, num_samples: int,
+                              rng: np.random.Generator) -> Dict[str, float]:
+  """Estimates avg_cc, transitivity and num_triangles with standard errors.
+
+  avg_cc samples uniform vertices and checks whether one random wedge centred
+  at each is closed; transitivity does the same for uniformly sampled wedges.
+  num_triangles counts the common neighbors of uniformly sampled edges, which
+  is 3 * num_triangles / num_edges in expectation. Graphs with no more edges
+  than the sample budget are counted exactly, with zero standard errors.
+  """
+  num_edges = adjacency.nnz // 2
+  if num_edges <= num_samples:
+    result = _triangle_metrics(adjacency, degrees)
+    return {'avg_cc': result['avg_cc'], 'avg_cc_stderr': 0.0,
+            'transitivity': result['transitivity'],
+            'transitivity_stderr': 0.0,
+            'num_triangles': result['num_triangles'],
+            'num_triangles_stderr': 0.0}
+  n = adjacency.shape[0]
+  result = {}
+  centers = rng.integers(n, size=num_samples)
+  centers = centers[degrees[centers] >= 2]
+  closed = np.zeros(num_samples)
+  closed[:centers.shape[0]] = _is_edge(
+    adjacency, *_sample_wedges(adjacency, degrees, centers, rng))
+  result['avg_cc'], result['avg_cc_stderr'] = _mean_and_stderr(closed)
+  wedges = np.cumsum(degrees * (degrees - 1.0))
+  if wedges[-1] == 0:
+    result['transitivity'], result['transitivity_stderr'] = 0.0, 0.0
+  else:
+    centers = np.searchsorted(wedges, rng.random(num_samples) * wedges[-1],
+                              side='right')
+    closed = _is_edge(adjacency,
+                      *_sample_wedges(adjacency, degrees, centers, rng))
+    result['transitivity'], result['transitivity_stderr'] = (
+      _mean_and_stderr(closed.astype(np.float64)))
+  # Each undirected edge appears twice in the CSR entries, so uniform entries
+  # are uniform edges.
+  entries = rng.integers(adjacency.nnz, size=num_samples)
+  sources = np.searchsorted(adjacency.indptr, entries, side='right') - 1
+  targets = adjacency.indices[entries]
+  common_neighbors = np.asarray(
+    adjacency[sources].multiply(adjacency[targets]).sum(axis=1)).ravel()
+  mean, stderr = _mean_and_stderr(common_neighbors.astype(np.float64))
+  result['num_triangles'] = num_edges * mean / 3.0
+  result['num_triangles_stderr'] = num_edges * stderr / 3.0
+  return result
+
+
+def _diameter_metrics(adjacency: scipy.sparse.csr_matrix, exact: bool,
+                      max_sweeps: int) -> Dict[str, float]:
+  """Returns the approximate_diameter and approximate_diameter_is_exact keys."""
+  if exact:
+    return {'approximate_diameter': diameter.exact_diameter(adjacency),
+            'approximate_diameter_is_exact': 1.0}
+  value, is_exact = diameter.approximate_diameter(adjacency, max_sweeps)
+  return {'approximate_diameter': value,
+          'approximate_diameter_is_exact': float(is_exact)}
+
+
+def graph_metrics_csr(edges: np.ndarray, exact_diameter: bool = False,
+                      diameter_sweeps: int = 16, approximate: bool = False,
+                      num_samples: int = 100000, core_iterations: int = 16,
+                      rng=None) -> Dict[str, float]:
+  """Computes graph metrics on an undirected edge array.
+
+  Arguments:
+    edges: (num_edges, 2) array of edges, as returned by graph.get_edges().
+      Self-loops are not supported.
+    exact_diameter: see graph_metrics_nx.
+    diameter_sweeps: see graph_metrics_nx.
+    approximate: if True, estimate avg_cc, transitivity and num_triangles from
+      `num_samples` sampled wedges and edges, and compute the coreness metrics
+      from core number upper bounds after `core_iterations` h-index rounds.
+      Adds the standard errors avg_cc_stderr, transitivity_stderr and
+      num_triangles_stderr, and coreness_is_exact, which is 1.0 if the bounds
+      converged to the exact core numbers.
+    num_samples: sample budget of each estimate in approximate mode.
+    core_iterations: h-index round budget in approximate mode.
+    rng: seed or numpy Generator for the approximate mode.
+  Returns:
+    dict from metric names to metric values. Unless approximate is set, the
+    dict is identical to that of graph_metrics_nx.
+  """
+  edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+  adjacency, num_undirected_edges = _adjacency(edges)
+  num_nodes = float(adjacency.shape[0])
+  edge_density = 0.0
+  if num_nodes > 1.0:
+    edge_density = 2.0 * num_undirected_edges / num_nodes / (num_nodes - 1.0)
+  result = {'num_nodes': num_nodes,
+            'num_edges': 2.0 * num_undirected_edges,
+            'edge_density': edge_density}
+  degrees = np.diff(adjacency.indptr)
+  result['degree_gini'] = _gini_coefficient(degrees.astype(np.float32))
+  _, component_labels = scipy.sparse.csgraph.connected_components(
+    adjacency, directed=False)
+  result.update(_diameter_metrics(adjacency, exact_diameter, diameter_sweeps))
+  if num_nodes == 0:
+    result['avg_degree'] = 0.0
+    return result
+  result['avg_degree'] = float(np.mean(degrees.astype(np.float32)))
+  if approximate:
+    core_numbers, cores_converged = _core_number_upper_bounds(
+      adjacency, degrees, core_iterations)
+  else:
+    core_numbers = _core_numbers(adjacency, degrees)
+  result['coreness_eq_1'] = float(np.mean(core_numbers == 1))
+  result['coreness_geq_2'] = float(np.mean(core_numbers >= 2))
+  result['coreness_geq_5'] = float(np.mean(core_numbers >= 5))
+  result['coreness_geq_10'] = float(np.mean(core_numbers >= 10))
+  result['coreness_gini'] = float(_gini_coefficient(core_numbers))
+  if approximate:
+    result['coreness_is_exact'] = float(cores_converged)
+    result.update(_sampled_triangle_metrics(
+      adjacency, degrees, num_samples, np.random.default_rng(rng)))
+  else:
+    result.update(_triangle_metrics(adjacency, degrees))
+  if num_nodes == 1.0:
+    result['cc_size'] = 1.0
+  else:
+    result['cc_size'] = float(
+      np.max(np.bincount(component_labels)) / num_nodes)
+  return result
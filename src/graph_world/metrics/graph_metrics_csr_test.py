@@ -0,0 +1,131 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parity of graph_metrics_csr with graph_metrics_nx, and its estimates."""
+
+import itertools
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import networkx as nx
+import numpy as np
+
+from graph_world.metrics import graph_metrics_csr as csr
+from graph_world.metrics.graph_metrics_csr import graph_metrics_csr
+from graph_world.metrics.graph_metrics_nx import graph_metrics_nx
+
+
+def _Edges(graph: nx.Graph) -> np.ndarray:
+  return np.array(list(graph.edges()), dtype=np.int64).reshape(-1, 2)
+
+
+def _EdgeArrays():
+  """(name, edge array) pairs covering random and degenerate graphs."""
+  two_cliques = nx.disjoint_union(nx.complete_graph(5), nx.complete_graph(3))
+  disconnected = nx.disjoint_union(nx.cycle_graph(7), nx.path_graph(4))
+  return [
+    ('er_sparse', _Edges(nx.gnp_random_graph(200, 0.01, seed=1))),
+    ('er_dense', _Edges(nx.gnp_random_graph(80, 0.2, seed=2))),
+    ('ba', _Edges(nx.barabasi_albert_graph(150, 3, seed=3))),
+    ('powerlaw_cluster', _Edges(
+      nx.powerlaw_cluster_graph(150, 3, 0.5, seed=4))),
+    ('empty', np.zeros((0, 2), dtype=np.int64)),
+    ('single_edge', np.array([[0, 1]])),
+    ('duplicate_edges', np.array([[0, 1], [1, 0], [0, 1], [1, 2], [2, 0],
+                                  [2, 0]])),
+    ('disconnected', _Edges(disconnected)),
+    ('two_cliques', _Edges(two_cliques)),
+    ('non_zero_based', np.array([[5, 9], [9, 12], [12, 5], [12, 40],
+                                 [40, 41]])),
+  ]
+
+
+def _Cases():
+  for (name, edges), exact_diameter in itertools.product(_EdgeArrays(),
+                                                         (False, True)):
+    suffix = '_exact_diameter' if exact_diameter else '_approximate_diameter'
+    yield name + suffix, edges, exact_diameter
+
+
+class GraphMetricsCsrTest(parameterized.TestCase):
+
+  def _AssertParity(self, edges, exact_diameter):
+    # graph_metrics built the networkx graph from the edge array, so vertices
+    # without edges are not counted by either backend.
+    nx_graph = nx.Graph()
+    nx_graph.add_edges_from(edges.tolist())
+    expected = graph_metrics_nx(nx_graph, exact_diameter)
+    actual = graph_metrics_csr(edges, exact_diameter)
+    self.assertCountEqual(actual.keys(), expected.keys())
+    for key, value in expected.items():
+      np.testing.assert_allclose(actual[key], value, rtol=1e-12, err_msg=key)
+
+  @parameterized.named_parameters(*_Cases())
+  def test_matches_networkx(self, edges, exact_diameter):
+    self._AssertParity(edges, exact_diameter)
+
+  @parameterized.parameters(False, True)
+  def test_matches_networkx_over_seeds(self, exact_diameter):
+    for seed in range(5):
+      for graph in (nx.gnp_random_graph(60, 0.05, seed=seed),
+                    nx.barabasi_albert_graph(60, 2, seed=seed),
+                    nx.powerlaw_cluster_graph(60, 2, 0.3, seed=seed)):
+        self._AssertParity(_Edges(graph), exact_diameter)
+
+
+class ApproximateGraphMetricsTest(parameterized.TestCase):
+
+  @parameterized.named_parameters(*_EdgeArrays()[:4])
+  def test_core_number_upper_bounds(self, edges):
+    adjacency, _ = csr._adjacency(edges)
+    degrees = np.diff(adjacency.indptr)
+    core_numbers = csr._core_numbers(adjacency, degrees)
+    for iterations in range(4):
+      bounds, converged = csr._core_number_upper_bounds(adjacency, degrees,
+                                                        iterations)
+      self.assertTrue(np.all(bounds >= core_numbers))
+      if converged:
+        np.testing.assert_array_equal(bounds, core_numbers)
+    bounds, converged = csr._core_number_upper_bounds(adjacency, degrees, 1000)
+    self.assertTrue(converged)
+    np.testing.assert_array_equal(bounds, core_numbers)
+
+  def test_small_graphs_are_exact(self):
+    edges = _Edges(nx.powerlaw_cluster_graph(150, 3, 0.5, seed=4))
+    exact = graph_metrics_csr(edges)
+    approximate = graph_metrics_csr(edges, approximate=True,
+                                    core_iterations=1000, rng=0)
+    self.assertEqual(approximate['coreness_is_exact'], 1.0)
+    for key, value in exact.items():
+      self.assertAlmostEqual(approximate[key], value, places=12, msg=key)
+    for key in ('avg_cc', 'transitivity', 'num_triangles'):
+      self.assertEqual(approximate[key + '_stderr'], 0.0)
+
+  def test_estimates_are_unbiased_and_covered(self):
+    edges = _Edges(nx.powerlaw_cluster_graph(300, 4, 0.5, seed=5))
+    exact = graph_metrics_csr(edges)
+    estimates = [graph_metrics_csr(edges, approximate=True, num_samples=400,
+                                   rng=seed) for seed in range(200)]
+    for key in ('avg_cc', 'transitivity', 'num_triangles'):
+      values = np.array([estimate[key] for estimate in estimates])
+      stderrs = np.array([estimate[key + '_stderr']
+                          for estimate in estimates])
+      self.assertLess(abs(np.mean(values) - exact[key]),
+                      4.0 * np.std(values) / np.sqrt(len(values)), msg=key)
+      coverage = np.mean(np.abs(values - exact[key]) <= 1.96 * stderrs)
+      self.assertGreater(coverage, 0.88, msg=key)
+
+
+if __name__ == '__main__':
+  absltest.main()
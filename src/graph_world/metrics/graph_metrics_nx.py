@@ -14,6 +14,9 @@
 from typing import Dict
 import networkx as nx
 import numpy as np
+import scipy.sparse
+
+from .diameter import approximate_diameter
 
 
 def _degrees(graph: nx.Graph) -> np.ndarray:
@@ -53,13 +56,26 @@ def _gini_coefficient(array: np.ndarray) -> float:
   return np.sum((2 * index - n  - 1) * array) / (n * np.sum(array))
 
 
-def _diameter(graph: nx.Graph) -> float:
-  """Computes diameter of the graph."""
+def _diameter(graph: nx.Graph, exact: bool,
+              max_sweeps: int) -> Dict[str, float]:
+  """Computes the diameter of the graph and whether it is exact."""
+  if exact:
+    if graph.number_of_nodes() == 0:
+      diameter = 0.0
+    elif not nx.is_connected(graph):
+      diameter = np.inf
+    else:
+      diameter = float(nx.diameter(graph))
+    return {'approximate_diameter': diameter,
+            'approximate_diameter_is_exact': 1.0}
   if graph.number_of_nodes() == 0:
-    return 0.0
-  if not nx.is_connected(graph):
-    return np.inf
-  return float(nx.diameter(graph))
+    return {'approximate_diameter': 0.0, 'approximate_diameter_is_exact': 1.0}
+  # Nodes are ordered as in graph_metrics_csr so both pick the same sweeps.
+  adjacency = scipy.sparse.csr_matrix(
+    nx.to_scipy_sparse_array(graph, nodelist=sorted(graph.nodes())))
+  diameter, is_exact = approximate_diameter(adjacency, max_sweeps)
+  return {'approximate_diameter': diameter,
+          'approximate_diameter_is_exact': float(is_exact)}
 
 
 def _largest_connected_component_size(graph: nx.Graph) -> float:
@@ -72,18 +88,26 @@ def _largest_connected_component_size(graph: nx.Graph) -> float:
   return np.max(list(map(len, components))) / graph.number_of_nodes()
 
 
-def graph_metrics_nx(graph: nx.Graph) -> Dict[str, float]:
+def graph_metrics_nx(graph: nx.Graph, exact_diameter: bool = False,
+                     diameter_sweeps: int = 16) -> Dict[str, float]:
   """Computes graph metrics on a networkx graph object.
 
   Arguments:
     graph: networkx graph.
+    exact_diameter: if True, approximate_diameter is the exact diameter of
+      the graph (inf if it is disconnected), at the cost of a BFS from every
+      node. Otherwise it is a lower bound on the diameter of the largest
+      connected component from at most `diameter_sweeps` BFS runs, and
+      approximate_diameter_is_exact is 1.0 when that bound is certified
+      exact.
+    diameter_sweeps: BFS budget of the approximate diameter.
   Returns:
     dict from metric names to metric values.
   """
   result = _counts(graph)
   degrees = _degrees(graph)
   result['degree_gini'] = _gini_coefficient(degrees)
-  result['approximate_diameter'] = _diameter(graph)
+  result.update(_diameter(graph, exact_diameter, diameter_sweeps))
   if graph.number_of_nodes() == 0:  # avoid np.mean of empty slice
     result['avg_degree'] = 0.0
     return result
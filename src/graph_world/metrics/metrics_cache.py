@@ -0,0 +1,139 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Content-addressed on-disk cache of sample metrics.
+
+Metrics are stored in a local sqlite file under the sha256 of the sample
+contents (edge array, memberships, node features) and of the metric
+configuration, so re-running a campaign on the same generated graphs turns
+the metrics stage into lookups. Least recently used entries are evicted once
+the file holds more than max_size_bytes of metrics.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import time
+from typing import Dict, Optional, Sequence
+
+import gin
+import numpy as np
+
+# Bump when a change to the metric code alters the values of cached metrics.
+_CACHE_VERSION = 1
+
+
+def ContentKey(arrays: Sequence[Optional[np.ndarray]], config) -> str:
+  """Returns the sha256 hex digest of a list of arrays and a configuration.
+  Args:
+    arrays: arrays to hash, in order. None entries are hashed as such.
+    config: metric configuration; its repr must be deterministic.
+  Returns:
+    the hex digest.
+  """
+  digest = hashlib.sha256(repr((_CACHE_VERSION, config)).encode())
+  for array in arrays:
+    if array is None:
+      digest.update(b'None')
+      continue
+    array = np.ascontiguousarray(array)
+    digest.update(('%s%s' % (array.dtype.str, array.shape)).encode())
+    digest.update(array.data)
+  return digest.hexdigest()
+
+
+@gin.configurable
+class MetricsCache:
+  """sqlite-backed LRU cache from content keys to metric dicts.
+
+  The database connection is opened lazily on the worker, so the cache can be
+  shipped inside a DoFn. Concurrent workers on one machine may share a file.
+
+  Attributes:
+    path: local path of the sqlite file, or None to disable the cache.
+    max_size_bytes: bound on the total size of the cached metrics.
+  """
+
+  @gin.configurable
+  def __init__(self, path=None, max_size_bytes=2 ** 30):
+    """Configures the cache.
+    Args:
+      path: local path of the sqlite file. The cache is disabled when None.
+      max_size_bytes: once the cached metrics take more than this many bytes,
+        the least recently used entries are evicted.
+    """
+    self.path = path
+    self.max_size_bytes = max_size_bytes
+    self._connection = None
+
+  @property
+  def enabled(self) -> bool:
+    return self.path is not None
+
+  def _Connection(self) -> sqlite3.Connection:
+    if self._connection is None:
+      directory = os.path.dirname(os.path.abspath(self.path))
+      os.makedirs(directory, exist_ok=True)
+      self._connection = sqlite3.connect(self.path, timeout=60.0)
+      with self._connection:
+        self._connection.execute(
+          'CREATE TABLE IF NOT EXISTS metrics (key TEXT PRIMARY KEY, '
+          'value BLOB NOT NULL, size INTEGER NOT NULL, '
+          'last_access REAL NOT NULL)')
+        self._connection.execute(
+          'CREATE INDEX IF NOT EXISTS metrics_last_access '
+          'ON metrics (last_access)')
+    return self._connection
+
+  def Get(self, key: str) -> Optional[Dict[str, float]]:
+    """Returns the metrics cached under `key`, or None on a miss."""
+    connection = self._Connection()
+    row = connection.execute('SELECT value FROM metrics WHERE key = ?',
+                             (key,)).fetchone()
+    if row is None:
+      return None
+    with connection:
+      connection.execute('UPDATE metrics SET last_access = ? WHERE key = ?',
+                         (time.time(), key))
+    return pickle.loads(row[0])
+
+  def Put(self, key: str, metrics: Dict[str, float]):
+    """Caches `metrics` under `key`, then evicts down to max_size_bytes."""
+    value = pickle.dumps(dict(metrics))
+    connection = self._Connection()
+    with connection:
+      connection.execute(
+        'INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?)',
+        (key, value, len(value), time.time()))
+      total_size = connection.execute(
+        'SELECT COALESCE(SUM(size), 0) FROM metrics').fetchone()[0]
+      if total_size <= self.max_size_bytes:
+        return
+      evicted = []
+      for evicted_key, size in connection.execute(
+          'SELECT key, size FROM metrics ORDER BY last_access'):
+        if total_size <= self.max_size_bytes:
+          break
+        evicted.append((evicted_key,))
+        total_size -= size
+      connection.executemany('DELETE FROM metrics WHERE key = ?', evicted)
+    logging.info('Evicted %d entries from the metrics cache %s',
+                 len(evicted), self.path)
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['_connection'] = None
+    return state
@@ -0,0 +1,93 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Hits, misses and eviction of the sqlite metrics cache."""
+
+import itertools
+import os
+import pickle
+import tempfile
+from unittest import mock
+
+from absl.testing import absltest
+import numpy as np
+
+from graph_world.metrics import metrics_cache
+from graph_world.metrics.metrics_cache import ContentKey, MetricsCache
+
+
+class ContentKeyTest(absltest.TestCase):
+
+  def test_depends_on_content_dtype_shape_and_config(self):
+    edges = np.arange(6).reshape(3, 2)
+    key = ContentKey([edges, None], 'config')
+    self.assertEqual(ContentKey([edges.copy(), None], 'config'), key)
+    self.assertEqual(ContentKey([np.asfortranarray(edges), None], 'config'),
+                     key)
+    for other in (ContentKey([edges + 1, None], 'config'),
+                  ContentKey([edges.astype(np.int32), None], 'config'),
+                  ContentKey([edges.reshape(2, 3), None], 'config'),
+                  ContentKey([None, edges], 'config'),
+                  ContentKey([edges, None], 'other config')):
+      self.assertNotEqual(other, key)
+
+
+class MetricsCacheTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    directory = tempfile.TemporaryDirectory()
+    self.addCleanup(directory.cleanup)
+    # The cache creates missing parent directories.
+    self.path = os.path.join(directory.name, 'cache', 'metrics.sqlite')
+
+  def test_disabled_without_path(self):
+    self.assertFalse(MetricsCache().enabled)
+    self.assertTrue(MetricsCache(self.path).enabled)
+
+  def test_hit_and_miss(self):
+    cache = MetricsCache(self.path)
+    self.assertIsNone(cache.Get('key'))
+    cache.Put('key', {'num_nodes': 10.0, 'avg_cc': np.nan})
+    metrics = cache.Get('key')
+    self.assertEqual(metrics['num_nodes'], 10.0)
+    self.assertTrue(np.isnan(metrics['avg_cc']))
+    self.assertIsNone(cache.Get('other key'))
+    # Another cache on the same file sees the entry.
+    self.assertEqual(MetricsCache(self.path).Get('key')['num_nodes'], 10.0)
+
+  def test_evicts_least_recently_used(self):
+    entry_size = len(pickle.dumps({'value': 0.0}))
+    cache = MetricsCache(self.path, max_size_bytes=3 * entry_size)
+    clock = itertools.count()
+    with mock.patch.object(metrics_cache.time, 'time',
+                           lambda: float(next(clock))):
+      for key in ('a', 'b', 'c'):
+        cache.Put(key, {'value': 0.0})
+      # Reading a makes b the least recently used entry.
+      self.assertIsNotNone(cache.Get('a'))
+      cache.Put('d', {'value': 0.0})
+      self.assertIsNone(cache.Get('b'))
+      for key in ('a', 'c', 'd'):
+        self.assertIsNotNone(cache.Get(key), key)
+
+  def test_pickles_without_connection(self):
+    cache = MetricsCache(self.path)
+    cache.Put('key', {'value': 1.0})
+    unpickled = pickle.loads(pickle.dumps(cache))
+    self.assertEqual(unpickled.Get('key'), {'value': 1.0})
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -11,52 +11,55 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import numpy as np
-
-import graph_tool
+import concurrent.futures
 
+import gin
+import numpy as np
 
-def edge_homogeneity(graph, labels):
-  count_in = 0
-  count_total = 0
-  for edge in graph.edges():
-    count_total += 1
-    count_in += (
-        labels[int(edge.source())] == labels[int(edge.target())])
-  return count_in / count_total
 
+def edge_homogeneity(graph, labels, edges=None):
+  if edges is None:
+    edges = graph.get_edges()
+  labels = np.asarray(labels)
+  count_in = np.sum(labels[edges[:, 0]] == labels[edges[:, 1]])
+  return count_in / edges.shape[0]
 
-def sum_angular_distance_matrix_nan(X, Y, batch_size=100):
-  nx = X.shape[0]
-  ny = Y.shape[0]
 
-  total_sum = 0.0
+def _angular_similarity(vecsims):
+  """Maps cosine similarities to 1 - angle / pi, with 1.0 where undefined."""
+  vecsims = np.clip(vecsims, -1, 1)
+  vecsims = 1.0 - np.arccos(vecsims) / np.pi
+  vecsims[np.where(np.isnan(vecsims))] = 1.0
+  return vecsims
 
-  pos1 = 0
-  while pos1 < nx:
-    end1 = min(pos1 + batch_size, nx)
-    vec1 = X[pos1:end1, :]
 
-    pos2 = 0
-    curr_sum = 0.0
-    while pos2 < ny:
-      # Get data
-      end2 = min(pos2 + batch_size, ny)
-      vec2 = Y[pos2:end2, :]
+def sum_angular_distance_matrix_nan(X, Y, batch_size=256, num_threads=None):
+  """Sums the angular similarity of all rows of X with all rows of Y.
 
-      vecsims = np.matmul(vec1, vec2.T)
-      vecsims = np.clip(vecsims, -1, 1)
-      vecsims = 1.0 - np.arccos(vecsims) / np.pi
-      vecsims[np.where(np.isnan(vecsims))] = 1.0
-      total_sum += np.sum(vecsims)
+  Rows of X are split into blocks that are processed by a thread pool; numpy
+  releases the GIL in the block products and in arccos. Undefined (nan)
+  similarities count as 1.0. Blocks of 256 x 256 similarities stay in cache
+  through the in-place clip and arccos passes.
+  """
+  ny = Y.shape[0]
 
-      pos2 += batch_size
+  def _row_block_sum(pos1):
+    vec1 = X[pos1:pos1 + batch_size, :]
+    block_sum = 0.0
+    for pos2 in range(0, ny, batch_size):
+      vec2 = Y[pos2:pos2 + batch_size, :]
+      angles = np.matmul(vec1, vec2.T)
+      np.clip(angles, -1, 1, out=angles)
+      np.arccos(angles, out=angles)
+      block_sum += angles.size - np.nansum(angles) / np.pi
+    return block_sum
 
-    pos1 += batch_size
-  return total_sum
+  with concurrent.futures.ThreadPoolExecutor(num_threads) as executor:
+    return float(sum(executor.map(_row_block_sum,
+                                  range(0, X.shape[0], batch_size))))
 
 
-def feature_homogeneity(normed_features, labels):
+def feature_homogeneity(normed_features, labels, num_threads=None):
   all_labels = sorted(list(set(labels)))
   n_labels = len(all_labels)
   sum_mat = np.zeros((n_labels, n_labels))
@@ -67,7 +70,8 @@ def feature_homogeneity(normed_features, labels):
     for j in all_labels[label_idx:]:
       idx_j = np.where(labels == j)[0]
       vecs_j = normed_features[idx_j, :]
-      the_sum = sum_angular_distance_matrix_nan(vecs_i, vecs_j)
+      the_sum = sum_angular_distance_matrix_nan(vecs_i, vecs_j,
+                                                num_threads=num_threads)
       the_count = len(idx_j) * len(idx_i)
       if i == j:
         the_sum -= float(len(idx_j))
@@ -82,47 +86,115 @@ def feature_homogeneity(normed_features, labels):
   return in_avg, out_avg
 
 
-def _get_edge_count_matrix(adj, labels):
-  k = len(set(labels))
-  seen_edges = set()
-  edge_counts = np.zeros((k, k))
-  edge_matrix = np.array(np.nonzero(adj))
-  for edge_index in range(edge_matrix.shape[1]):
-    v1 = edge_matrix[0, edge_index]
-    v2 = edge_matrix[1, edge_index]
-    edge_tuple = (v1, v2)
-    if edge_tuple in seen_edges:
+def sampled_feature_homogeneity(normed_features, labels, num_samples,
+                                rng=None):
+  """Stratified sampling estimate of feature_homogeneity.
+
+  Every unordered pair of label groups (i, j), i <= j, is a stratum of node
+  pairs. Each stratum gets a share of the `num_samples` pair budget
+  proportional to its size (at least 2 pairs), and strata that are no larger
+  than their share are summed exactly.
+  Args:
+    normed_features: (num_nodes, feature_dim) row-normalized features.
+    labels: (num_nodes,) node labels.
+    num_samples: total number of node pairs to sample.
+    rng: numpy Generator used for sampling.
+  Returns:
+    (in_avg, out_avg, in_var, out_var, in_out_cov): the estimates of the two
+    feature_homogeneity averages, their sampling variances, and the sampling
+    covariance between them.
+  """
+  rng = np.random.default_rng(rng)
+  labels = np.asarray(labels)
+  members = [np.where(labels == label)[0] for label in np.unique(labels)]
+  strata = [(i, j) for i in range(len(members))
+            for j in range(i, len(members))]
+  sizes = np.array([
+    len(members[i]) * (len(members[i]) - 1) / 2.0 if i == j else
+    float(len(members[i]) * len(members[j])) for i, j in strata])
+  within = np.array([i == j for i, j in strata])
+  allocation = np.maximum(
+    2, np.round(num_samples * sizes / max(np.sum(sizes), 1.0))).astype(int)
+  means = np.zeros(len(strata))
+  mean_variances = np.zeros(len(strata))
+  for s, (i, j) in enumerate(strata):
+    if sizes[s] == 0:
       continue
+    vecs_i = normed_features[members[i], :]
+    vecs_j = normed_features[members[j], :]
+    if sizes[s] <= allocation[s]:
+      the_sum = sum_angular_distance_matrix_nan(vecs_i, vecs_j)
+      if i == j:
+        the_sum = (the_sum - len(members[i])) / 2.0
+      means[s] = the_sum / sizes[s]
+      continue
+    first = rng.integers(len(members[i]), size=allocation[s])
+    if i == j:
+      # Uniform over ordered pairs of distinct members.
+      second = rng.integers(len(members[j]) - 1, size=allocation[s])
+      second += second >= first
     else:
-      seen_edges.add(edge_tuple)
-    k1 = labels[v1]
-    k2 = labels[v2]
-    edge_counts[k1, k2] += 1
-    if k1 == k2:
-      edge_counts[k1, k2] += 1
-  edge_counts = edge_counts.astype(np.int32)
-  return edge_counts
+      second = rng.integers(len(members[j]), size=allocation[s])
+    sims = _angular_similarity(
+      np.einsum('ij,ij->i', vecs_i[first], vecs_j[second]))
+    means[s] = np.mean(sims)
+    mean_variances[s] = np.var(sims, ddof=1) / allocation[s]
+  # Like feature_homogeneity, the out average runs over all node pairs.
+  in_weights = np.where(within, sizes, 0.0) / np.sum(sizes[within])
+  out_weights = sizes / np.sum(sizes)
+  return (np.sum(in_weights * means), np.sum(out_weights * means),
+          np.sum(in_weights ** 2 * mean_variances),
+          np.sum(out_weights ** 2 * mean_variances),
+          np.sum(in_weights * out_weights * mean_variances))
+
+
+def label_edge_count_matrix(sources, targets, labels):
+  """Counts directed edges between each pair of labels.
+
+  Duplicate (source, target) pairs are counted once, and edges within a label
+  are counted twice, so an undirected intra-label edge given in both
+  directions contributes 4 to the diagonal.
+  Args:
+    sources: array of directed edge sources.
+    targets: array of directed edge targets.
+    labels: (num_nodes,) array of labels in [0, num_labels).
+  Returns:
+    (num_labels, num_labels) int32 matrix of edge counts.
+  """
+  labels = np.asarray(labels)
+  k = len(np.unique(labels))
+  n = labels.shape[0]
+  pairs = np.unique(np.asarray(sources, dtype=np.int64) * n +
+                    np.asarray(targets, dtype=np.int64))
+  label_pairs = labels[pairs // n] * k + labels[pairs % n]
+  edge_counts = np.bincount(label_pairs, minlength=k * k).reshape(k, k)
+  edge_counts[np.diag_indices(k)] *= 2
+  return edge_counts.astype(np.int32)
+
+
+def _get_edge_count_matrix(edges, labels):
+  """Returns label_edge_count_matrix of an undirected (num_edges, 2) array."""
+  return label_edge_count_matrix(
+    np.concatenate([edges[:, 0], edges[:, 1]]),
+    np.concatenate([edges[:, 1], edges[:, 0]]), labels)
 
 def matrix_row_norm(X):
   return X / np.linalg.norm(X, axis=1)[:, None]
 
 def _get_degrees_by_labels(labels, degrees, adjusted=False):
+  labels = np.asarray(labels)
+  present = np.flatnonzero(np.bincount(labels))
   if adjusted:
-    degrees_by_labels = {
-        label: np.sum(degrees[np.where(labels == label)[0]]) for
-        label in labels}
+    label_sums = np.bincount(labels, weights=degrees)[present]
+    label_sums = label_sums.astype(np.asarray(degrees).dtype)
   else:
-    degrees_by_labels = {
-        label: len(np.where(labels == label)[0]) for
-        label in labels}
-  return degrees_by_labels
+    label_sums = np.bincount(labels)[present]
+  return dict(zip(present, label_sums))
 
 
-def _get_p_to_q_ratio(G, labels, degrees, adjusted=False):
-  adj = graph_tool.spectral.adjacency(G)
-  edge_count_matrix = _get_edge_count_matrix(adj, labels)
+def _get_p_to_q_ratio(edge_count_matrix, labels, degrees, adjusted=False):
   pi = _get_pi(labels, degrees, adjusted)
-  n = adj.shape[0]
+  n = len(degrees)
   num_within_pairs = np.sum(pi ** 2.0) * (n ** 2.0)
   num_between_pairs = (n ** 2.0) - num_within_pairs
   num_within_edges = np.sum(np.diag(edge_count_matrix))
@@ -158,21 +230,85 @@ def _get_average_degree(degrees):
   return np.mean(degrees)
 
 
-def NodeLabelMetrics(graph, labels, features):
-  metrics = {'edge_homogeneity': edge_homogeneity(graph, labels)}
+def NodeLabelMetrics(graph, labels, features, feature_metrics=None):
+  metrics = NodeLabelStructuralMetrics(graph, labels)
+  metrics.update((feature_metrics or NodeFeatureMetrics)(labels, features))
+  return metrics
+
+
+def NodeFeatureMetrics(labels, features, num_samples=None, num_threads=None,
+                       rng=None):
+  """Label metrics that depend on the node features.
+
+  Args:
+    labels: (num_nodes,) node labels.
+    features: (num_nodes, feature_dim) node features.
+    num_samples: if None, the angular similarity averages are computed over
+      all node pairs. Otherwise they are estimated from this many sampled
+      pairs, stratified by label pair.
+    num_threads: threads used by the exact computation.
+    rng: seed or numpy Generator for the sampled estimate.
+  Returns:
+    dict from metric names to values. Each metric has a '_ci95' companion key
+    holding the half-width of its 95% confidence interval, which is 0.0 for
+    exact values.
+  """
   normed_features = matrix_row_norm(features)
-  in_avg, out_avg = feature_homogeneity(normed_features, labels)
-  metrics.update({'avg_in_feature_angular_distance': in_avg,
-                  'avg_out_feature_angular_distance': out_avg,
-                  'feature_angular_snr': in_avg/out_avg})
+  labels = np.asarray(labels)
+  if num_samples is None:
+    in_avg, out_avg = feature_homogeneity(normed_features, labels, num_threads)
+    in_var = out_var = in_out_cov = 0.0
+  else:
+    in_avg, out_avg, in_var, out_var, in_out_cov = (
+      sampled_feature_homogeneity(normed_features, labels, num_samples, rng))
+  snr = in_avg / out_avg
+  # Delta method for the variance of the ratio of the two estimates.
+  snr_var = snr ** 2 * (in_var / in_avg ** 2 + out_var / out_avg ** 2 -
+                        2.0 * in_out_cov / (in_avg * out_avg))
+  z = 1.959963984540054
+  return {'avg_in_feature_angular_distance': in_avg,
+          'avg_in_feature_angular_distance_ci95': z * np.sqrt(in_var),
+          'avg_out_feature_angular_distance': out_avg,
+          'avg_out_feature_angular_distance_ci95': z * np.sqrt(out_var),
+          'feature_angular_snr': snr,
+          'feature_angular_snr_ci95': z * np.sqrt(max(snr_var, 0.0))}
+
+
+@gin.configurable
+class FeatureMetrics:
+  """Callable binding gin-configured options of NodeFeatureMetrics.
+
+  Set num_samples to estimate the feature angular similarity metrics from a
+  fixed budget of node pairs instead of all O(n^2) pairs. The options also
+  configure the feature metrics of the metric registry.
+  """
+
+  @gin.configurable
+  def __init__(self, num_samples=None, num_threads=None, seed=None):
+    self.num_samples = num_samples
+    self.num_threads = num_threads
+    self.seed = seed
+
+  def __call__(self, labels, features):
+    return NodeFeatureMetrics(labels, features, self.num_samples,
+                              self.num_threads, self.seed)
+
+
+def NodeLabelStructuralMetrics(graph, labels):
+  """Label metrics that only depend on the graph and the node labels."""
+  edges = graph.get_edges()
+  metrics = {'edge_homogeneity': edge_homogeneity(graph, labels, edges)}
   degrees = graph.get_out_degrees(graph.get_vertices())
-  nonzero_degrees = np.array([d for d in degrees if d > 0])
+  nonzero_degrees = degrees[degrees > 0]
   metrics['pareto_exponent'] = _get_pareto_exponent(nonzero_degrees)
   metrics['avg_degree_est'] = _get_average_degree(degrees)
   if labels is not None:
+    # The label edge counts are shared by both p_to_q_ratio estimates.
+    edge_count_matrix = _get_edge_count_matrix(edges, labels)
     metrics['community_size_simpsons'] = _get_community_size_simpsons(labels)
-    metrics['p_to_q_ratio_est'] = _get_p_to_q_ratio(graph, labels, degrees)
-    metrics['p_to_q_ratio__est_dc'] = _get_p_to_q_ratio(graph, labels, degrees,
-                                                  adjusted=True)
+    metrics['p_to_q_ratio_est'] = _get_p_to_q_ratio(edge_count_matrix, labels,
+                                                    degrees)
+    metrics['p_to_q_ratio__est_dc'] = _get_p_to_q_ratio(
+      edge_count_matrix, labels, degrees, adjusted=True)
     metrics['num_clusters'] = _get_num_clusters(labels)
-  return metrics
\ No newline at end of file
+  return metrics
@@ -0,0 +1,94 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Exact and sampled feature homogeneity against dense pairwise averages."""
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+
+from graph_world.metrics import node_label_metrics
+
+
+def _Inputs(num_nodes=150, num_labels=4):
+  rng = np.random.default_rng(0)
+  labels = rng.integers(0, num_labels, num_nodes)
+  # Features lean towards their label's direction, so in and out differ.
+  centers = rng.normal(size=(num_labels, 6))
+  features = centers[labels] + rng.normal(size=(num_nodes, 6))
+  return labels, features
+
+
+def _DenseHomogeneity(normed_features, labels):
+  """Averages 1 - angle / pi over same-label and over all node pairs."""
+  with np.errstate(invalid='ignore'):
+    similarities = 1.0 - np.arccos(
+      np.clip(normed_features @ normed_features.T, -1, 1)) / np.pi
+  similarities[np.isnan(similarities)] = 1.0
+  upper = np.triu(np.ones(similarities.shape, dtype=bool), k=1)
+  same_label = labels[:, None] == labels[None, :]
+  return (np.mean(similarities[upper & same_label]),
+          np.mean(similarities[upper]))
+
+
+class FeatureHomogeneityTest(parameterized.TestCase):
+
+  @parameterized.parameters((256, None), (7, 3))
+  def test_sum_angular_distance_matrix_nan(self, batch_size, num_threads):
+    _, features = _Inputs()
+    normed = node_label_metrics.matrix_row_norm(features)
+    dense = 1.0 - np.arccos(np.clip(normed[:40] @ normed.T, -1, 1)) / np.pi
+    self.assertAlmostEqual(
+      node_label_metrics.sum_angular_distance_matrix_nan(
+        normed[:40], normed, batch_size, num_threads),
+      np.sum(dense), places=8)
+
+  def test_exact_matches_dense(self):
+    labels, features = _Inputs()
+    normed = node_label_metrics.matrix_row_norm(features)
+    np.testing.assert_allclose(
+      node_label_metrics.feature_homogeneity(normed, labels),
+      _DenseHomogeneity(normed, labels), rtol=1e-10)
+
+  def test_sampled_covering_all_pairs_is_exact(self):
+    labels, features = _Inputs()
+    exact = node_label_metrics.NodeFeatureMetrics(labels, features)
+    sampled = node_label_metrics.NodeFeatureMetrics(labels, features,
+                                                    num_samples=10 ** 6)
+    self.assertCountEqual(sampled, exact)
+    for key, value in exact.items():
+      self.assertAlmostEqual(sampled[key], value, places=10, msg=key)
+      if key.endswith('_ci95'):
+        self.assertEqual(value, 0.0)
+
+  def test_sampled_is_unbiased_and_covered(self):
+    labels, features = _Inputs()
+    exact = node_label_metrics.NodeFeatureMetrics(labels, features)
+    estimates = [node_label_metrics.NodeFeatureMetrics(
+      labels, features, num_samples=500, rng=seed) for seed in range(200)]
+    for key in ('avg_in_feature_angular_distance',
+                'avg_out_feature_angular_distance', 'feature_angular_snr'):
+      values = np.array([estimate[key] for estimate in estimates])
+      half_widths = np.array([estimate[key + '_ci95']
+                              for estimate in estimates])
+      self.assertTrue(np.all(half_widths > 0.0))
+      # The mean of 200 estimates is within a few of its standard errors.
+      self.assertLess(abs(np.mean(values) - exact[key]),
+                      4.0 * np.std(values) / np.sqrt(len(values)), msg=key)
+      coverage = np.mean(np.abs(values - exact[key]) <= half_widths)
+      self.assertGreater(coverage, 0.88, msg=key)
+
+
+if __name__ == '__main__':
+  absltest.main()
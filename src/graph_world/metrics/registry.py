@@ -0,0 +1,175 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Registry of named sample metrics with declared costs and dependencies.
+
+A metric is a function of a MetricContext that returns its value, or a dict
+holding its value and companion keys (e.g. standard errors). Intermediate
+results shared by several metrics (degrees, components, label edge counts,
+...) are registered as dependencies and computed at most once per context.
+
+ComputeMetrics evaluates a selection of metrics in increasing cost order.
+Once the wall-clock budget of a sample is spent, metrics above the CHEAP cost
+class are skipped instead of stalling the worker. Each metric declares the
+keys it outputs for a context, and skipped metrics report nan for exactly
+those keys, so the output keys do not depend on the budget.
+"""
+
+import dataclasses
+import enum
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class Cost(enum.IntEnum):
+  """Cost classes of metrics, in the order in which they are computed."""
+  CHEAP = 0  # Linear or near-linear in the number of edges.
+  MODERATE = 1  # A bounded number of passes (BFS sweeps, peeling rounds).
+  EXPENSIVE = 2  # Superlinear, e.g. triangle counts or all-pairs features.
+
+
+@dataclasses.dataclass(frozen=True)
+class MetricSpec:
+  name: str
+  fn: Callable
+  cost: Cost
+  dependencies: Tuple[str, ...]
+  inputs: Tuple[str, ...]
+  output_keys: Callable
+
+
+_METRICS: Dict[str, MetricSpec] = {}
+_DEPENDENCIES: Dict[str, Callable] = {}
+
+
+def RegisterMetric(name: str, cost: Cost, dependencies: Sequence[str] = (),
+                   inputs: Sequence[str] = ('graph',),
+                   output_keys: Optional[Callable] = None):
+  """Decorator registering a metric function under `name`.
+  Args:
+    name: metric name, also the output key of its value.
+    cost: cost class of the metric, including its dependencies.
+    dependencies: names of registered dependencies the metric may read. They
+      are computed lazily, when the metric first calls context.Get.
+    inputs: context inputs ('graph', 'labels', 'features') the metric needs.
+      Metrics whose inputs are missing are left out of the output.
+    output_keys: function of a MetricContext returning the keys the metric
+      outputs on it, which must not run the metric itself. Defaults to
+      (name,).
+  Returns:
+    the decorator, which returns the function unchanged.
+  """
+  def _Decorator(fn):
+    if name in _METRICS:
+      raise ValueError('Metric %s is already registered' % name)
+    _METRICS[name] = MetricSpec(
+      name, fn, Cost(cost), tuple(dependencies), tuple(inputs),
+      output_keys or (lambda context: (name,)))
+    return fn
+  return _Decorator
+
+
+def RegisterDependency(name: str):
+  """Decorator registering a shared intermediate result under `name`."""
+  def _Decorator(fn):
+    if name in _DEPENDENCIES:
+      raise ValueError('Dependency %s is already registered' % name)
+    _DEPENDENCIES[name] = fn
+    return fn
+  return _Decorator
+
+
+def MetricNames() -> List[str]:
+  """Returns the registered metric names, in registration order."""
+  return list(_METRICS)
+
+
+def GetMetricSpec(name: str) -> MetricSpec:
+  if name not in _METRICS:
+    raise ValueError('Unknown metric: %s' % name)
+  return _METRICS[name]
+
+
+class MetricContext:
+  """Inputs of one sample and the dependencies computed on them so far.
+
+  Attributes:
+    graph: graph_tool graph or CsrGraph, or None.
+    labels: (num_nodes,) node labels, or None.
+    features: (num_nodes, feature_dim) node features, or None.
+    graph_options: options of the graph structure metrics.
+    feature_options: options of the node feature metrics.
+  """
+
+  def __init__(self, graph=None, labels=None, features=None,
+               graph_options=None, feature_options=None):
+    self.graph = graph
+    self.labels = labels
+    self.features = features
+    self.graph_options = graph_options
+    self.feature_options = feature_options
+    self._values = {}
+
+  def HasInputs(self, inputs: Sequence[str]) -> bool:
+    return all(getattr(self, name) is not None for name in inputs)
+
+  def Get(self, name: str):
+    """Returns the dependency `name`, computing it on first use."""
+    if name not in self._values:
+      if name not in _DEPENDENCIES:
+        raise ValueError('Unknown metric dependency: %s' % name)
+      self._values[name] = _DEPENDENCIES[name](self)
+    return self._values[name]
+
+
+def ComputeMetrics(context: MetricContext,
+                   names: Optional[Sequence[str]] = None,
+                   time_budget: Optional[float] = None,
+                   start_time: Optional[float] = None) -> Dict[str, float]:
+  """Computes a selection of registered metrics.
+  Args:
+    context: the sample inputs.
+    names: metric names to compute. Defaults to every registered metric.
+    time_budget: wall-clock seconds per sample. Metrics that are not CHEAP are
+      skipped once it has been spent, and their output keys set to nan. A
+      metric that has started always runs to completion.
+    start_time: time.time() at which the sample's budget started, so that
+      several calls can share one budget. Defaults to now.
+  Returns:
+    dict from metric names (and companion keys) to values, in registration
+    order.
+  """
+  if start_time is None:
+    start_time = time.time()
+  specs = [GetMetricSpec(name) for name in (
+    MetricNames() if names is None else names)]
+  specs = [spec for spec in specs if context.HasInputs(spec.inputs)]
+  values = {}
+  for spec in sorted(specs, key=lambda spec: spec.cost):
+    if (time_budget is not None and spec.cost > Cost.CHEAP and
+        time.time() - start_time > time_budget):
+      logging.info('Skipping metric %s: time budget of %.1fs exhausted',
+                   spec.name, time_budget)
+      values[spec.name] = {key: np.nan for key in spec.output_keys(context)}
+      continue
+    value = spec.fn(context)
+    values[spec.name] = value if isinstance(value, dict) else {
+      spec.name: value}
+  metrics = {}
+  for name in MetricNames():
+    metrics.update(values.get(name, {}))
+  return metrics
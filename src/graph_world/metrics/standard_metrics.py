@@ -0,0 +1,479 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Registers the GraphWorld sample metrics with the metric registry.
+
+The graph structure metrics reproduce graph_metrics, the label metrics
+NodeLabelStructuralMetrics and the feature metrics NodeFeatureMetrics, key for
+key, but each can be selected on its own. The Compute*Metrics DoFns compute
+the gin-configured MetricSelection.
+"""
+
+import time
+from typing import Dict
+
+import gin
+import networkx as nx
+import numpy as np
+import scipy.sparse.csgraph
+
+from . import graph_metrics_csr as csr
+from .batched_graph_metrics import batched_graph_metrics
+from .graph_metrics import GraphMetrics
+from .graph_metrics_nx import (
+  _counts, _degrees, _diameter, _gini_coefficient,
+  _largest_connected_component_size)
+from .metrics_cache import ContentKey, MetricsCache
+from .node_label_metrics import (
+  FeatureMetrics, NodeFeatureMetrics, _get_average_degree,
+  _get_community_size_simpsons, _get_edge_count_matrix, _get_num_clusters,
+  _get_p_to_q_ratio, _get_pareto_exponent, edge_homogeneity)
+from .registry import (
+  Cost, ComputeMetrics, GetMetricSpec, MetricContext, MetricNames,
+  RegisterDependency, RegisterMetric)
+
+
+# Shared intermediate results.
+
+@RegisterDependency('edges')
+def _Edges(context):
+  return context.graph.get_edges()
+
+
+@RegisterDependency('networkx_graph')
+def _NetworkxGraph(context):
+  """Returns the networkx graph that graph_metrics builds for its backend."""
+  graph = nx.Graph()
+  graph.add_edges_from(context.Get('edges').tolist())
+  return graph
+
+
+@RegisterDependency('networkx_degrees')
+def _NetworkxDegrees(context):
+  return _degrees(context.Get('networkx_graph'))
+
+
+@RegisterDependency('networkx_core_numbers')
+def _NetworkxCoreNumbers(context):
+  return np.array(list(nx.core_number(context.Get('networkx_graph')).values()))
+
+
+@RegisterDependency('adjacency')
+def _Adjacency(context):
+  """Returns (adjacency, num_edges) over the non-isolated vertices.
+
+  Self-loops, which the generators remove anyway, are ignored.
+  """
+  edges = context.Get('edges')
+  return csr._adjacency(edges[edges[:, 0] != edges[:, 1]])
+
+
+@RegisterDependency('degrees')
+def _Degrees(context):
+  return np.diff(context.Get('adjacency')[0].indptr)
+
+
+@RegisterDependency('components')
+def _Components(context):
+  _, component_labels = scipy.sparse.csgraph.connected_components(
+    context.Get('adjacency')[0], directed=False)
+  return component_labels
+
+
+@RegisterDependency('core_numbers')
+def _CoreNumbers(context):
+  """Returns the core numbers and whether they are exact."""
+  options = context.graph_options
+  adjacency = context.Get('adjacency')[0]
+  if options.approximate:
+    return csr._core_number_upper_bounds(adjacency, context.Get('degrees'),
+                                         options.core_iterations)
+  return csr._core_numbers(adjacency, context.Get('degrees')), True
+
+
+@RegisterDependency('triangle_metrics')
+def _TriangleMetrics(context):
+  options = context.graph_options
+  adjacency = context.Get('adjacency')[0]
+  if options.approximate:
+    return csr._sampled_triangle_metrics(
+      adjacency, context.Get('degrees'), options.num_samples,
+      np.random.default_rng(options.seed))
+  return csr._triangle_metrics(adjacency, context.Get('degrees'))
+
+
+@RegisterDependency('vertex_degrees')
+def _VertexDegrees(context):
+  return context.graph.get_out_degrees(context.graph.get_vertices())
+
+
+@RegisterDependency('label_edge_counts')
+def _LabelEdgeCounts(context):
+  return _get_edge_count_matrix(context.Get('edges'), context.labels)
+
+
+@RegisterDependency('feature_homogeneity')
+def _FeatureHomogeneity(context):
+  options = context.feature_options
+  return NodeFeatureMetrics(context.labels, context.features,
+                            options.num_samples, options.num_threads,
+                            options.seed)
+
+
+# Graph structure metrics. When GraphMetrics selects the networkx backend,
+# each is computed by its networkx_fn as graph_metrics_nx does, with the same
+# cost class.
+
+# Graph metrics reported on graphs without vertices.
+_EMPTY_GRAPH_METRICS = ('num_nodes', 'num_edges', 'edge_density',
+                        'degree_gini', 'approximate_diameter', 'avg_degree')
+
+
+def _IsEmptyGraph(context):
+  # graph_metrics_nx counts the vertices of self-loops, the csr metrics don't.
+  if context.graph_options.backend == 'networkx':
+    return context.Get('edges').shape[0] == 0
+  return context.Get('adjacency')[0].shape[0] == 0
+
+
+def _RegisterGraphMetric(name, cost, dependencies=(), networkx_fn=None,
+                         output_keys=None):
+  """Registers a graph metric.
+
+  networkx_fn: function of the context computing the metric under the
+    networkx backend.
+  output_keys: optional function of the context returning the keys the metric
+    outputs on non-empty graphs. Defaults to (name,).
+  """
+  def _Decorator(fn):
+    def _Metric(context):
+      if _IsEmptyGraph(context) and name not in _EMPTY_GRAPH_METRICS:
+        return {}
+      if context.graph_options.backend == 'networkx':
+        return networkx_fn(context)
+      return fn(context)
+
+    def _OutputKeys(context):
+      if _IsEmptyGraph(context) and name not in _EMPTY_GRAPH_METRICS:
+        return ()
+      return output_keys(context) if output_keys else (name,)
+
+    RegisterMetric(name, cost, ('edges',) + tuple(dependencies),
+                   output_keys=_OutputKeys)(_Metric)
+    return fn
+  return _Decorator
+
+
+def _NetworkxCount(name):
+  return lambda context: _counts(context.Get('networkx_graph'))[name]
+
+
+@_RegisterGraphMetric('num_nodes', Cost.CHEAP, ('adjacency',),
+                      _NetworkxCount('num_nodes'))
+def _NumNodes(context):
+  return float(context.Get('adjacency')[0].shape[0])
+
+
+@_RegisterGraphMetric('num_edges', Cost.CHEAP, ('adjacency',),
+                      _NetworkxCount('num_edges'))
+def _NumEdges(context):
+  return 2.0 * context.Get('adjacency')[1]
+
+
+@_RegisterGraphMetric('edge_density', Cost.CHEAP, ('adjacency',),
+                      _NetworkxCount('edge_density'))
+def _EdgeDensity(context):
+  adjacency, num_edges = context.Get('adjacency')
+  num_nodes = float(adjacency.shape[0])
+  if num_nodes <= 1.0:
+    return 0.0
+  return 2.0 * num_edges / num_nodes / (num_nodes - 1.0)
+
+
+@_RegisterGraphMetric(
+  'degree_gini', Cost.CHEAP, ('degrees',),
+  lambda context: _gini_coefficient(context.Get('networkx_degrees')))
+def _DegreeGini(context):
+  return _gini_coefficient(context.Get('degrees').astype(np.float32))
+
+
+@_RegisterGraphMetric(
+  'approximate_diameter', Cost.MODERATE, ('adjacency',),
+  lambda context: _diameter(context.Get('networkx_graph'),
+                            context.graph_options.exact_diameter,
+                            context.graph_options.diameter_sweeps),
+  lambda context: ('approximate_diameter', 'approximate_diameter_is_exact'))
+def _ApproximateDiameter(context):
+  options = context.graph_options
+  return csr._diameter_metrics(context.Get('adjacency')[0],
+                               options.exact_diameter, options.diameter_sweeps)
+
+
+def _NetworkxAvgDegree(context):
+  degrees = context.Get('networkx_degrees')
+  return float(np.mean(degrees)) if degrees.shape[0] else 0.0
+
+
+@_RegisterGraphMetric('avg_degree', Cost.CHEAP, ('degrees',),
+                      _NetworkxAvgDegree)
+def _AvgDegree(context):
+  degrees = context.Get('degrees')
+  if degrees.shape[0] == 0:
+    return 0.0
+  return float(np.mean(degrees.astype(np.float32)))
+
+
+def _RegisterCorenessMetric(name, statistic):
+  @_RegisterGraphMetric(
+    name, Cost.MODERATE, ('core_numbers',),
+    lambda context: float(statistic(context.Get('networkx_core_numbers'))))
+  def _Coreness(context):
+    return float(statistic(context.Get('core_numbers')[0]))
+  return _Coreness
+
+
+_RegisterCorenessMetric('coreness_eq_1', lambda core: np.mean(core == 1))
+_RegisterCorenessMetric('coreness_geq_2', lambda core: np.mean(core >= 2))
+_RegisterCorenessMetric('coreness_geq_5', lambda core: np.mean(core >= 5))
+_RegisterCorenessMetric('coreness_geq_10', lambda core: np.mean(core >= 10))
+_RegisterCorenessMetric('coreness_gini', _gini_coefficient)
+
+
+# Only reported when the core numbers may be bounds (approximate mode).
+@_RegisterGraphMetric(
+  'coreness_is_exact', Cost.MODERATE, ('core_numbers',),
+  lambda context: {},
+  lambda context: (('coreness_is_exact',)
+                   if context.graph_options.approximate else ()))
+def _CorenessIsExact(context):
+  if not context.graph_options.approximate:
+    return {}
+  return float(context.Get('core_numbers')[1])
+
+
+def _RegisterTriangleMetric(name, networkx_fn):
+  # Standard errors are only reported by the approximate mode.
+  @_RegisterGraphMetric(
+    name, Cost.EXPENSIVE, ('degrees', 'triangle_metrics'),
+    lambda context: networkx_fn(context.Get('networkx_graph')),
+    lambda context: ((name, name + '_stderr')
+                     if context.graph_options.approximate else (name,)))
+  def _Triangle(context):
+    triangle_metrics = context.Get('triangle_metrics')
+    return {key: triangle_metrics[key] for key in (name, name + '_stderr')
+            if key in triangle_metrics}
+  return _Triangle
+
+
+_RegisterTriangleMetric(
+  'avg_cc', lambda graph: float(np.mean(list(nx.clustering(graph).values()))))
+_RegisterTriangleMetric(
+  'transitivity', lambda graph: float(nx.transitivity(graph)))
+_RegisterTriangleMetric(
+  'num_triangles',
+  lambda graph: float(np.sum(list(nx.triangles(graph).values())) / 3.0))
+
+
+@_RegisterGraphMetric(
+  'cc_size', Cost.CHEAP, ('components',),
+  lambda context: float(_largest_connected_component_size(
+    context.Get('networkx_graph'))))
+def _CcSize(context):
+  component_labels = context.Get('components')
+  if component_labels.shape[0] == 1:
+    return 1.0
+  return float(np.max(np.bincount(component_labels)) /
+               component_labels.shape[0])
+
+
+# Label metrics. The degree-based estimates are reported alongside them, as
+# NodeLabelStructuralMetrics does.
+
+@RegisterMetric('edge_homogeneity', Cost.CHEAP, ('edges',),
+                inputs=('graph', 'labels'))
+def _EdgeHomogeneity(context):
+  return edge_homogeneity(context.graph, context.labels, context.Get('edges'))
+
+
+@RegisterMetric('pareto_exponent', Cost.CHEAP, ('vertex_degrees',),
+                inputs=('graph', 'labels'))
+def _ParetoExponent(context):
+  degrees = context.Get('vertex_degrees')
+  return _get_pareto_exponent(degrees[degrees > 0])
+
+
+@RegisterMetric('avg_degree_est', Cost.CHEAP, ('vertex_degrees',),
+                inputs=('graph', 'labels'))
+def _AvgDegreeEst(context):
+  return _get_average_degree(context.Get('vertex_degrees'))
+
+
+@RegisterMetric('community_size_simpsons', Cost.CHEAP,
+                inputs=('graph', 'labels'))
+def _CommunitySizeSimpsons(context):
+  return _get_community_size_simpsons(context.labels)
+
+
+@RegisterMetric('p_to_q_ratio_est', Cost.CHEAP,
+                ('label_edge_counts', 'vertex_degrees'),
+                inputs=('graph', 'labels'))
+def _PToQRatioEst(context):
+  return _get_p_to_q_ratio(context.Get('label_edge_counts'), context.labels,
+                           context.Get('vertex_degrees'))
+
+
+@RegisterMetric('p_to_q_ratio__est_dc', Cost.CHEAP,
+                ('label_edge_counts', 'vertex_degrees'),
+                inputs=('graph', 'labels'))
+def _PToQRatioEstDc(context):
+  return _get_p_to_q_ratio(context.Get('label_edge_counts'), context.labels,
+                           context.Get('vertex_degrees'), adjusted=True)
+
+
+@RegisterMetric('num_clusters', Cost.CHEAP, inputs=('graph', 'labels'))
+def _NumClusters(context):
+  return _get_num_clusters(context.labels)
+
+
+# Feature metrics.
+
+def _RegisterFeatureMetric(name):
+  @RegisterMetric(name, Cost.EXPENSIVE, ('feature_homogeneity',),
+                  inputs=('labels', 'features'),
+                  output_keys=lambda context: (name, name + '_ci95'))
+  def _Feature(context):
+    feature_metrics = context.Get('feature_homogeneity')
+    return {key: feature_metrics[key] for key in (name, name + '_ci95')}
+  return _Feature
+
+
+_RegisterFeatureMetric('avg_in_feature_angular_distance')
+_RegisterFeatureMetric('avg_out_feature_angular_distance')
+_RegisterFeatureMetric('feature_angular_snr')
+
+
+@gin.configurable
+class MetricSelection:
+  """Gin-selected registered metrics, computed by the Compute*Metrics DoFns.
+
+  Metrics whose inputs a task does not provide (e.g. labels for graph
+  regression) are left out. The graph and feature metric options come from
+  the gin bindings of GraphMetrics and FeatureMetrics. When MetricsCache is
+  given a path, results are looked up there by sample content first.
+  """
+
+  @gin.configurable
+  def __init__(self, metrics=None, max_cost=None, time_budget=None):
+    """Selects the metrics to compute.
+    Args:
+      metrics: names of the metrics to compute. Defaults to all registered
+        metrics.
+      max_cost: optional name of the highest cost class to compute ('cheap',
+        'moderate' or 'expensive').
+      time_budget: optional wall-clock seconds per sample, after which
+        metrics that are not cheap are reported as nan.
+    """
+    names = MetricNames() if metrics is None else list(metrics)
+    specs = [GetMetricSpec(name) for name in names]
+    if max_cost is not None:
+      specs = [spec for spec in specs if spec.cost <= Cost[max_cost.upper()]]
+    self._metric_names = [spec.name for spec in specs]
+    self._time_budget = time_budget
+    self._graph_options = GraphMetrics()
+    self._feature_options = FeatureMetrics()
+    self._cache = MetricsCache()
+
+  def _CacheKey(self, context):
+    graph_arrays = [None, None]
+    if context.graph is not None:
+      graph_arrays = [np.array([context.graph.num_vertices()]),
+                      context.Get('edges')]
+    config = (self._metric_names,
+              sorted(vars(self._graph_options).items()),
+              sorted(vars(self._feature_options).items()))
+    return ContentKey(graph_arrays + [context.labels, context.features], config)
+
+  def __call__(self, graph=None, labels=None, features=None,
+               start_time=None) -> Dict[str, float]:
+    """Computes the selected metrics that apply to the given inputs.
+
+    Calls that pass the same start_time share one time budget.
+    """
+    if start_time is None:
+      start_time = time.time()
+    context = MetricContext(graph, labels, features, self._graph_options,
+                            self._feature_options)
+    if not self._cache.enabled:
+      return ComputeMetrics(context, self._metric_names, self._time_budget,
+                            start_time)
+    key = self._CacheKey(context)
+    metrics = self._cache.Get(key)
+    if metrics is None:
+      metrics = ComputeMetrics(context, self._metric_names, self._time_budget,
+                               start_time)
+      # Results that may hold metrics skipped for time are not cached.
+      if (self._time_budget is None or
+          time.time() - start_time <= self._time_budget):
+        self._cache.Put(key, metrics)
+    return metrics
+
+  def Average(self, graphs, start_time=None) -> Dict[str, float]:
+    """Averages the selected graph structure metrics over a list of graphs.
+
+    Skips the graphs that do not report a metric, as pandas.DataFrame.mean
+    does. The graphs are scored together with batched_graph_metrics, unless
+    the networkx backend or the approximate mode is configured, in which case
+    each graph is scored on its own. Either way all of them share one time
+    budget, and a metric skipped for time in any graph is reported as nan
+    rather than averaged over the graphs scored before the budget ran out.
+    """
+    if start_time is None:
+      start_time = time.time()
+    key = None
+    if self._cache.enabled:
+      arrays = []
+      for graph in graphs:
+        arrays += [np.array([graph.num_vertices()]), graph.get_edges()]
+      key = ContentKey(arrays, ('average', self._metric_names,
+                                sorted(vars(self._graph_options).items())))
+      metrics = self._cache.Get(key)
+      if metrics is not None:
+        return metrics
+    options = self._graph_options
+    if options.backend == 'networkx' or options.approximate:
+      per_graph = [self(graph, start_time=start_time) for graph in graphs]
+      names = []
+      for graph_metrics in per_graph:
+        names += [name for name in graph_metrics if name not in names]
+      metrics = {}
+      for name in names:
+        values = np.array([graph_metrics.get(name, np.nan)
+                           for graph_metrics in per_graph], dtype=np.float64)
+        # Metrics that do not apply to a graph are missing from its dict,
+        # while ComputeMetrics reports those skipped for time as nan.
+        skipped = any(name in graph_metrics and np.isnan(graph_metrics[name])
+                      for graph_metrics in per_graph)
+        values = values[~np.isnan(values)]
+        metrics[name] = (float(np.mean(values)) if values.size and not skipped
+                         else np.nan)
+    else:
+      selected = [name for name in self._metric_names
+                  if GetMetricSpec(name).inputs == ('graph',)]
+      metrics = batched_graph_metrics(
+        graphs, options.exact_diameter, options.diameter_sweeps, selected,
+        self._time_budget, start_time)
+    if key is not None and (self._time_budget is None or
+                            time.time() - start_time <= self._time_budget):
+      self._cache.Put(key, metrics)
+    return metrics
@@ -0,0 +1,179 @@
+# Copyright 2022 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Networkx backend and time budget behavior of the registered metrics."""
+
+from unittest import mock
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import gin
+import networkx as nx
+import numpy as np
+
+from graph_world.data.csr_graph import CsrGraph
+from graph_world.metrics import graph_metrics_csr
+from graph_world.metrics import registry
+from graph_world.metrics import standard_metrics
+from graph_world.metrics.graph_metrics import GraphMetrics, graph_metrics
+from graph_world.metrics.node_label_metrics import FeatureMetrics
+from graph_world.metrics.registry import ComputeMetrics, MetricContext
+from graph_world.metrics.standard_metrics import MetricSelection
+
+_OPTIONS = (('csr', {}), ('approximate', {'approximate': True}),
+            ('networkx', {'backend': 'networkx'}),
+            ('exact_diameter', {'exact_diameter': True}))
+
+
+def _Graph():
+  edges = np.array(nx.gnp_random_graph(50, 0.1, seed=0).edges())
+  return CsrGraph.FromEdges(50, edges[:, 0], edges[:, 1])
+
+
+def _Fail(*args, **kwargs):
+  raise AssertionError('expensive work ran after the time budget')
+
+
+class NetworkxBackendTest(parameterized.TestCase):
+
+  @parameterized.parameters(False, True)
+  def test_matches_graph_metrics(self, exact_diameter):
+    # A self-loop makes the networkx values differ from the csr ones.
+    edges = np.concatenate([np.array(_Graph().get_edges()), [[3, 3]]])
+    graph = CsrGraph.FromEdges(50, edges[:, 0], edges[:, 1])
+    options = GraphMetrics(backend='networkx', exact_diameter=exact_diameter)
+    self.assertEqual(
+      ComputeMetrics(MetricContext(graph, graph_options=options)),
+      graph_metrics(graph, 'networkx', exact_diameter))
+
+
+class TimeBudgetTest(parameterized.TestCase):
+
+  def _AssertSameKeys(self, graph, labels, features, options):
+    def _Context():
+      return MetricContext(graph, labels, features, GraphMetrics(**options),
+                           FeatureMetrics())
+    metrics = ComputeMetrics(_Context())
+    # A negative budget skips every metric that is not cheap.
+    skipped = ComputeMetrics(_Context(), time_budget=-1.0)
+    self.assertEqual(list(skipped), list(metrics))
+    self.assertTrue(any(np.isnan(value) for value in skipped.values()))
+
+  @parameterized.named_parameters(*_OPTIONS)
+  def test_skipped_metrics_keep_output_keys(self, options):
+    rng = np.random.default_rng(0)
+    self._AssertSameKeys(_Graph(), rng.integers(0, 3, 50),
+                         rng.normal(size=(50, 4)), options)
+
+  @parameterized.named_parameters(*_OPTIONS)
+  def test_skipped_metrics_do_no_work(self, options):
+    rng = np.random.default_rng(0)
+    context = MetricContext(_Graph(), rng.integers(0, 3, 50),
+                            rng.normal(size=(50, 4)), GraphMetrics(**options),
+                            FeatureMetrics())
+    expensive_dependencies = {
+      name: _Fail for name in ('core_numbers', 'triangle_metrics',
+                               'networkx_core_numbers', 'feature_homogeneity')}
+    with mock.patch.dict(registry._DEPENDENCIES, expensive_dependencies), \
+         mock.patch.object(graph_metrics_csr, '_diameter_metrics', _Fail), \
+         mock.patch.object(standard_metrics, '_diameter', _Fail), \
+         mock.patch.object(nx, 'clustering', _Fail), \
+         mock.patch.object(nx, 'transitivity', _Fail), \
+         mock.patch.object(nx, 'triangles', _Fail):
+      metrics = ComputeMetrics(context, time_budget=-1.0)
+    self.assertTrue(np.isnan(metrics['avg_cc']))
+    self.assertFalse(np.isnan(metrics['avg_degree']))
+
+  @parameterized.named_parameters(*_OPTIONS)
+  def test_skipped_metrics_keep_output_keys_of_empty_graph(self, options):
+    empty = np.zeros(0, dtype=np.int64)
+    self._AssertSameKeys(CsrGraph.FromEdges(5, empty, empty), None, None,
+                         options)
+
+
+class AverageTest(parameterized.TestCase):
+
+  def _Graphs(self):
+    empty = np.zeros(0, dtype=np.int64)
+    graphs = [CsrGraph.FromEdges(5, empty, empty)]
+    for seed in range(3):
+      edges = np.array(nx.gnp_random_graph(20, 0.2, seed=seed).edges())
+      graphs.append(CsrGraph.FromEdges(20, edges[:, 0], edges[:, 1]))
+    return graphs
+
+  def _Average(self, options, **kwargs):
+    for name, value in options.items():
+      gin.bind_parameter('GraphMetrics.%s' % name, value)
+    self.addCleanup(gin.clear_config)
+    return MetricSelection(**kwargs).Average(self._Graphs())
+
+  @parameterized.named_parameters(*_OPTIONS)
+  def test_matches_mean_of_graph_metrics(self, options):
+    graphs = self._Graphs()
+    per_graph = [GraphMetrics(**options)(graph) for graph in graphs]
+    metrics = self._Average(options)
+    self.assertNotEmpty(metrics)
+    for key, value in metrics.items():
+      # The empty graph does not report most metrics, and is left out.
+      values = [graph_metrics[key] for graph_metrics in per_graph
+                if key in graph_metrics]
+      self.assertAlmostEqual(value, np.mean(values), msg=key)
+
+  @parameterized.named_parameters(*_OPTIONS)
+  def test_computes_selected_metrics(self, options):
+    metrics = self._Average(options, metrics=['num_nodes', 'avg_cc'])
+    stderr = ['avg_cc_stderr'] if options.get('approximate') else []
+    self.assertCountEqual(metrics, ['num_nodes', 'avg_cc'] + stderr)
+
+  @parameterized.named_parameters(*_OPTIONS)
+  def test_skipped_metrics_are_nan(self, options):
+    with mock.patch.object(graph_metrics_csr, '_triangles', _Fail), \
+         mock.patch.object(graph_metrics_csr, '_core_numbers', _Fail), \
+         mock.patch.dict(registry._DEPENDENCIES, {
+           name: _Fail for name in ('core_numbers', 'triangle_metrics',
+                                    'networkx_core_numbers')}):
+      metrics = self._Average(
+        options, metrics=['num_nodes', 'coreness_eq_1', 'avg_cc'],
+        time_budget=-1.0)
+    stderr = ['avg_cc_stderr'] if options.get('approximate') else []
+    self.assertCountEqual(metrics,
+                          ['num_nodes', 'coreness_eq_1', 'avg_cc'] + stderr)
+    self.assertEqual(metrics['num_nodes'], np.mean([
+      GraphMetrics(**options)(graph)['num_nodes']
+      for graph in self._Graphs()]))
+    self.assertTrue(np.isnan(metrics['coreness_eq_1']))
+    self.assertTrue(np.isnan(metrics['avg_cc']))
+
+  def test_budget_spent_midway_is_nan(self):
+    # Each graph takes 10s, so only the first one is scored within budget.
+    gin.bind_parameter('GraphMetrics.backend', 'networkx')
+    self.addCleanup(gin.clear_config)
+    clock = [0.0]
+
+    def _SlowComputeMetrics(*args):
+      metrics = ComputeMetrics(*args)
+      clock[0] += 10.0
+      return metrics
+
+    with mock.patch.object(standard_metrics.time, 'time', lambda: clock[0]), \
+         mock.patch.object(standard_metrics, 'ComputeMetrics',
+                           _SlowComputeMetrics):
+      metrics = MetricSelection(metrics=['num_nodes', 'avg_cc'],
+                                time_budget=1.0).Average(self._Graphs()[1:])
+    self.assertTrue(np.isnan(metrics['avg_cc']))
+    self.assertFalse(np.isnan(metrics['num_nodes']))
+
+
+if __name__ == '__main__':
+  absltest.main()
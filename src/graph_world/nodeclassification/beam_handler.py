@@ -11,9 +11,11 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import collections
 import json
 import logging
 import os
+import time
 
 import apache_beam as beam
 import gin
@@ -21,8 +23,9 @@ import numpy as np
 
 from ..beam.benchmarker import BenchmarkGNNParDo
 from ..beam.generator_beam_handler import GeneratorBeamHandler
-from ..metrics.graph_metrics import graph_metrics
-from ..metrics.node_label_metrics import NodeLabelMetrics
+from ..data.csr_graph import CsrGraph
+from ..metrics.metrics_cache import ContentKey
+from ..metrics.standard_metrics import MetricSelection
 from ..nodeclassification.utils import nodeclassification_data_to_torchgeo_data, get_label_masks, get_kclass_masks
 
 
@@ -55,7 +58,9 @@ class WriteNodeClassificationDatasetDoFn(beam.DoFn):
       f.write(buf)
       f.close()
 
-    graph_object_name = os.path.join(self._output_path, prefix + '_graph.gt')
+    graph_suffix = '_graph.npz' if isinstance(data.graph, CsrGraph) else (
+      '_graph.gt')
+    graph_object_name = os.path.join(self._output_path, prefix + graph_suffix)
     with beam.io.filesystems.FileSystems.create(graph_object_name) as f:
       data.graph.save(f)
       f.close()
@@ -94,12 +99,40 @@ class WriteNodeClassificationDatasetDoFn(beam.DoFn):
 
 class ComputeNodeClassificationMetrics(beam.DoFn):
 
+  # Structural metrics of graphs shared between samples (see the
+  # 'structure_key' of SbmGeneratorWrapper outputs) are cached by the content
+  # of the graph and memberships, so only the feature-dependent metrics are
+  # recomputed for those samples.
+  def __init__(self, max_cached_structures=8):
+    self._max_cached_structures = max_cached_structures
+    self._metrics = MetricSelection()
+    self._structural_metrics_cache = collections.OrderedDict()
+
+  def _StructuralMetrics(self, element, start_time):
+    graph = element['data'].graph
+    memberships = element['data'].graph_memberships
+    # Without node features, only graph and label metrics apply.
+    if element.get('structure_key') is None:
+      return self._metrics(graph, memberships, start_time=start_time)
+    content_key = ContentKey(
+      [np.array([graph.num_vertices()]), graph.get_edges(),
+       np.asarray(memberships)], 'structural_metrics')
+    if content_key in self._structural_metrics_cache:
+      self._structural_metrics_cache.move_to_end(content_key)
+      return self._structural_metrics_cache[content_key]
+    metrics = self._metrics(graph, memberships, start_time=start_time)
+    self._structural_metrics_cache[content_key] = metrics
+    while len(self._structural_metrics_cache) > self._max_cached_structures:
+      self._structural_metrics_cache.popitem(last=False)
+    return metrics
+
   def process(self, element):
     out = element
-    out['metrics'] = graph_metrics(element['data'].graph)
-    out['metrics'].update(NodeLabelMetrics(element['data'].graph,
-                                           element['data'].graph_memberships,
-                                           element['data'].node_features))
+    start_time = time.time()
+    out['metrics'] = dict(self._StructuralMetrics(element, start_time))
+    out['metrics'].update(self._metrics(
+      labels=element['data'].graph_memberships,
+      features=element['data'].node_features, start_time=start_time))
     yield out
 
 
@@ -183,6 +216,8 @@ class NodeClassificationBeamHandler(GeneratorBeamHandler):
                num_tuning_rounds=1, tuning_metric='',
                tuning_metric_is_loss=False, ktrain=5, ktuning=5,
                save_tuning_results=False):
+    self._benchmarker_wrappers = benchmarker_wrappers
+    self._generator_wrapper = generator_wrapper
     self._sample_do_fn = SampleNodeClassificationDatasetDoFn(generator_wrapper)
     self._benchmark_par_do = BenchmarkGNNParDo(
         benchmarker_wrappers, num_tuning_rounds, tuning_metric,
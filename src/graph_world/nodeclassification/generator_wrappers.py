@@ -11,24 +11,51 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import collections
+import hashlib
 from dataclasses import dataclass, fields
 import gin
 import numpy as np
 
 from ..beam.generator_config_sampler import GeneratorConfigSampler
-from ..generators.sbm_simulator import GenerateStochasticBlockModelWithFeatures, MatchType, MakePi, MakePropMat, MakeDegrees
+from ..generators.sbm_simulator import GenerateStochasticBlockModelWithFeatures, MatchType, MakePi, MakePropMat, MakeDegrees, StochasticBlockModel
 from ..generators.cabam_simulator import GenerateCABAMGraphWithFeatures
 from ..nodeclassification.utils import NodeClassificationDataset
 
 
+# SBM config parameters that only affect node or edge features. Marginal
+# samples that vary only these can share the same graph.
+SBM_FEATURE_PARAMS = ('feature_center_distance', 'feature_dim',
+                      'edge_feature_dim', 'edge_center_distance')
+
+
 @gin.configurable
 class SbmGeneratorWrapper(GeneratorConfigSampler):
 
+  # Arguments (beyond the sampler specs and feature options):
+  #   reuse_structure: if True, marginal samples whose marginal params are all
+  #     in SBM_FEATURE_PARAMS reuse a cached graph (and, downstream, its
+  #     structural metrics) instead of sampling a new one.
+  #   num_structure_seeds: number of distinct cached graphs per structural
+  #     config. Sample i uses structure seed i % num_structure_seeds. The graph
+  #     is sampled from a Generator seeded by the structural config and that
+  #     seed, so every worker builds the same graph for the same key.
+  #   max_cached_structures: number of graphs kept in the cache.
   def __init__(self, param_sampler_specs, marginal=False,
-               normalize_features=True):
+               normalize_features=True, legacy_feature_sampling=False,
+               feature_dtype='float64', sbm_backend='graph_tool',
+               reuse_structure=False, num_structure_seeds=1,
+               max_cached_structures=8):
     super(SbmGeneratorWrapper, self).__init__(param_sampler_specs)
     self._marginal = marginal
     self._normalize_features = normalize_features
+    self._legacy_feature_sampling = legacy_feature_sampling
+    self._feature_dtype = np.dtype(feature_dtype)
+    self._sbm_backend = sbm_backend
+    self._reuse_structure = reuse_structure
+    self._num_structure_seeds = num_structure_seeds
+    self._max_cached_structures = max_cached_structures
+    self._structure_cache = collections.OrderedDict()
     self._AddSamplerFn('nvertex', self._SampleUniformInteger)
     self._AddSamplerFn('avg_degree', self._SampleUniformFloat)
     self._AddSamplerFn('feature_center_distance', self._SampleUniformFloat)
@@ -41,6 +68,31 @@ class SbmGeneratorWrapper(GeneratorConfigSampler):
     self._AddSamplerFn('power_exponent', self._SampleUniformFloat)
     self._AddSamplerFn('min_deg', self._SampleUniformInteger)
 
+  def _StructureKey(self, sample_id, generator_config, marginal_param):
+    """Returns the structure cache key, or None if the graph can't be reused.
+    """
+    if not (self._reuse_structure and self._marginal):
+      return None
+    if marginal_param is None:
+      return None
+    marginal_params = (marginal_param if isinstance(marginal_param, list)
+                       else [marginal_param])
+    if not all(param in SBM_FEATURE_PARAMS for param in marginal_params):
+      return None
+    structural_params = tuple(sorted(
+      (name, value) for name, value in generator_config.items() if
+      name not in SBM_FEATURE_PARAMS))
+    return (self._sbm_backend, structural_params,
+            sample_id % self._num_structure_seeds)
+
+  def _StructureRng(self, structure_key):
+    """Returns a Generator seeded by the structure key, or None."""
+    if structure_key is None:
+      return None
+    # Python's hash() of strings differs between processes, sha256 does not.
+    digest = hashlib.sha256(repr(structure_key).encode()).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], 'little'))
+
   def Generate(self, sample_id):
     """Sample and save SMB outputs given a configuration filepath.
     """
@@ -53,6 +105,19 @@ class SbmGeneratorWrapper(GeneratorConfigSampler):
         self._marginal)
     generator_config['generator_name'] = 'StochasticBlockModel'
 
+    structure_key = self._StructureKey(sample_id, generator_config,
+                                       marginal_param)
+    structure = self._structure_cache.get(structure_key)
+    structure_rng = None
+    if structure is not None:
+      self._structure_cache.move_to_end(structure_key)
+      out_degs = None
+    else:
+      structure_rng = self._StructureRng(structure_key)
+      out_degs = MakeDegrees(generator_config['power_exponent'],
+                             generator_config['min_deg'],
+                             generator_config['nvertex'], structure_rng)
+
     sbm_data = GenerateStochasticBlockModelWithFeatures(
       num_vertices=generator_config['nvertex'],
       num_edges=generator_config['nvertex'] * generator_config['avg_degree'],
@@ -66,17 +131,27 @@ class SbmGeneratorWrapper(GeneratorConfigSampler):
       feature_center_distance=generator_config['feature_center_distance'],
       feature_dim=generator_config['feature_dim'],
       edge_center_distance=generator_config['edge_center_distance'],
-      edge_feature_dim=generator_config['edge_feature_dim'],
-      out_degs=MakeDegrees(generator_config['power_exponent'], 
-                               generator_config['min_deg'],
-                               generator_config['nvertex']),
-      normalize_features=self._normalize_features
+      edge_feature_dim=self._EdgeFeatureDim(generator_config),
+      out_degs=out_degs,
+      normalize_features=self._normalize_features,
+      legacy_feature_sampling=self._legacy_feature_sampling,
+      feature_dtype=self._feature_dtype,
+      sbm_backend=self._sbm_backend,
+      structure=structure,
+      structure_rng=structure_rng
     )
 
+    if structure_key is not None and structure is None:
+      self._structure_cache[structure_key] = StochasticBlockModel(
+        graph=sbm_data.graph, graph_memberships=sbm_data.graph_memberships)
+      while len(self._structure_cache) > self._max_cached_structures:
+        self._structure_cache.popitem(last=False)
+
     return {'sample_id': sample_id,
             'marginal_param': marginal_param,
             'fixed_params': fixed_params,
             'generator_config': generator_config,
+            'structure_key': structure_key,
             'data': NodeClassificationDataset(
                 graph=sbm_data.graph,
                 graph_memberships=sbm_data.graph_memberships,
@@ -88,10 +163,14 @@ class SbmGeneratorWrapper(GeneratorConfigSampler):
 class CABAMGeneratorWrapper(GeneratorConfigSampler):
 
   def __init__(self, param_sampler_specs, marginal=False,
-               normalize_features=False):
+               normalize_features=False, legacy_feature_sampling=False,
+               feature_dtype='float64', cabam_backend='cabam'):
     super(CABAMGeneratorWrapper, self).__init__(param_sampler_specs)
     self._marginal = marginal
     self._normalize_features = normalize_features
+    self._legacy_feature_sampling = legacy_feature_sampling
+    self._feature_dtype = np.dtype(feature_dtype)
+    self._cabam_backend = cabam_backend
     self._AddSamplerFn('nvertex', self._SampleUniformInteger)
     self._AddSamplerFn('m', self._SampleUniformInteger)
     self._AddSamplerFn('assortativity_type', self._SampleUniformInteger)
@@ -125,7 +204,10 @@ class CABAMGeneratorWrapper(GeneratorConfigSampler):
       assortativity_type=generator_config['assortativity_type'],
       temperature=generator_config['temperature'],
       edge_center_distance=generator_config['edge_center_distance'],
-      edge_feature_dim=generator_config['edge_feature_dim'],
+      edge_feature_dim=self._EdgeFeatureDim(generator_config),
+      legacy_feature_sampling=self._legacy_feature_sampling,
+      feature_dtype=self._feature_dtype,
+      cabam_backend=self._cabam_backend,
     )
 
     return {'sample_id': sample_id,
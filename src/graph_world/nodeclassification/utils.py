@@ -25,6 +25,9 @@ import torch
 from torch_geometric.data import Data
 from torch_geometric.utils import from_networkx
 
+from ..data.edge_features import EdgeFeatures
+from ..data.torchgeo import graph_to_torchgeo_data
+
 import networkx as nx
 
 
@@ -36,39 +39,24 @@ class NodeClassificationDataset:
     graph_memberships: list of integer node classes.
     node_features: numpy array of node features.
     feature_memberships: list of integer node feature classes.
-    edge_features: map from edge tuple to numpy array. Only stores undirected
-      edges, i.e. (0, 1) will be in the map, but (1, 0) will not be.
+    edge_features: EdgeFeatures store with one row per graph edge, in
+      graph.get_edges() order. Also readable as a map from sorted edge tuple
+      to numpy array, i.e. (0, 1) will be in the map, but (1, 0) will not be.
   """
   graph: graph_tool.Graph = Ellipsis
   graph_memberships: np.ndarray = Ellipsis
   node_features: np.ndarray = Ellipsis
   feature_memberships: np.ndarray = Ellipsis
-  edge_features: Dict[Tuple[int, int], np.ndarray] = Ellipsis
+  edge_features: EdgeFeatures = Ellipsis
 
 
 def nodeclassification_data_to_torchgeo_data(
     nodeclassification_data: NodeClassificationDataset) -> Data:
-  edge_tuples = []
-  edge_feature_data = []
-  for edge in nodeclassification_data.graph.iter_edges():
-    edge_tuples.append([edge[0], edge[1]])
-    edge_tuples.append([edge[1], edge[0]])
-    ordered_tuple = (edge[0], edge[1])
-    if edge[0] > edge[1]:
-      ordered_tuple = (edge[1], edge[0])
-    edge_feature_data.append(
-        nodeclassification_data.edge_features[ordered_tuple])
-    edge_feature_data.append(
-        nodeclassification_data.edge_features[ordered_tuple])
-
-  node_features = torch.tensor(nodeclassification_data.node_features,
-                               dtype=torch.float)
-  edge_index = torch.tensor(edge_tuples, dtype=torch.long)
-  edge_attr = torch.tensor(edge_feature_data, dtype=torch.float)
-  labels = torch.tensor(nodeclassification_data.graph_memberships,
-                        dtype=torch.long)
-  return Data(x=node_features, edge_index=edge_index.t().contiguous(),
-              edge_attr=edge_attr, y=labels)
+  return graph_to_torchgeo_data(
+      nodeclassification_data.graph,
+      nodeclassification_data.node_features,
+      y=nodeclassification_data.graph_memberships,
+      edge_features=nodeclassification_data.edge_features)
 
 
 def sample_kclass_train_sets(example_indices: List[int],
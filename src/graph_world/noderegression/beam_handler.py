@@ -22,8 +22,7 @@ import random
 
 from ..beam.benchmarker import Benchmarker, BenchmarkGNNParDo
 from ..beam.generator_beam_handler import GeneratorBeamHandler
-from ..metrics.graph_metrics import graph_metrics
-from ..metrics.node_label_metrics import NodeLabelMetrics
+from ..metrics.standard_metrics import MetricSelection
 from ..noderegression.utils import noderegression_data_to_torchgeo_data, sample_masks
 
 
@@ -95,12 +94,14 @@ class WriteNodeRegressionDatasetDoFn(beam.DoFn):
 
 class ComputeNodeRegressionGraphMetrics(beam.DoFn):
 
+  def __init__(self):
+    self._metrics = MetricSelection()
+
   def process(self, element):
     out = element
-    out['metrics'] = graph_metrics(element['data'].graph)
-    out['metrics'].update(NodeLabelMetrics(element['data'].graph,
-                                           element['data'].graph_memberships,
-                                           element['data'].node_features))
+    out['metrics'] = self._metrics(element['data'].graph,
+                                   element['data'].graph_memberships,
+                                   element['data'].node_features)
     yield out
 
 
@@ -148,6 +149,8 @@ class NodeRegressionBeamHandler(GeneratorBeamHandler):
                training_ratio, tuning_ratio, marginal=False,
                num_tuning_rounds=1, tuning_metric='',
                tuning_metric_is_loss=False, save_tuning_results=False):
+    self._benchmarker_wrappers = benchmarker_wrappers
+    self._generator_wrapper = generator_wrapper
     self._sample_do_fn = SampleNodeRegressionDatasetDoFn(generator_wrapper)
     self._benchmark_par_do = BenchmarkGNNParDo(benchmarker_wrappers,
                                                num_tuning_rounds, tuning_metric,
@@ -0,0 +1,51 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+
+class ArtifactCache:
+    '''
+    Per-sample cache of deterministic pretext-task preprocessing (PPR matrices,
+    centralities, clusterings, partitions, shortest paths, kNN graphs).
+
+    BenchmarkGNNParDoSSL creates one cache per sample and hands it to every
+    benchmarker and tuning round, so each artifact is computed once per sample.
+    Artifacts are keyed by (sample_id, name, params): params must hold every
+    hyperparameter the artifact depends on besides the sample itself.
+
+    Cached artifacts are shared between pretext task instances, which must not
+    modify them in place.
+    '''
+    def __init__(self, sample_id: Optional[Any] = None):
+        self.sample_id = sample_id
+        self._artifacts = {}
+
+    def get_or_compute(self, name: str, params: Dict[str, Any],
+                       compute_fn: Callable[[], Any]) -> Any:
+        key = (self.sample_id, name, repr(sorted(params.items())))
+        if key not in self._artifacts:
+            self._artifacts[key] = compute_fn()
+        else:
+            logging.debug(f'Reusing {name} {params} for sample id {self.sample_id}')
+        return self._artifacts[key]
+
+    def seed(self, name: str) -> int:
+        '''
+        Deterministic 32-bit seed of a randomized artifact of the sample, so that its cached value does not
+        depend on the tuning round that happened to compute it first.
+        '''
+        return zlib.crc32(repr((self.sample_id, name)).encode())
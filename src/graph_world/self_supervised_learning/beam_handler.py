@@ -23,6 +23,7 @@ import numpy as np
 from .hparam_utils import ComputeNumPossibleConfigs, SampleModelConfig, GetCartesianProduct
 from ..nodeclassification.beam_handler import NodeClassificationBeamHandler
 from ..beam.benchmarker import BenchmarkGNNParDo
+from .artifact_cache import ArtifactCache
 import random
 
 class BenchmarkGNNParDoSSL(BenchmarkGNNParDo):
@@ -54,6 +55,9 @@ class BenchmarkGNNParDoSSL(BenchmarkGNNParDo):
     if element['skipped']:
       yield json.dumps(output_data)
 
+    # Pretext preprocessing is shared by all benchmarkers and tuning rounds
+    artifact_cache = ArtifactCache(element['sample_id'])
+
     # for benchmarker in self._benchmarkers:
     for (benchmarker_class,
          benchmark_params,
@@ -83,6 +87,7 @@ class BenchmarkGNNParDoSSL(BenchmarkGNNParDo):
                                         pretext_task,
                                         pretext_params_sample,
                                         training_scheme)
+        benchmarker.SetArtifactCache(artifact_cache)
         benchmarker_out = benchmarker.Benchmark(element,
                                                 tuning_metric=self._tuning_metric,
                                                 tuning_metric_is_loss=self._tuning_metric_is_loss)
@@ -162,6 +167,7 @@ class BenchmarkGNNParDoSSL(BenchmarkGNNParDo):
                                           pretext_task,
                                           pretext_params_sample,
                                           training_scheme)
+          benchmarker.SetArtifactCache(artifact_cache)
           benchmarker_out = benchmarker.Benchmark(element,
                                                   tuning_metric=self._tuning_metric,
                                                   tuning_metric_is_loss=self._tuning_metric_is_loss)
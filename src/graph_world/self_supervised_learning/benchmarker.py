@@ -36,6 +36,7 @@ import traceback
 
 from ..beam.benchmarker import BenchmarkerWrapper
 from ..nodeclassification.benchmarker import NNNodeBenchmarker
+from .artifact_cache import ArtifactCache
 from  . import *
 from .pretext_tasks.__types import *
 
@@ -85,6 +86,10 @@ class NNNodeBenchmarkerSSL(NNNodeBenchmarker):
     self._train_mask = None
     self._val_mask = None
     self._test_mask = None
+    self._artifact_cache = None
+
+  def SetArtifactCache(self, artifact_cache : ArtifactCache):
+    self._artifact_cache = artifact_cache
 
   def GetPretextTaskName(self):
     return self._pretext_task_name
@@ -188,6 +193,7 @@ class NNNodeBenchmarkerSSL(NNNodeBenchmarker):
     # Setup pretext task
     self._pretext_h_params['data'] = data
     self._pretext_h_params['train_mask'] = self._train_mask
+    self._pretext_h_params['artifact_cache'] = self._artifact_cache
     self._pretext_model = self._pretext_task(**self._pretext_h_params) # init pretext with hparams
     
     # Setup downstream decoder
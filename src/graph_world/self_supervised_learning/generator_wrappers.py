@@ -20,8 +20,14 @@ from ..nodeclassification.generator_wrappers import SbmGeneratorWrapper
 class SSLSbmGeneratorWrapper(SbmGeneratorWrapper):
 
   def __init__(self, param_sampler_specs, marginal=False,
-               normalize_features=True, marginal_params=[]):
-    super(SSLSbmGeneratorWrapper, self).__init__(param_sampler_specs, marginal, normalize_features)
+               normalize_features=True, marginal_params=[],
+               legacy_feature_sampling=False, feature_dtype='float64',
+               sbm_backend='graph_tool', reuse_structure=False,
+               num_structure_seeds=1, max_cached_structures=8):
+    super(SSLSbmGeneratorWrapper, self).__init__(
+      param_sampler_specs, marginal, normalize_features,
+      legacy_feature_sampling, feature_dtype, sbm_backend, reuse_structure,
+      num_structure_seeds, max_cached_structures)
     self._marginal_params = marginal_params
 
 
@@ -13,7 +13,10 @@
 # limitations under the License.
 
 import torch
+import torch.nn.functional as F
 from torch import Tensor
+from torch.utils.checkpoint import checkpoint
+from typing import Callable, Optional, Tuple
 
 # Small constant to avoid log(0)
 err = 1e-15
@@ -34,3 +37,116 @@ def jensen_shannon_loss(positive_instance : Tensor, negative_instance : Tensor,
     positive_MI = reducer((positive_instance + err).log())
     negative_MI = reducer(((1 - negative_instance) + err).log())
     return -(positive_MI + negative_MI)
+
+
+
+def _chunked_sums(sums : Callable[[int, int], Tuple[Tensor, Tensor]], n_rows : int,
+                  chunk_size : Optional[int]) -> Tuple[Tensor, Tensor]:
+    '''
+    Concatenated row sums and summed column sums of sums(start, end) over chunks of chunk_size rows. The
+    intermediate similarities of each chunk are recomputed in the backward pass instead of being stored.
+    '''
+    if chunk_size is None or chunk_size >= n_rows:
+        return sums(0, n_rows)
+    row_chunks, col_sums = [], 0.
+    for start in range(0, n_rows, chunk_size):
+        row_chunk, col_chunk = checkpoint(sums, start, min(start + chunk_size, n_rows), use_reentrant=False)
+        row_chunks.append(row_chunk)
+        col_sums = col_sums + col_chunk
+    return torch.cat(row_chunks), col_sums
+
+
+def _exp_similarity_sums(a : Tensor, b : Tensor, tau : float, exclude_diagonal : bool = False,
+                         chunk_size : Optional[int] = None) -> Tuple[Tensor, Tensor]:
+    '''
+    Row and column sums of exp((a b^T - 1) / tau) for row-normalized a and b. Similarities are at most 1, so
+    the shifted exponentials cannot overflow.
+    '''
+    def sums(start : int, end : int) -> Tuple[Tensor, Tensor]:
+        exp_sim = torch.exp((a[start:end] @ b.T - 1.) / tau)
+        if exclude_diagonal:
+            rows = torch.arange(start, end, device=a.device)
+            exp_sim = exp_sim.masked_fill(rows.unsqueeze(1) == torch.arange(b.shape[0], device=a.device), 0.)
+        return exp_sim.sum(dim=1), exp_sim.sum(dim=0)
+
+    return _chunked_sums(sums, a.shape[0], chunk_size)
+
+
+def _samples_negatives(N : int, num_negatives : Optional[int]) -> bool:
+    '''
+    Whether num_negatives random negatives per node are fewer than the N - 1 exact ones. With a single node there
+    is nothing to sample from.
+    '''
+    return num_negatives is not None and num_negatives < N - 1
+
+
+def _sample_negatives(N : int, num_negatives : int, device) -> Tensor:
+    '''
+    (N, num_negatives) uniform random negatives j != i of every node i.
+    '''
+    negatives = torch.randint(0, N - 1, (N, num_negatives), device=device)
+    return negatives + (negatives >= torch.arange(N, device=device).unsqueeze(1)).long()
+
+
+def _sampled_exp_similarity_sums(a : Tensor, b : Tensor, tau : float, negatives : Tensor,
+                                 chunk_size : Optional[int] = None) -> Tuple[Tensor, Tensor]:
+    '''
+    Unbiased estimates of the row and column sums of exp((a b^T - 1) / tau), excluding the diagonal, from the
+    sampled pairs (i, negatives[i, :]).
+    '''
+    N, num_negatives = negatives.shape
+    scale = (N - 1) / num_negatives
+
+    def sums(start : int, end : int) -> Tuple[Tensor, Tensor]:
+        exp_sim = torch.exp((torch.einsum('nd,nkd->nk', a[start:end], b[negatives[start:end]]) - 1.) / tau)
+        col_sums = exp_sim.new_zeros(b.shape[0]).index_add(0, negatives[start:end].reshape(-1), exp_sim.reshape(-1))
+        return scale * exp_sim.sum(dim=1), scale * col_sums
+
+    return _chunked_sums(sums, N, chunk_size)
+
+
+def info_nce_loss(z1 : Tensor, z2 : Tensor, tau : float = 1.0, num_negatives : Optional[int] = None,
+                  chunk_size : Optional[int] = None) -> Tuple[Tensor, Tensor]:
+    '''
+    Per-node InfoNCE losses of both views, as in GRACE: node i of view 1 contrasts its positive pair (z1_i, z2_i)
+    with the negatives z1_j and z2_j, j != i, and symmetrically for view 2. Returns the losses of view 1 and of
+    view 2, i.e. compute_InfoNCE_loss(z1, z2, tau) and compute_InfoNCE_loss(z2, z1, tau), but the cross-view
+    similarities are computed once: their row sums serve view 1 and their column sums view 2.
+
+    num_negatives: if set, every negative sum is estimated from num_negatives random negatives per node, in
+        O(N * num_negatives) time and memory instead of O(N^2). Ignored when it covers the N - 1 other nodes, for
+        which the exact sums cost no more.
+    chunk_size: if set, the similarities are computed chunk_size nodes at a time and recomputed in the backward
+        pass, so memory stays O(N * chunk_size), or O(chunk_size * num_negatives) with num_negatives.
+    '''
+    z1, z2 = F.normalize(z1), F.normalize(z2)
+    positives = ((z1 * z2).sum(dim=1) - 1.) / tau
+    if not _samples_negatives(z1.shape[0], num_negatives):
+        same1, _ = _exp_similarity_sums(z1, z1, tau, exclude_diagonal=True, chunk_size=chunk_size)
+        same2, _ = _exp_similarity_sums(z2, z2, tau, exclude_diagonal=True, chunk_size=chunk_size)
+        cross1, cross2 = _exp_similarity_sums(z1, z2, tau, chunk_size=chunk_size)
+    else:
+        negatives = _sample_negatives(z1.shape[0], num_negatives, z1.device)
+        same1, _ = _sampled_exp_similarity_sums(z1, z1, tau, negatives, chunk_size)
+        same2, _ = _sampled_exp_similarity_sums(z2, z2, tau, negatives, chunk_size)
+        # The sampled pair (i, j) is a negative of z1_i and of z2_j
+        cross1, cross2 = _sampled_exp_similarity_sums(z1, z2, tau, negatives, chunk_size)
+        cross1, cross2 = cross1 + positives.exp(), cross2 + positives.exp()
+    return torch.log(same1 + cross1) - positives, torch.log(same2 + cross2) - positives
+
+
+def cross_view_nce_loss(h : Tensor, z : Tensor, tau : float = 1.0, num_negatives : Optional[int] = None,
+                        chunk_size : Optional[int] = None) -> Tensor:
+    '''
+    Per-node -log(exp(s(h_i, z_i)) / sum_j exp(s(h_i, z_j))) for the cosine similarity s / tau, with the
+    num_negatives and chunk_size options of info_nce_loss.
+    '''
+    h, z = F.normalize(h), F.normalize(z)
+    positives = ((h * z).sum(dim=1) - 1.) / tau
+    if not _samples_negatives(h.shape[0], num_negatives):
+        denominators, _ = _exp_similarity_sums(h, z, tau, chunk_size=chunk_size)
+    else:
+        negatives = _sample_negatives(h.shape[0], num_negatives, h.device)
+        denominators, _ = _sampled_exp_similarity_sums(h, z, tau, negatives, chunk_size)
+        denominators = denominators + positives.exp()
+    return torch.log(denominators) - positives
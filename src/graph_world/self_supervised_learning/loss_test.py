@@ -0,0 +1,115 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parity of the memory-efficient InfoNCE losses with the dense formulas."""
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import torch
+import torch.nn.functional as F
+
+from graph_world.self_supervised_learning import loss
+from graph_world.self_supervised_learning.pretext_tasks.utils import compute_InfoNCE_loss
+
+
+def _dense_info_nce_loss(z1, z2, tau):
+    # The formula compute_InfoNCE_loss used before info_nce_loss.
+    z1, z2 = F.normalize(z1), F.normalize(z2)
+    refl_sim = torch.exp(z1 @ z1.T / tau)
+    between_sim = torch.exp(z1 @ z2.T / tau)
+    return -torch.log(between_sim.diag() / (refl_sim.sum(1) + between_sim.sum(1) - refl_sim.diag()))
+
+
+def _dense_cross_view_nce_loss(h, z, tau):
+    sim = F.normalize(h) @ F.normalize(z).T / tau
+    return -torch.log(torch.exp(sim.diag()) / torch.exp(sim).sum(1))
+
+
+def _embeddings(N, requires_grad=False):
+    generator = torch.Generator().manual_seed(0)
+    z1 = torch.randn(N, 8, generator=generator, dtype=torch.float64)
+    z2 = z1 + 0.5 * torch.randn(N, 8, generator=generator, dtype=torch.float64)
+    return z1.requires_grad_(requires_grad), z2.requires_grad_(requires_grad)
+
+
+class InfoNceLossTest(parameterized.TestCase):
+
+    @parameterized.parameters(None, 1, 7, 100)
+    def test_info_nce_loss_matches_dense(self, chunk_size):
+        z1, z2 = _embeddings(20, requires_grad=True)
+        l1, l2 = loss.info_nce_loss(z1, z2, 0.5, chunk_size=chunk_size)
+        grads = torch.autograd.grad((l1 + 2. * l2).sum(), (z1, z2))
+        expected1, expected2 = _dense_info_nce_loss(z1, z2, 0.5), _dense_info_nce_loss(z2, z1, 0.5)
+        expected_grads = torch.autograd.grad((expected1 + 2. * expected2).sum(), (z1, z2))
+        torch.testing.assert_close(l1, expected1)
+        torch.testing.assert_close(l2, expected2)
+        for grad, expected_grad in zip(grads, expected_grads):
+            torch.testing.assert_close(grad, expected_grad)
+
+    @parameterized.parameters(None, 1, 7, 100)
+    def test_cross_view_nce_loss_matches_dense(self, chunk_size):
+        h, z = _embeddings(20, requires_grad=True)
+        losses = loss.cross_view_nce_loss(h, z, 0.5, chunk_size=chunk_size)
+        grads = torch.autograd.grad(losses.sum(), (h, z))
+        expected = _dense_cross_view_nce_loss(h, z, 0.5)
+        expected_grads = torch.autograd.grad(expected.sum(), (h, z))
+        torch.testing.assert_close(losses, expected)
+        for grad, expected_grad in zip(grads, expected_grads):
+            torch.testing.assert_close(grad, expected_grad)
+
+    def test_compute_InfoNCE_loss_matches_dense(self):
+        z1, z2 = _embeddings(20)
+        torch.testing.assert_close(compute_InfoNCE_loss(z1, z2, 0.5), _dense_info_nce_loss(z1, z2, 0.5))
+
+    def test_large_similarities_do_not_overflow(self):
+        z1, z2 = _embeddings(20)
+        l1, l2 = loss.info_nce_loss(z1.float(), z2.float(), 0.01)
+        self.assertTrue(torch.isfinite(l1).all() and torch.isfinite(l2).all())
+
+    @parameterized.parameters(None, 3)
+    def test_sampled_sums_are_unbiased(self, chunk_size):
+        a, b = (F.normalize(z) for z in _embeddings(20))
+        rows, cols = loss._exp_similarity_sums(a, b, 0.5, exclude_diagonal=True)
+        torch.manual_seed(0)
+        trials = [loss._sampled_exp_similarity_sums(a, b, 0.5, loss._sample_negatives(20, 4, a.device), chunk_size)
+                  for _ in range(4000)]
+        torch.testing.assert_close(torch.stack([trial[0] for trial in trials]).mean(0), rows, rtol=0.03, atol=0.)
+        torch.testing.assert_close(torch.stack([trial[1] for trial in trials]).mean(0), cols, rtol=0.03, atol=0.)
+
+    def test_sampled_negatives_exclude_self(self):
+        torch.manual_seed(0)
+        negatives = loss._sample_negatives(5, 1000, torch.device('cpu'))
+        self.assertFalse((negatives == torch.arange(5).unsqueeze(1)).any())
+        self.assertEqual(set(negatives[0].tolist()), {1, 2, 3, 4})
+
+    @parameterized.parameters(1, 2, 20)
+    def test_sampling_falls_back_to_exact(self, N):
+        z1, z2 = _embeddings(N)
+        for l_sampled, l_exact in zip(loss.info_nce_loss(z1, z2, 0.5, num_negatives=N - 1 or 1),
+                                      loss.info_nce_loss(z1, z2, 0.5)):
+            torch.testing.assert_close(l_sampled, l_exact)
+        torch.testing.assert_close(loss.cross_view_nce_loss(z1, z2, 0.5, num_negatives=N),
+                                   loss.cross_view_nce_loss(z1, z2, 0.5))
+
+    def test_sampled_loss_approximates_exact(self):
+        z1, z2 = _embeddings(200)
+        torch.manual_seed(0)
+        l1, l2 = loss.info_nce_loss(z1, z2, 0.5, num_negatives=100, chunk_size=64)
+        e1, e2 = loss.info_nce_loss(z1, z2, 0.5)
+        torch.testing.assert_close(l1.mean(), e1.mean(), rtol=0.02, atol=0.)
+        torch.testing.assert_close(l2.mean(), e2.mean(), rtol=0.02, atol=0.)
+
+
+if __name__ == '__main__':
+    absltest.main()
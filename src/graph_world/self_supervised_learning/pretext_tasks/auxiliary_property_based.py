@@ -15,6 +15,7 @@
 from torch.nn import Linear
 import numpy as np
 import torch
+import torch.nn.functional as F
 import gin
 from .__types import *
 from torch import Tensor
@@ -23,15 +24,14 @@ import pymetis
 from torch_geometric.utils.convert import to_scipy_sparse_matrix
 from .basic_pretext_task import BasicPretextTask
 from enum import Enum
-from torch_geometric.utils.convert import to_networkx
-import networkx as nx
 from abc import ABC
 from torch import nn
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from torch_geometric.utils.undirected import is_undirected
-from networkx import all_pairs_shortest_path_length
 from ..tensor_utils import get_top_k_indices
-from torchmetrics.functional import pairwise_cosine_similarity
+from .utils import blockwise_top_k, get_hop_distances, lsh_top_k
+from ...data.csr_graph import CsrGraph
+from ...metrics.centrality import NodeCentrality, wasserman_faust_closeness
 import math 
 import random
 
@@ -49,7 +49,14 @@ class NodeClusteringWithAlignment(BasicPretextTask):
     '''
     def __init__(self, cluster_ratio: float, **kwargs):
         super().__init__(**kwargs)
+        num_classes = self.data.y.unique().shape[0]
+        self.pseudo_labels = self.artifact_cache.get_or_compute(
+            'aligned_cluster_labels', {'cluster_ratio': cluster_ratio},
+            lambda: self.__compute_pseudo_labels(cluster_ratio))
+        self.decoder = Linear(self.encoder.out_channels, num_classes)
+        self.loss = torch.nn.CrossEntropyLoss()
 
+    def __compute_pseudo_labels(self, cluster_ratio: float) -> Tensor:
         n_clusters = math.ceil(self.data.x.shape[0]*cluster_ratio)
 
         # Step 0: Setup
@@ -68,8 +75,9 @@ class NodeClusteringWithAlignment(BasicPretextTask):
         cluster_labels = torch.ones(y.shape, dtype=torch.int64) * -1
         cluster_labels[self.train_mask] = y[self.train_mask]
 
-        # Step 3: Train KMeans on all points
-        kmeans = KMeans(n_clusters=n_clusters).fit(X)
+        # Step 3: Train KMeans on all points, seeded by the sample since the labels are cached
+        kmeans = KMeans(n_clusters=n_clusters, n_init=10,
+                        random_state=self.artifact_cache.seed('aligned_cluster_labels')).fit(X)
 
         # Step 4: Perform alignment mechanism
         #   1) Compute its centroids
@@ -84,10 +92,7 @@ class NodeClusteringWithAlignment(BasicPretextTask):
             for node in np.where(kmeans.labels_ == cn)[0]:
                 if not self.train_mask[node]:
                     cluster_labels[node] = label_for_cluster
-
-        self.pseudo_labels = cluster_labels
-        self.decoder = Linear(self.encoder.out_channels, num_classes)
-        self.loss = torch.nn.CrossEntropyLoss()
+        return cluster_labels
 
     def make_loss(self, embeddings):
         y_hat = self.decoder(embeddings)
@@ -98,7 +103,13 @@ class NodeClusteringWithAlignment(BasicPretextTask):
 class GraphPartitioning(BasicPretextTask):
     def __init__(self, n_partitions: int, **kwargs):
         super().__init__(**kwargs)
+        self.pseudo_labels = self.artifact_cache.get_or_compute(
+            'metis_partition', {'n_partitions': n_partitions},
+            lambda: self.__compute_partition(n_partitions))
+        self.decoder = Linear(self.encoder.out_channels, n_partitions)
+        self.loss = torch.nn.CrossEntropyLoss()
 
+    def __compute_partition(self, n_partitions: int) -> Tensor:
         sparse_matrix = to_scipy_sparse_matrix(self.data.edge_index, num_nodes=self.data.num_nodes)
         node_num = sparse_matrix.shape[0]
         adj_list = [[] for _ in range(node_num)]
@@ -108,10 +119,7 @@ class GraphPartitioning(BasicPretextTask):
             adj_list[i].append(j)
 
         _, ss_labels = pymetis.part_graph(adjacency=adj_list, nparts=n_partitions)
-
-        self.pseudo_labels = torch.tensor(ss_labels, dtype=torch.int64)
-        self.decoder = Linear(self.encoder.out_channels, n_partitions)
-        self.loss = torch.nn.CrossEntropyLoss()
+        return torch.tensor(ss_labels, dtype=torch.int64)
 
     def make_loss(self, embeddings):
         y_hat = self.decoder(embeddings)
@@ -128,19 +136,29 @@ class AbstractCentralityScore(BasicPretextTask, ABC):
     '''
     Abstract class for computing centrality scores proposed in https://arxiv.org/pdf/1905.13728.pdf.
     '''
-    def __init__(self, centrality_score: CentralityScore_, **kwargs):
+    def __init__(self, centrality_score: CentralityScore_, n_sampled_pairs: Optional[int] = None,
+                 stratify_by_rank_gap: bool = False, **kwargs):
+        '''
+        n_sampled_pairs: if set, the ranking loss of every epoch is computed on this many random node pairs
+            instead of all N^2 pairs.
+        stratify_by_rank_gap: sample the rank gap of the pairs uniformly over log2-sized buckets, so that pairs
+            of close rank (the hard ones) are not outnumbered by pairs of distant rank.
+        '''
         super().__init__(**kwargs)
         assert is_undirected(edge_index=self.data.edge_index)
+        assert n_sampled_pairs is None or n_sampled_pairs > 0
         if centrality_score == CentralityScore_.EIGENVECTOR_CENTRALITY:
-            self.centrality_score_fn = nx.eigenvector_centrality
+            self.centrality_name = 'eigenvector'
         elif centrality_score == CentralityScore_.BETWEENNESS:
-            self.centrality_score_fn = nx.betweenness_centrality
+            self.centrality_name = 'betweenness'
         elif centrality_score == CentralityScore_.CLOSENESS:
-            self.centrality_score_fn = nx.closeness_centrality
+            self.centrality_name = 'closeness'
         elif centrality_score == CentralityScore_.SUBGRAPH:
-            self.centrality_score_fn = nx.subgraph_centrality
+            self.centrality_name = 'subgraph'
         else:
             raise 'Unknown centrality score.'
+        # Shared with the node regression targets, gin-configurable (e.g. approximate mode)
+        self.node_centrality = NodeCentrality()
 
         layers = [self.encoder.out_channels, max(
             self.encoder.out_channels, 1), 1]
@@ -150,26 +168,60 @@ class AbstractCentralityScore(BasicPretextTask, ABC):
             nn.Linear(layers[1], layers[2])
         )
 
-
-        G = to_networkx(self.data).to_undirected()
-        centralities = self.centrality_score_fn(G)
-        scores = torch.tensor([centralities[i]
-                                for i in range(len(centralities))])
-        rank_order = torch.zeros((scores.shape[0], scores.shape[0]))
-        for i in range(len(scores)):
-            for j in range(len(scores)):
-                if scores[i] > scores[j]:
-                    rank_order[i, j] = 1.0
-        self.rank_order = rank_order
+        self.n_sampled_pairs = n_sampled_pairs
+        self.stratify_by_rank_gap = stratify_by_rank_gap
+        # ranks[i] > ranks[j] iff node i is more central than node j; order sorts the nodes by rank
+        self.ranks = self.artifact_cache.get_or_compute(
+            'centrality_ranks', {'centrality_score': centrality_score.name, **vars(self.node_centrality)},
+            self.__compute_ranks)
+        self.order = torch.argsort(self.ranks)
+
+    def __compute_ranks(self) -> Tensor:
+        edge_index = self.data.edge_index.cpu().numpy()
+        edges = np.unique(edge_index[:, edge_index[0] < edge_index[1]], axis=1)
+        graph = CsrGraph.FromEdges(self.data.num_nodes, edges[0], edges[1])
+        scores = self.node_centrality(graph, self.centrality_name)
+        if self.centrality_name == 'closeness':
+            # Scale by component size as networkx did, so small components and isolated nodes rank last
+            scores = wasserman_faust_closeness(graph.AdjacencyMatrix(), scores)
+        scores = torch.from_numpy(np.nan_to_num(scores, nan=0.))
+        # Tied scores share a rank
+        _, ranks = torch.unique(scores, sorted=True, return_inverse=True)
+        return ranks
+
+    def __sample_pairs(self) -> Tuple[Tensor, Tensor]:
+        N = self.ranks.shape[0]
+        if not self.stratify_by_rank_gap:
+            i = torch.randint(0, N, (self.n_sampled_pairs,))
+            j = torch.randint(0, N - 1, (self.n_sampled_pairs,))
+            return i, j + (j >= i).long()
+        # Gap between the positions of the pair in rank order, drawn from [2^b, 2^(b+1)) for a uniform bucket b
+        n_buckets = max(math.ceil(math.log2(N)), 1)
+        low = 2 ** torch.randint(0, n_buckets, (self.n_sampled_pairs,))
+        gap = torch.minimum(low + (torch.rand(self.n_sampled_pairs) * low).long(), torch.tensor(N - 1))
+        position = (torch.rand(self.n_sampled_pairs) * (N - gap)).long()
+        i, j = self.order[position], self.order[position + gap]
+        swap = torch.rand(self.n_sampled_pairs) < 0.5
+        return torch.where(swap, j, i), torch.where(swap, i, j)
 
     def make_loss(self, embeddings):
         predicted_centrality_score = self.decoder(embeddings)
-        
+
+        if self.n_sampled_pairs is not None and self.ranks.shape[0] > 1:
+            # Same objective on a sample of pairs: BCE of sigmoid(score_i - score_j) against rank_i > rank_j
+            i, j = self.__sample_pairs()
+            i, j = i.to(embeddings.device), j.to(embeddings.device)
+            ranks = self.ranks.to(embeddings.device)
+            predicted_centrality_score = predicted_centrality_score.squeeze(dim=1)
+            return F.binary_cross_entropy_with_logits(
+                predicted_centrality_score[i] - predicted_centrality_score[j], (ranks[i] > ranks[j]).float())
+
         # Outer subtraction followed by element-wise sigmoid
         predicted_rank_order = torch.sigmoid(
             predicted_centrality_score - predicted_centrality_score.T
         )
-        R, R_hat = self.rank_order, predicted_rank_order
+        ranks = self.ranks.to(embeddings.device)
+        R, R_hat = (ranks.unsqueeze(1) > ranks.unsqueeze(0)).float(), predicted_rank_order
         loss = -(torch.log(R * R_hat + 1e-8) + (1 - R) * torch.log((1 - R_hat) + 1e-8)).mean() # Elementwise CE loss followed by mean
         return loss
 
@@ -177,7 +229,7 @@ class AbstractCentralityScore(BasicPretextTask, ABC):
 class EigenvectorCentrality(AbstractCentralityScore):
     '''
     Proposed in https://arxiv.org/pdf/1905.13728.pdf.
-    Time complexity: O(|V|^3) where V is the vertices.
+    Time complexity: O(|E|) per power iteration where E is the edges.
     '''
     def __init__(self, **kwargs):
         super().__init__(CentralityScore_.EIGENVECTOR_CENTRALITY, **kwargs)
@@ -187,7 +239,8 @@ class EigenvectorCentrality(AbstractCentralityScore):
 class BetweennessCentrality(AbstractCentralityScore):
     '''
     Proposed in https://arxiv.org/pdf/1905.13728.pdf.
-    Time complexity: O(|V| * |E|) where V and E is the vertices and edges respectively.
+    Time complexity: O(|V| * |E|) where V and E is the vertices and edges respectively,
+    O(num_pivots * |E|) in the approximate mode of NodeCentrality.
     '''
     def __init__(self, **kwargs):
         super().__init__(CentralityScore_.BETWEENNESS, **kwargs)
@@ -197,7 +250,8 @@ class BetweennessCentrality(AbstractCentralityScore):
 class ClosenessCentrality(AbstractCentralityScore):
     '''
     Proposed in https://arxiv.org/pdf/1905.13728.pdf.
-    Time complexity: O(|V| * |E|) where V and E is the vertices and edges respectively.
+    Time complexity: O(|V| * |E|) where V and E is the vertices and edges respectively,
+    O(num_pivots * |E|) in the approximate mode of NodeCentrality.
     '''
     def __init__(self, **kwargs):
         super().__init__(CentralityScore_.CLOSENESS, **kwargs)
@@ -207,7 +261,8 @@ class ClosenessCentrality(AbstractCentralityScore):
 class SubgraphCentrality(AbstractCentralityScore):
     '''
     Proposed in https://arxiv.org/pdf/1905.13728.pdf.
-    Time complexity: O(|V|^4) where V is the vertices.
+    Time complexity: O(|V|^3) where V is the vertices, about O(num_eigenpairs * |E|)
+    per Lanczos iteration in the approximate mode of NodeCentrality.
     '''
     def __init__(self, **kwargs):
         super().__init__(CentralityScore_.SUBGRAPH, **kwargs)
@@ -218,14 +273,14 @@ class CentralityScoreRanking(BasicPretextTask):
     '''
     Proposed in https://arxiv.org/pdf/1905.13728.pdf.
     '''
-    def __init__(self, **kwargs):
+    def __init__(self, n_sampled_pairs: Optional[int] = None, stratify_by_rank_gap: bool = False, **kwargs):
         super().__init__(**kwargs)
-        
+        sampling_kwargs = {'n_sampled_pairs': n_sampled_pairs, 'stratify_by_rank_gap': stratify_by_rank_gap}
         self.centrality_scores = nn.ModuleList([
-            EigenvectorCentrality(**kwargs),
-            BetweennessCentrality(**kwargs),
-            ClosenessCentrality(**kwargs),
-            SubgraphCentrality(**kwargs)
+            EigenvectorCentrality(**sampling_kwargs, **kwargs),
+            BetweennessCentrality(**sampling_kwargs, **kwargs),
+            ClosenessCentrality(**sampling_kwargs, **kwargs),
+            SubgraphCentrality(**sampling_kwargs, **kwargs)
         ])
 
     def make_loss(self, embeddings):
@@ -261,34 +316,32 @@ class S2GRL(BasicPretextTask):
         )        
         
 
-        self.k_hop_neighbors_source_indices = [None] * self.data.num_nodes      # Src node --> Src node
-        self.k_hop_neighbors_target_indices = [None] * self.data.num_nodes      # Src node --> indices of K-hop neighbors
-        self.k_hop_neighbors_distances = [None] * self.data.num_nodes           # Src node --> distance of K-hop neighbors
-        
-        G = to_networkx(self.data)
         self.indices = [*range(0, self.data.num_nodes)]
-        shortest_paths = all_pairs_shortest_path_length(G, cutoff=shortest_path_cutoff)
-        shortest_paths = map(lambda v_i: (v_i[0], filter(lambda neighbours: neighbours[1] > 0, v_i[1].items())), shortest_paths)
-        shortest_paths = map(lambda v_i: (v_i[0], map(lambda neighbours: (neighbours[0], min(neighbours[1], self.N_classes - 1)), v_i[1])), shortest_paths)
-        for source, neighbors in shortest_paths:
-            neighbors = filter(lambda neighbor: (not (neighbor[0] == source)) and (neighbor[1] > 0), neighbors)
-            # print(len(zip(*neighbors)))
-            neighbors = list(zip(*neighbors))
-            if len(neighbors) == 0:
-                indices, distances = [], []
-            else:               
-                indices, distances = neighbors
-        
-            self.k_hop_neighbors_target_indices[source] = torch.tensor(list(indices), dtype=torch.long)
-            self.k_hop_neighbors_distances[source] = torch.tensor(list(distances), dtype=torch.long) - 1 # Map distance 1 to class 0
-            self.k_hop_neighbors_source_indices[source] = torch.ones(len(indices), dtype=torch.long) * source
+        # CSR layout: the K-hop neighbors of node i and their distance classes are
+        # k_hop_neighbors_indices[k_hop_neighbors_indptr[i]:k_hop_neighbors_indptr[i+1]] and likewise for distances
+        (self.k_hop_neighbors_indptr,
+         self.k_hop_neighbors_indices,
+         self.k_hop_neighbors_distances) = self.artifact_cache.get_or_compute(
+            'k_hop_neighbor_distances',
+            {'shortest_path_cutoff': shortest_path_cutoff, 'N_classes': N_classes},
+            lambda: self.__compute_k_hop_neighbors(shortest_path_cutoff))
+
+    def __compute_k_hop_neighbors(self, shortest_path_cutoff : int) -> Tuple[Tensor, Tensor, Tensor]:
+        indptr, indices, distances = get_hop_distances(data=self.data, cutoff=shortest_path_cutoff)
+        distances = torch.from_numpy(np.minimum(distances, self.N_classes - 1)) - 1 # Map distance 1 to class 0
+        return torch.from_numpy(indptr), torch.from_numpy(indices), distances
 
     def make_loss(self, embeddings : Tensor):
-        source_node_indices = random.sample(self.indices, k=self.N_sampled_nodes)
+        source_node_indices = torch.tensor(random.sample(self.indices, k=self.N_sampled_nodes), dtype=torch.long)
 
-        source_nodes = torch.cat([self.k_hop_neighbors_source_indices[i] for i in source_node_indices])
-        neighbor_nodes = torch.cat([self.k_hop_neighbors_target_indices[i] for i in source_node_indices])
-        distances = torch.cat([self.k_hop_neighbors_distances[i] for i in source_node_indices])
+        # Gather the CSR rows of the sampled nodes
+        starts = self.k_hop_neighbors_indptr[source_node_indices]
+        counts = self.k_hop_neighbors_indptr[source_node_indices + 1] - starts
+        source_nodes = torch.repeat_interleave(source_node_indices, counts)
+        row_offsets = torch.arange(int(counts.sum())) - torch.repeat_interleave(counts.cumsum(dim=0) - counts, counts)
+        positions = torch.repeat_interleave(starts, counts) + row_offsets
+        neighbor_nodes = self.k_hop_neighbors_indices[positions]
+        distances = self.k_hop_neighbors_distances[positions]
 
         vi_embeddings = embeddings[source_nodes]
         neighbor_embeddings = embeddings[neighbor_nodes]
@@ -303,7 +356,12 @@ class PairwiseAttrSim(BasicPretextTask):
     '''
     Proposed by Jin, Wei, et al. "Self-supervised learning on graphs: Deep insights and new direction." arXiv preprint arXiv:2006.10141 (2020).
     '''
-    def __init__(self, k_largest : int, **kwargs):
+    def __init__(self, k_largest : int, lsh_tables : Optional[int] = None, block_size : int = 1024, **kwargs):
+        '''
+        lsh_tables: if set, approximate the most and least similar nodes with this many random-projection LSH
+            tables (see lsh_top_k) instead of comparing every pair of nodes.
+        block_size: number of rows of the similarity matrix computed at once.
+        '''
         super().__init__(**kwargs)
 
         self.k_largest = k_largest
@@ -313,21 +371,22 @@ class PairwiseAttrSim(BasicPretextTask):
         )
         # Cosine similarity undefined for null vector
         self.null_mask = ~torch.isclose(input=self.data.x.sum(dim=1), other=torch.tensor(0.))
-        X = self.data.x[self.null_mask]
-
-        similarities = pairwise_cosine_similarity(X)
-        similarities.fill_diagonal_(similarities.min() - 1)
-        T_s_ = similarities.topk(k=k_largest, largest=True, dim=1)
-        T_d_ = similarities.topk(k=k_largest, largest=False, dim=1)
-
-        self.T_s = T_s_.indices.view(-1)
-        self.T_d = T_d_.indices.view(-1)
+        (T_s_values, self.T_s), (T_d_values, self.T_d) = self.artifact_cache.get_or_compute(
+            'attribute_similarity_top_k', {'k_largest': k_largest, 'lsh_tables': lsh_tables},
+            lambda: self.__compute_top_k(k_largest, lsh_tables, block_size))
+        self.T_s, self.T_d = self.T_s.view(-1), self.T_d.view(-1)
         self.top_sims = torch.cat([
-            T_s_.values.view(-1),
-            T_d_.values.view(-1)
-        ])       
-        self.v_indices = torch.arange(0, self.data.num_nodes).view((-1, 1)).repeat((1, k_largest)).view(-1)
-        
+            T_s_values.view(-1),
+            T_d_values.view(-1)
+        ])
+        self.v_indices = torch.arange(0, int(self.null_mask.sum())).view((-1, 1)).repeat((1, k_largest)).view(-1)
+
+    def __compute_top_k(self, k_largest : int, lsh_tables : Optional[int], block_size : int):
+        # Most and least similar other nodes; the similarity matrix is never fully materialized
+        X = self.data.x[self.null_mask]
+        if lsh_tables is not None:
+            return lsh_top_k(X, k=k_largest, largest=True, smallest=True, n_tables=lsh_tables, block_size=block_size)
+        return blockwise_top_k(X, k=k_largest, largest=True, smallest=True, block_size=block_size)
 
     def make_loss(self, embeddings : Tensor):
         X_hat = embeddings[self.null_mask]
@@ -0,0 +1,102 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Targets and losses of the auxiliary property-based pretext tasks."""
+
+import math
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import networkx as nx
+import torch
+import torch.nn.functional as F
+from torch_geometric.data import Data
+from torch_geometric.nn import GCN
+from torch_geometric.utils import from_networkx
+
+from graph_world.metrics.centrality import subgraph_centrality
+from graph_world.self_supervised_learning.artifact_cache import ArtifactCache
+from graph_world.self_supervised_learning.pretext_tasks.auxiliary_property_based import (
+    NodeClusteringWithAlignment, SubgraphCentrality)
+
+
+def _task(N=30, **kwargs):
+    torch.manual_seed(0)
+    graph = nx.gnp_random_graph(N, 0.2, seed=0)
+    data = from_networkx(graph)
+    data = Data(x=torch.randn(N, 4), edge_index=data.edge_index, y=torch.zeros(N, dtype=torch.int64))
+    encoder = GCN(4, 8, num_layers=1, out_channels=8)
+    return graph, SubgraphCentrality(data=data, encoder=encoder, train_mask=torch.ones(N, dtype=torch.bool),
+                                     epochs=1, **kwargs)
+
+
+class CentralityScoreTest(parameterized.TestCase):
+
+    def test_ranks_order_nodes_by_centrality(self):
+        graph, task = _task()
+        scores = torch.from_numpy(subgraph_centrality(nx.to_scipy_sparse_array(graph, format='csr')))
+        # The rank order of the dense loss, as the N x N double loop built it
+        rank_order = (scores.unsqueeze(1) > scores.unsqueeze(0)).float()
+        torch.testing.assert_close((task.ranks.unsqueeze(1) > task.ranks.unsqueeze(0)).float(), rank_order)
+        torch.testing.assert_close(task.ranks[task.order], torch.sort(task.ranks).values)
+
+    @parameterized.parameters(False, True)
+    def test_sampled_pairs_are_distinct(self, stratify_by_rank_gap):
+        _, task = _task(n_sampled_pairs=20000, stratify_by_rank_gap=stratify_by_rank_gap)
+        i, j = task._AbstractCentralityScore__sample_pairs()
+        self.assertFalse((i == j).any())
+        self.assertTrue(((i >= 0) & (i < 30) & (j >= 0) & (j < 30)).all())
+
+    def test_stratified_gaps_cover_log2_buckets(self):
+        _, task = _task(n_sampled_pairs=20000, stratify_by_rank_gap=True)
+        i, j = task._AbstractCentralityScore__sample_pairs()
+        position = torch.argsort(task.order)
+        gaps = (position[i] - position[j]).abs()
+        buckets = torch.bincount(torch.floor(torch.log2(gaps.double())).long())
+        self.assertEqual(gaps.max().item(), 29)
+        self.assertLen(buckets, math.ceil(math.log2(30)))
+        # The last bucket [16, 32) is truncated to the gaps below N, the others are drawn uniformly.
+        self.assertLess((buckets.max() - buckets.min()).item(), 0.1 * buckets.float().mean().item())
+
+    def test_sampled_gradient_matches_dense(self):
+        # Both losses average the same per-pair cross-entropy, the dense one over N^2 pairs and the sampled one
+        # over the N (N - 1) pairs of distinct nodes.
+        _, sampled = _task(n_sampled_pairs=400000)
+        _, dense = _task()
+        embeddings = torch.randn(30, 8)
+        dense_grads = torch.autograd.grad(dense.make_loss(embeddings), list(dense.decoder.parameters()))
+        torch.manual_seed(1)
+        sampled_grads = torch.autograd.grad(sampled.make_loss(embeddings), list(sampled.decoder.parameters()))
+        for sampled_grad, dense_grad in zip(sampled_grads, dense_grads):
+            torch.testing.assert_close(sampled_grad * 29 / 30, dense_grad, rtol=0.05, atol=1e-3)
+
+
+class NodeClusteringWithAlignmentTest(absltest.TestCase):
+
+    def test_cached_labels_do_not_depend_on_the_round(self):
+        # Each tuning round of a sample may be the first to compute the labels, in another process.
+        generator = torch.Generator().manual_seed(0)
+        y = torch.randint(0, 3, (60,), generator=generator)
+        x = torch.randn(60, 4, generator=generator) + 2. * F.one_hot(y, 4)
+        data = Data(x=x, edge_index=torch.tensor([[0, 1], [1, 0]]), y=y)
+        train_mask = torch.rand(60, generator=generator) < 0.3
+        labels = [NodeClusteringWithAlignment(
+            cluster_ratio=0.2, data=data, encoder=GCN(4, 8, num_layers=1, out_channels=8), train_mask=train_mask,
+            epochs=1, artifact_cache=ArtifactCache(sample_id=7)).pseudo_labels for _ in range(3)]
+        for other in labels[1:]:
+            torch.testing.assert_close(other, labels[0])
+
+
+if __name__ == '__main__':
+    absltest.main()
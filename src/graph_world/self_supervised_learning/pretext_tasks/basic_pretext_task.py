@@ -13,6 +13,7 @@
 # limitations under the License.
 
 from .__types import *
+from ..artifact_cache import ArtifactCache
 from abc import ABC, abstractclassmethod
 from torch.nn import Module
 from torch import Tensor, FloatTensor, DoubleTensor
@@ -23,7 +24,8 @@ class BasicPretextTask(Module, ABC):
     def __init__(self, 
                  data : InputGraph, encoder: Module, 
                  train_mask: Tensor, epochs: int, 
-                 pretext_weight: int = 1, **kwargs): # **kwargs is needed
+                 pretext_weight: int = 1,
+                 artifact_cache: ArtifactCache = None, **kwargs): # **kwargs is needed
         super().__init__()
         self.data = data.clone()
         self.data_test = self.data.clone()
@@ -31,6 +33,9 @@ class BasicPretextTask(Module, ABC):
         self.epochs = epochs # How many epochs make_loss can be expected to be called
         self.train_mask = train_mask
         self.pretext_weight = pretext_weight # Used to signal how much the benchmarker will multiply the loss with
+        # Deterministic preprocessing of the sample is computed through the cache,
+        # which is shared by all tuning rounds of the sample
+        self.artifact_cache = artifact_cache if artifact_cache is not None else ArtifactCache()
 
     @property
     def input_dim(self):
@@ -26,11 +26,12 @@ from ...models.basic_gnn import SuperGAT
 from torch_geometric.utils import negative_sampling, dropout_adj, degree, subgraph
 from .pyg_compatability_utils import add_random_edge
 from ..layers import NeuralTensorLayer
-from typing import Tuple
+from typing import Optional, Tuple
 import copy
-from .utils import EMA, init_weights, pad_views, compute_InfoNCE_loss
+from .utils import EMA, init_weights, pad_views, get_ppr_graph
+from ..loss import cross_view_nce_loss, info_nce_loss
 from abc import ABC, abstractclassmethod
-from torch_geometric.transforms import GDC, LocalDegreeProfile
+from torch_geometric.transforms import LocalDegreeProfile
 
 # Based on https://github.com/CRIPAC-DIG/GRACE
 @gin.configurable
@@ -41,6 +42,8 @@ class GRACE(BasicPretextTask):
                  edge_mask_ratio2 : float = 0.2,
                  feature_mask_ratio1 : float = 0.2, 
                  feature_mask_ratio2 : float = 0.2,
+                 num_negatives : Optional[int] = None,
+                 chunk_size : Optional[int] = None,
                  **kwargs):
         super().__init__(**kwargs)
 
@@ -58,6 +61,11 @@ class GRACE(BasicPretextTask):
         self.feature_mask_ratio1 = feature_mask_ratio1
         self.feature_mask_ratio2 = feature_mask_ratio2
 
+        # Memory of the loss, see info_nce_loss: num_negatives random negatives
+        # per node instead of all of them, or the exact loss over row chunks
+        self.num_negatives = num_negatives
+        self.chunk_size = chunk_size
+
         # Decoder
         out = self.encoder.out_channels
         self.fc1 = Linear(out, out)
@@ -88,8 +96,7 @@ class GRACE(BasicPretextTask):
         h2 = self.decoder_projection(z2)
 
         # Compute loss
-        l1 = compute_InfoNCE_loss(h1, h2, self.tau)
-        l2 = compute_InfoNCE_loss(h2, h1, self.tau)
+        l1, l2 = info_nce_loss(h1, h2, self.tau, self.num_negatives, self.chunk_size)
         return ((l1 + l2) * 0.5).mean()
     
 
@@ -301,12 +308,15 @@ class SelfGNNPPR(SelfGNN):
         # We keep one view as the original graph, and augment the other based on sparsified PPR edges
         # The paper fixes alpha, we vary it as a hyperparameter
         
-        # GDC assumes edge_attr stores edge weights
-        # To avoid issues where this is not the case from the generated graphs we set the edge_attr to None
+        # The PPR edge weights replace edge_attr, whatever the generated graphs stored there
+        self.data2 = self.artifact_cache.get_or_compute(
+            'ppr_diffusion', {'alpha': alpha, 'k': 30},
+            lambda: self.__compute_ppr_view(alpha))
+
+    def __compute_ppr_view(self, alpha : float) -> Data:
         data2 = self.data.clone()
-        data2.edge_attr = None
-        self.data2 = GDC(diffusion_kwargs={'alpha': alpha, 'method': 'ppr'}, 
-                       sparsification_kwargs={'method':'threshold', 'avg_degree': 30})(data2)
+        data2.edge_index, data2.edge_attr = get_ppr_graph(data=self.data, alpha=alpha, k=30)
+        return data2
     
     def generate_views(self) -> Tuple[Tensor, Tensor, Tensor, Tensor, Tensor, Tensor]:
         return self.data.x, self.data.edge_index, None, self.data2.x, self.data2.edge_index, self.data2.edge_attr
@@ -410,19 +420,26 @@ class MERIT(AbstractSiameseBYOL):
                  edge_modification_ratio : float = 0.2,
                  feature_mask_ratio : float = 0.2,
                  beta : float = 0.6,
+                 num_negatives : Optional[int] = None,
+                 chunk_size : Optional[int] = None,
                  **kwargs):
         super().__init__(**kwargs)
         self.sample_size = sample_size
         self.edge_modification_ratio = edge_modification_ratio
         self.feature_mask_ratio = feature_mask_ratio
         self.beta = beta
+        self.num_negatives = num_negatives
+        self.chunk_size = chunk_size
         # Produce PPR adjacency matrix where edges with weights less than 0.01 are removed 
-        # GDC assumes edge_attr stores edge weights
-        # - To avoid issues where this is not the case from the generated graphs we set the edge_attr to None
+        # The PPR edge weights replace edge_attr, whatever the generated graphs stored there
+        self.data_ppr = self.artifact_cache.get_or_compute(
+            'ppr_diffusion', {'alpha': alpha, 'eps': 0.01},
+            lambda: self.__compute_ppr_view(alpha))
+
+    def __compute_ppr_view(self, alpha : float) -> Data:
         data_ppr = self.data.clone()
-        data_ppr.edge_attr = None
-        self.data_ppr = GDC(diffusion_kwargs={'alpha': alpha, 'method': 'ppr'}, 
-                sparsification_kwargs={'method':'threshold', 'eps': 0.01})(data_ppr)
+        data_ppr.edge_index, data_ppr.edge_attr = get_ppr_graph(data=self.data, alpha=alpha, eps=0.01)
+        return data_ppr
     
     def mask_features(self, features):
         f_mask = torch.empty((features.shape[1], )).uniform_(0,1) < self.feature_mask_ratio
@@ -467,17 +484,16 @@ class MERIT(AbstractSiameseBYOL):
         return self.create_views(sub_sample = True)
 
     def contrastive_loss_cross_network(self, h1, z):
-        z1 = F.normalize(h1)
-        z2 = F.normalize(z)
-        cross_sim = torch.exp(torch.mm(z1, z2.t()))
-        return -torch.log(cross_sim.diag() / cross_sim.sum(dim=-1))
+        return cross_view_nce_loss(h1, z, 1.0, self.num_negatives, self.chunk_size)
 
     # Override loss function 
     def compute_loss(self, v1_teacher, v2_teacher, v1_pred, v2_pred):
-        l1 = self.beta * compute_InfoNCE_loss(v1_pred, v2_pred) + \
+        # Both directions of the InfoNCE loss between the student predictions share their similarities
+        nce1, nce2 = info_nce_loss(v1_pred, v2_pred, 1.0, self.num_negatives, self.chunk_size)
+        l1 = self.beta * nce1 + \
             (1.0 - self.beta) * self.contrastive_loss_cross_network(v1_pred, v2_teacher.detach())
         
-        l2 = self.beta * compute_InfoNCE_loss(v2_pred, v1_pred) + \
+        l2 = self.beta * nce2 + \
             (1.0 - self.beta) * self.contrastive_loss_cross_network(v2_pred, v1_teacher.detach())
         
         loss = 0.5 * (l1 + l2)
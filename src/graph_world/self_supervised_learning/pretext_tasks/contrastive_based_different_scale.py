@@ -27,7 +27,7 @@ from ..graph import SubGraph, SubGraphs
 from torch_geometric.nn import global_mean_pool
 from torch_geometric.utils import to_dense_adj
 import math
-from .utils import get_exact_ppr_matrix
+from .utils import get_ppr_matrix, get_top_k_ppr_neighbors
 
 
 @gin.configurable
@@ -148,39 +148,34 @@ class SUBGCON(BasicPretextTask):
         assert k > 0
 
         self.N = self.data.num_nodes
+        self.subgraphs, self.central_node_indices = self.artifact_cache.get_or_compute(
+            'subgcon_subgraphs', {'alpha': alpha, 'k': k},
+            lambda: self.__compute_subgraphs(alpha, k))
+        self.loss = torch.nn.MarginRankingLoss(margin=margin, reduction='mean')
 
-        S = get_exact_ppr_matrix(data=self.data, alpha=alpha)
-        S = S.fill_diagonal_(S.min() - 1)
-
-
-        # Take the k most important neighbours
-        # S_top_k = S.topk(k=k, dim=1).indices
-        # S_top_k = torch.cat([
-        #     S_top_k, 
-        #     torch.arange(start=0, end=self.data.num_nodes, step=1).unsqueeze(dim=1)
-        # ], dim=1)
+    def __compute_subgraphs(self, alpha: float, k: int):
+        # Take the (at most) k most important neighbours with nonzero PPR
+        S = get_ppr_matrix(data=self.data, alpha=alpha, k=128)
+        neighbors, n_neighbors = get_top_k_ppr_neighbors(S, k=k)
         top_k = []
-        S_top_k = S.topk(k=k, dim=1)
-        for target, (vals, idx) in enumerate(zip(*S_top_k)):
-            non_zero_mask = vals != 0
-            subgraph_nodes = idx[non_zero_mask].detach().tolist() + [target]
+        for target, (idx, n) in enumerate(zip(neighbors, n_neighbors)):
+            subgraph_nodes = idx[:n].tolist() + [target]
             top_k += [subgraph_nodes]
 
-        self.loss = torch.nn.MarginRankingLoss(margin=margin, reduction='mean')
-
         # Subgraphs for each node
         ss = []
         for node_indices in top_k:
             ss += [SubGraph(node_indices=node_indices, data=self.data)]
-        self.subgraphs = SubGraphs(ss)
+        subgraphs = SubGraphs(ss)
 
 
         # Used for the picking function
-        self.central_node_indices = [None] * self.subgraphs.n_subgraphs
+        central_node_indices = [None] * subgraphs.n_subgraphs
         
-        for i in range(self.subgraphs.n_subgraphs):
-            self.central_node_indices[i] = self.subgraphs.get_subgraph_offset(i) +\
-                self.subgraphs.get_subgraph(i).node_mapping.src_to_target(i)
+        for i in range(subgraphs.n_subgraphs):
+            central_node_indices[i] = subgraphs.get_subgraph_offset(i) +\
+                subgraphs.get_subgraph(i).node_mapping.src_to_target(i)
+        return subgraphs, central_node_indices
  
 
     def __get_embedding_and_summaries(self) -> Union[Tensor, Tensor]:
@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import List, Set, Union
+from typing import List, Optional, Set, Tuple, Union
 import torch
 from torch import nn
 # from torchmetrics.functional import pairwise_cosine_similarity
@@ -26,14 +26,15 @@ from .generation_based import AutoEncoding, CorruptedFeaturesReconstruction, Cor
 from .auxiliary_property_based import CentralityScoreRanking, GraphPartitioning
 from .generation_based import DenoisingLinkReconstruction
 import random
+import numpy as np
+import scipy.sparse as sprs
 from torch_geometric.data import Data
 import gin
-from ..loss import jensen_shannon_loss
+from ..loss import info_nce_loss, jensen_shannon_loss
 from torch import Tensor
-from torch_geometric.utils import dense_to_sparse, subgraph
+from torch_geometric.utils import subgraph
 import torch.nn.functional as F
-from .utils import get_exact_ppr_matrix, pairwise_cosine_similarity
-from torch_geometric.nn import knn_graph
+from .utils import blockwise_knn_graph, get_ppr_matrix, get_top_k_ppr_neighbors
 import copy
 from torch_geometric.utils import negative_sampling
 
@@ -93,10 +94,14 @@ class G_Zoom(BasicPretextTask):
             x = self.bilinear(input1, input2)
             return torch.sigmoid(x)
 
-    def __init__(self, B_perc: float, k: int, P_perc: float, alpha: float, alpha_beta_gamma_weights : List[float], **kwargs):
+    def __init__(self, B_perc: float, k: int, P_perc: float, alpha: float, alpha_beta_gamma_weights : List[float],
+                 num_negatives: Optional[int] = None, chunk_size: Optional[int] = None, **kwargs):
         super().__init__(**kwargs)
         assert P_perc >= 1.
         self.alpha_loss, self.beta_loss, self.gamma_loss = alpha_beta_gamma_weights
+        # Memory of the micro contrastiveness loss, see info_nce_loss
+        self.num_negatives = num_negatives
+        self.chunk_size = chunk_size
 
         self.decoder = G_Zoom.Decoder(
             self.get_embedding_dim(), self.get_embedding_dim())
@@ -106,32 +111,38 @@ class G_Zoom(BasicPretextTask):
         self.batch_indices = torch.arange(
             0, self.B).view(-1, 1).repeat((1, k)).view(-1)
 
-        # Compute PPR
-        PPR_matrix = get_exact_ppr_matrix(data=self.data, alpha=alpha)
-        G_tilde_edges, G_tilde_weights = dense_to_sparse(PPR_matrix)
+        G_tilde_edges, G_tilde_weights, self.R = self.artifact_cache.get_or_compute(
+            'g_zoom_ppr', {'alpha': alpha, 'k': k},
+            lambda: self.__compute_ppr_views(alpha, k))
 
         self.G = self.data
         self.G_tilde = Data(
             x=self.data.x, edge_index=G_tilde_edges, edge_weight=G_tilde_weights)
+        self.same_batch = torch.ones(self.B)
+
+    def __compute_ppr_views(self, alpha: float, k: int) -> Tuple[Tensor, Tensor, Tensor]:
+        # Compute PPR
+        PPR_matrix = get_ppr_matrix(data=self.data, alpha=alpha, k=128).tocoo()
+        G_tilde_edges = torch.from_numpy(np.vstack([PPR_matrix.row, PPR_matrix.col])).long()
+        G_tilde_weights = torch.from_numpy(PPR_matrix.data).float()
 
         # Compute neighborhood register
-        importance_matrix = PPR_matrix
-        importance_matrix.fill_diagonal_(importance_matrix.min() - 1)
-        self.R = self.__get_neighborhood_register(I=importance_matrix, k=k)
-        self.same_batch = torch.ones(self.B)
+        R = self.__get_neighborhood_register(I=PPR_matrix.tocsr(), k=k)
+        return G_tilde_edges, G_tilde_weights, R
 
-    def __get_neighborhood_register(self, I: Tensor, k: int) -> Tensor:
+    def __get_neighborhood_register(self, I: sprs.csr_matrix, k: int) -> Tensor:
         '''
         Compute the neighborhood register given the importance matrix I and the number of k important neighbors for each node.
+        Nodes with fewer than k important neighbors are padded with themselves.
 
         Returns
         -------
 
         The neighborhood register
         '''
-        R = I.topk(k=k, dim=1).indices
+        R, _ = get_top_k_ppr_neighbors(I, k=k)
 
-        return R
+        return torch.from_numpy(R).long()
 
     def __graph_samplig(self) -> Union[List[int], List[int]]:
         '''
@@ -165,31 +176,10 @@ class G_Zoom(BasicPretextTask):
     def micro_contrastiveness_loss(self, H1: Tensor, H2: Tensor, target_nodes: Set[int]) -> Tensor:
         H1_t, H2_t = H1[target_nodes], H2[target_nodes]
 
-        # Adjust for cosine_sim(vi, vi) in same view
-        adjust_constant = torch.tensor(1).exp()
-
-        # Exponential of all similarities
-        similarities_exp = {
-            '(H1, H1)': pairwise_cosine_similarity(H1_t, H1_t).exp(),
-            '(H1, H2)': pairwise_cosine_similarity(H1_t, H2_t).exp(),
-            '(H2, H2)': pairwise_cosine_similarity(H2_t, H2_t).exp()
-        }
-
-        similarity_exp_sums = {
-            '(H1, H1)': similarities_exp['(H1, H1)'].sum(dim=1) - adjust_constant,
-            # Include cosine_sim(vi, vi) in different views
-            '(H1, H2)': similarities_exp['(H1, H2)'].sum(dim=1),
-            '(H2, H2)': similarities_exp['(H2, H2)'].sum(dim=1) - adjust_constant
-        }
-
-        positive_pairs = similarities_exp['(H1, H2)'].diag()
-
-        H1_H2 = torch.log(
-            positive_pairs / (similarity_exp_sums['(H1, H2)'] + similarity_exp_sums['(H1, H1)'] + 1e-8))
-        H2_H1 = torch.log(
-            positive_pairs / (similarity_exp_sums['(H1, H2)'] + similarity_exp_sums['(H2, H2)'] + 1e-8))
+        # InfoNCE over the target nodes in both directions, from one set of cross-view similarities
+        H1_H2, H2_H1 = info_nce_loss(H1_t, H2_t, 1.0, self.num_negatives, self.chunk_size)
 
-        L_micro = -(1/(2 * self.B)) * (H1_H2.sum() + H2_H1.sum())
+        L_micro = (1/(2 * self.B)) * (H1_H2.sum() + H2_H1.sum())
         return L_micro
 
     def meso_contrastiveness_loss(self, H1: Tensor, H2: Tensor, H_tilde: Tensor, target_nodes: Set[int]) -> Tensor:
@@ -274,7 +264,8 @@ class MVMI_FT(BasicPretextTask):
 
     def __init__(self, k: int, disagreement_regularization: float, common_representation_regularization: float, **kwargs):
         super().__init__(**kwargs)
-        self.A_f = knn_graph(x=self.data.x, k=k)
+        self.A_f = self.artifact_cache.get_or_compute(
+            'knn_graph', {'k': k}, lambda: blockwise_knn_graph(x=self.data.x, k=k))
         self.disagreement_regularization = disagreement_regularization
         self.common_representation_regularization = common_representation_regularization
         
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import math
 import numpy as np
 import torch
 import torch.nn.functional as F
@@ -24,8 +25,8 @@ import networkx as nx
 from torch_geometric.data import Data
 from torch_geometric.utils import to_networkx
 from torch_geometric.utils import to_dense_adj, get_laplacian
-from torch_geometric.transforms.gdc import GDC
-from torch_geometric.utils import to_dense_adj
+from ...data.ppr import ppr_topk, topk_per_row
+from ..loss import info_nce_loss
 
 # Copied from https://github.com/Namkyeong/BGRL_Pytorch
 class EMA:
@@ -70,15 +71,10 @@ def k_closest_neighbors(data: Data, v : int, K : int) -> List[int]:
 
 
 def compute_InfoNCE_loss(z1: Tensor, z2: Tensor, tau: float = 1.0):
-    z1 = F.normalize(z1)
-    z2 = F.normalize(z2)
-
-    refl_sim = torch.exp(torch.mm(z1, z1.t()) / tau) # inter-view
-    between_sim = torch.exp(torch.mm(z1, z2.t()) / tau) # intra-view
-
-    return -torch.log(
-        between_sim.diag() / (refl_sim.sum(1) + between_sim.sum(1) - refl_sim.diag())
-    )
+    '''
+    Per-node InfoNCE loss of view z1 against view z2. info_nce_loss returns both directions at once.
+    '''
+    return info_nce_loss(z1, z2, tau)[0]
 
 
 def _check_input(
@@ -129,12 +125,208 @@ def pairwise_cosine_similarity(x: Tensor, y: Optional[Tensor] = None, zero_diago
         distance.fill_diagonal_(0)
     return distance
 
-def get_exact_ppr_matrix(data : Data, alpha: float) -> torch.Tensor:
+def get_ppr_matrix(data : Data, alpha: float, k: Optional[int] = None, eps: Optional[float] = None) -> sprs.csr_matrix:
+    '''
+    Sparse approximation of the GDC PPR diffusion: self-loops are added, the
+    transition matrix is symmetrically normalized, each row is sparsified and
+    the result is column-normalized. Row i holds the PPR weights kept for node i.
+
+    Unlike the avg_degree of GDC, which picks one global threshold, k bounds the
+    number of entries kept per node.
+    '''
     assert alpha >= 0. and alpha <= 1.
-    data.edge_attr = None
-    R = GDC(
-        diffusion_kwargs={'alpha': alpha, 'method': 'ppr'}, 
-        sparsification_kwargs={'method':'threshold', 'avg_degree': 128 }
-    )(data.clone())
-    return to_dense_adj(edge_index=R.edge_index, edge_attr=R.edge_attr, max_num_nodes=data.num_nodes).squeeze()
-    
+    edge_index = data.edge_index.cpu().numpy()
+    adjacency = sprs.csr_matrix(
+        (np.ones(edge_index.shape[1]), (edge_index[0], edge_index[1])),
+        shape=(data.num_nodes, data.num_nodes))
+    # Push underestimates entries by up to tol * degree: keep that well below eps
+    # so that the entries near the threshold are not dropped.
+    tol = 1e-4 if eps is None else min(1e-4, eps * 1e-3)
+    S = ppr_topk(adjacency, alpha, k=k, eps=eps, tol=tol, normalization='sym', self_loops=True)
+    column_sums = np.asarray(S.sum(axis=0)).ravel()
+    inverse_column_sums = np.divide(1., column_sums, out=np.zeros_like(column_sums), where=column_sums > 0)
+    return (S @ sprs.diags(inverse_column_sums)).tocsr()
+
+
+def get_ppr_graph(data : Data, alpha: float, k: Optional[int] = None, eps: Optional[float] = None) -> Tuple[Tensor, Tensor]:
+    '''
+    Returns the edge_index and edge weights of get_ppr_matrix, in place of GDC.
+    '''
+    S = get_ppr_matrix(data=data, alpha=alpha, k=k, eps=eps).tocoo()
+    device = data.edge_index.device
+    edge_index = torch.from_numpy(np.vstack([S.row, S.col])).long().to(device)
+    edge_weight = torch.from_numpy(S.data).float().to(device)
+    return edge_index, edge_weight
+
+
+def get_top_k_ppr_neighbors(S: sprs.csr_matrix, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Returns the k neighbors of largest weight in S of each node, excluding the
+    node itself, as an (N, k) array in decreasing order of weight, together with
+    the (N,) number of neighbors found. Nodes with fewer than k nonzero
+    neighbors are padded with themselves.
+    '''
+    N = S.shape[0]
+    S = (S - sprs.diags(S.diagonal())).tocsr()
+    S.eliminate_zeros()
+    S = topk_per_row(S, k)
+    rows = np.repeat(np.arange(N), np.diff(S.indptr))
+    order = np.lexsort((-S.data, rows))
+    neighbors = np.repeat(np.arange(N)[:, None], k, axis=1)
+    neighbors[rows[order], np.arange(order.shape[0]) - S.indptr[rows[order]]] = S.indices[order]
+    return neighbors, np.diff(S.indptr)
+
+
+def get_hop_distances(data : Data, cutoff: int, batch_size: int = 1024) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Hop distances from every node to the nodes it reaches in 1 to cutoff hops along edge_index, by BFS
+    frontier expansion on the sparse adjacency for batch_size sources at once.
+
+    Returns (indptr, indices, distances) in CSR layout: the nodes reached from node i and their distances
+    are indices[indptr[i]:indptr[i+1]] and distances[indptr[i]:indptr[i+1]], ordered by distance.
+    '''
+    N = data.num_nodes
+    edge_index = data.edge_index.cpu().numpy()
+    adjacency = sprs.csr_matrix(
+        (np.ones(edge_index.shape[1], dtype=np.float32), (edge_index[0], edge_index[1])), shape=(N, N))
+    sources, indices, distances = [], [], []
+    for start in range(0, N, batch_size):
+        batch = np.arange(start, min(start + batch_size, N))
+        reached = sprs.csr_matrix(
+            (np.ones(batch.shape[0], dtype=np.float32), (np.arange(batch.shape[0]), batch)),
+            shape=(batch.shape[0], N))
+        frontier = reached
+        for distance in range(1, cutoff + 1):
+            # Nodes adjacent to the frontier that no earlier level reached
+            frontier = ((frontier @ adjacency) > 0).astype(np.float32)
+            frontier = (frontier - frontier.multiply(reached)).tocsr()
+            frontier.eliminate_zeros()
+            if frontier.nnz == 0:
+                break
+            reached = reached + frontier
+            rows, cols = frontier.nonzero()
+            sources.append(batch[rows])
+            indices.append(cols)
+            distances.append(np.full(rows.shape[0], distance))
+    if not sources:
+        return np.zeros(N + 1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    sources, indices, distances = np.concatenate(sources), np.concatenate(indices), np.concatenate(distances)
+    order = np.lexsort((indices, distances, sources))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=N))])
+    return indptr, indices[order].astype(np.int64), distances[order].astype(np.int64)
+
+
+def _similarities(x: Tensor, y: Tensor, metric: str) -> Tensor:
+    '''
+    Similarities between the rows of x and y: dot products of normalized rows for 'cosine', negative squared
+    euclidean distances for 'euclidean'.
+    '''
+    if metric == 'cosine':
+        return x @ y.T
+    return 2 * x @ y.T - (x * x).sum(dim=1, keepdim=True) - (y * y).sum(dim=1).unsqueeze(0)
+
+
+def _prepare_rows(x: Tensor, metric: str) -> Tensor:
+    assert metric in ('cosine', 'euclidean'), f'Unknown metric {metric}'
+    x = x.float()
+    return F.normalize(x, p=2, dim=1) if metric == 'cosine' else x
+
+
+def blockwise_top_k(x: Tensor, k: int, metric: str = 'cosine', largest: bool = True, smallest: bool = False,
+                    block_size: int = 1024) -> List[Tuple[Tensor, Tensor]]:
+    '''
+    Top-k most and/or least similar other rows of every row of x, without materializing the N x N similarity
+    matrix: each block of rows is compared with each block of columns, and running top-k values and indices
+    are merged, so at most a block_size x block_size block of similarities is held at once.
+
+    metric is 'cosine' (cosine similarity) or 'euclidean' (negative squared euclidean distance).
+    Returns a list holding the (N, k) (values, indices) of the largest similarities if largest is set, then
+    those of the smallest similarities if smallest is set.
+    '''
+    N = x.shape[0]
+    assert 0 < k < N, f'k={k} must be between 1 and the number of rows minus one'
+    x = _prepare_rows(x, metric)
+    directions = [True] * largest + [False] * smallest
+    values = [[] for _ in directions]
+    indices = [[] for _ in directions]
+    for row_start in range(0, N, block_size):
+        rows = x[row_start:row_start + block_size]
+        row_indices = torch.arange(row_start, row_start + rows.shape[0], device=x.device)
+        running = [(torch.full((rows.shape[0], k), -np.inf if is_largest else np.inf, device=x.device),
+                    torch.zeros((rows.shape[0], k), dtype=torch.long, device=x.device))
+                   for is_largest in directions]
+        for col_start in range(0, N, block_size):
+            col_indices = torch.arange(col_start, min(col_start + block_size, N), device=x.device)
+            block = _similarities(rows, x[col_start:col_start + block_size], metric)
+            is_self = row_indices.unsqueeze(1) == col_indices.unsqueeze(0)
+            for d, is_largest in enumerate(directions):
+                block_d = block.masked_fill(is_self, -np.inf if is_largest else np.inf)
+                merged_values = torch.cat([running[d][0], block_d], dim=1)
+                merged_indices = torch.cat([running[d][1], col_indices.expand(rows.shape[0], -1)], dim=1)
+                top = merged_values.topk(k=k, largest=is_largest, dim=1)
+                running[d] = (top.values, merged_indices.gather(1, top.indices))
+        for d in range(len(directions)):
+            values[d].append(running[d][0])
+            indices[d].append(running[d][1])
+    return [(torch.cat(values[d]), torch.cat(indices[d])) for d in range(len(directions))]
+
+
+def lsh_top_k(x: Tensor, k: int, largest: bool = True, smallest: bool = False, n_tables: int = 8,
+              n_bits: int = 16, window: Optional[int] = None, block_size: int = 1024) -> List[Tuple[Tensor, Tensor]]:
+    '''
+    Approximate blockwise_top_k for the cosine metric with random-projection (SimHash) LSH.
+
+    Each of the n_tables tables hashes the rows to n_bits signs of random projections and sorts the codes.
+    The candidates of a row are the 2 * window + 1 rows around its code in sorted order, which share the
+    longest code prefixes, and for the smallest similarities the rows around the complement of its code,
+    i.e. the code of the opposite vector. Candidates of all tables are re-ranked by their exact similarity.
+    Rows then cost O(n_tables * window) similarities instead of O(N). window defaults to k.
+    '''
+    N = x.shape[0]
+    assert 0 < k < N, f'k={k} must be between 1 and the number of rows minus one'
+    assert 0 < n_bits < 63
+    x = _prepare_rows(x, 'cosine')
+    window = max(k if window is None else window, math.ceil(k / 2))
+    width = min(2 * window + 1, N)
+    offsets = torch.arange(width, device=x.device)
+    bit_values = 2 ** torch.arange(n_bits, device=x.device)
+    code_mask = 2 ** n_bits - 1
+    directions = [True] * largest + [False] * smallest
+    candidates = [[] for _ in directions]
+    for _ in range(n_tables):
+        planes = torch.randn((x.shape[1], n_bits), device=x.device)
+        codes = ((x @ planes > 0).long() * bit_values).sum(dim=1)
+        sorted_codes, order = codes.sort()
+        for d, is_largest in enumerate(directions):
+            centers = torch.searchsorted(sorted_codes, codes if is_largest else code_mask - codes)
+            starts = (centers - window).clamp(min=0, max=N - width)
+            candidates[d].append(order[starts.unsqueeze(1) + offsets])
+    result = []
+    for d, is_largest in enumerate(directions):
+        # Sort the candidates of each row to mask repeated ones
+        row_candidates = torch.cat(candidates[d], dim=1).sort(dim=1).values
+        fill = -np.inf if is_largest else np.inf
+        values, indices = [], []
+        for row_start in range(0, N, block_size):
+            rows = x[row_start:row_start + block_size]
+            cands = row_candidates[row_start:row_start + block_size]
+            row_indices = torch.arange(row_start, row_start + rows.shape[0], device=x.device)
+            sims = torch.einsum('bd,bcd->bc', rows, x[cands])
+            invalid = cands == row_indices.unsqueeze(1)
+            invalid[:, 1:] |= cands[:, 1:] == cands[:, :-1]
+            top = sims.masked_fill(invalid, fill).topk(k=k, largest=is_largest, dim=1)
+            values.append(top.values)
+            indices.append(cands.gather(1, top.indices))
+        result.append((torch.cat(values), torch.cat(indices)))
+    return result
+
+
+def blockwise_knn_graph(x: Tensor, k: int, block_size: int = 1024) -> Tensor:
+    '''
+    Same graph as torch_geometric.nn.knn_graph(x, k) with its defaults (euclidean distance, no self-loops,
+    source_to_target flow): the edges go from the k nearest neighbors of each node to the node. Computed
+    with blockwise_top_k, so the N x N distance matrix is never materialized.
+    '''
+    _, neighbors = blockwise_top_k(x, k=k, metric='euclidean', block_size=block_size)[0]
+    centers = torch.arange(x.shape[0], device=x.device).repeat_interleave(k)
+    return torch.stack([neighbors.reshape(-1), centers])
@@ -0,0 +1,111 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Parity of the pretext task utilities with networkx and dense references."""
+
+import importlib.util
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import networkx as nx
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch_geometric.utils import from_networkx
+
+from graph_world.self_supervised_learning.pretext_tasks.utils import (
+    blockwise_knn_graph, blockwise_top_k, get_hop_distances, lsh_top_k)
+
+_HAS_TORCH_CLUSTER = importlib.util.find_spec('torch_cluster') is not None
+
+
+def _features(N=200, d=16):
+    generator = torch.Generator().manual_seed(0)
+    return torch.randn(N, d, generator=generator)
+
+
+def _dense_top_k(x, k, metric, largest):
+    if metric == 'cosine':
+        x = F.normalize(x)
+        similarities = x @ x.T
+    else:
+        similarities = -torch.cdist(x, x) ** 2
+    similarities.fill_diagonal_(-np.inf if largest else np.inf)
+    return similarities.topk(k, largest=largest, dim=1)
+
+
+class HopDistancesTest(parameterized.TestCase):
+
+    @parameterized.parameters((1, 1024), (3, 1024), (3, 7), (100, 16))
+    def test_matches_networkx(self, cutoff, batch_size):
+        graph = nx.disjoint_union(nx.gnp_random_graph(60, 0.05, seed=0), nx.path_graph(8))
+        graph.add_node(68)
+        indptr, indices, distances = get_hop_distances(from_networkx(graph), cutoff, batch_size)
+        self.assertEqual(indptr.shape[0], graph.number_of_nodes() + 1)
+        for v in graph:
+            expected = nx.single_source_shortest_path_length(graph, v, cutoff=cutoff)
+            del expected[v]
+            row = slice(indptr[v], indptr[v + 1])
+            self.assertEqual(dict(zip(indices[row].tolist(), distances[row].tolist())), expected)
+            self.assertTrue(np.all(np.diff(distances[row]) >= 0))
+
+    def test_edgeless_graph(self):
+        indptr, indices, distances = get_hop_distances(from_networkx(nx.empty_graph(4)), 3)
+        np.testing.assert_array_equal(indptr, np.zeros(5))
+        self.assertEqual(indices.shape[0], 0)
+        self.assertEqual(distances.shape[0], 0)
+
+
+class TopKTest(parameterized.TestCase):
+
+    @parameterized.product(metric=('cosine', 'euclidean'), block_size=(1024, 64, 37))
+    def test_blockwise_matches_dense(self, metric, block_size):
+        x = _features()
+        results = blockwise_top_k(x, 5, metric, largest=True, smallest=True, block_size=block_size)
+        self.assertLen(results, 2)
+        for (values, indices), largest in zip(results, (True, False)):
+            expected = _dense_top_k(x, 5, metric, largest)
+            np.testing.assert_array_equal(indices.numpy(), expected.indices.numpy())
+            torch.testing.assert_close(values, expected.values, rtol=1e-4, atol=1e-4)
+
+    def test_blockwise_knn_graph(self):
+        x = _features()
+        edge_index = blockwise_knn_graph(x, 6, block_size=64)
+        expected = _dense_top_k(x, 6, 'euclidean', largest=True).indices
+        np.testing.assert_array_equal(edge_index[1].numpy(), np.repeat(np.arange(200), 6))
+        np.testing.assert_array_equal(edge_index[0].numpy(), expected.reshape(-1).numpy())
+        if _HAS_TORCH_CLUSTER:
+            from torch_geometric.nn import knn_graph
+            reference = knn_graph(x, 6)
+            self.assertEqual(set(map(tuple, edge_index.T.tolist())), set(map(tuple, reference.T.tolist())))
+
+    @parameterized.parameters(True, False)
+    def test_lsh_recall(self, largest):
+        torch.manual_seed(0)
+        x = _features(N=1000)
+        values, indices = lsh_top_k(x, 10, largest=largest, smallest=not largest, n_tables=8, n_bits=12,
+                                    window=40)[0]
+        expected = _dense_top_k(x, 10, 'cosine', largest).indices
+        # Returned neighbors are other rows, without repeats, with their exact similarities.
+        self.assertFalse((indices == torch.arange(1000).unsqueeze(1)).any())
+        self.assertTrue((indices.sort(dim=1).values.diff(dim=1) > 0).all())
+        normed = F.normalize(x)
+        torch.testing.assert_close(values, (normed.unsqueeze(1) * normed[indices]).sum(dim=2), rtol=1e-4, atol=1e-4)
+        recall = np.mean([len(set(row.tolist()) & set(expected_row.tolist())) / 10
+                          for row, expected_row in zip(indices, expected)])
+        self.assertGreater(recall, 0.8)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -23,27 +23,12 @@ import torch
 from torch_geometric.data import Data
 from torch_geometric.utils import to_dense_adj
 
+from graph_world.metrics.node_label_metrics import label_edge_count_matrix
+
 def _get_edge_count_matrix(data):
-  labels = data.y.numpy()
-  k = len(set(labels))
-  seen_edges = set()
-  edge_counts = np.zeros((k, k))
   edge_matrix = data.edge_index.numpy()
-  for edge_index in range(edge_matrix.shape[1]):
-    v1 = edge_matrix[0, edge_index]
-    v2 = edge_matrix[1, edge_index]
-    edge_tuple = (v1, v2)
-    if edge_tuple in seen_edges:
-      continue
-    else:
-      seen_edges.add(edge_tuple)
-    k1 = labels[v1]
-    k2 = labels[v2]
-    edge_counts[k1, k2] += 1
-    if k1 == k2:
-      edge_counts[k1, k2] += 1
-  edge_counts = edge_counts.astype(np.int32)
-  return edge_counts
+  return label_edge_count_matrix(edge_matrix[0], edge_matrix[1],
+                                 data.y.numpy())
 
 
 def get_adj_from_file(sim_adj_file):